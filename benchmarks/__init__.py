@@ -0,0 +1,11 @@
+"""
+Benchmarks for txOAuth.
+
+Run all of them from the top of the source tree with::
+
+    python -m benchmarks.run
+
+or a single benchmark module, for example::
+
+    python -m benchmarks.assertionstore
+"""
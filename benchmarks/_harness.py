@@ -0,0 +1,44 @@
+"""
+Shared helpers for txOAuth benchmarks.
+"""
+import sys, time
+
+
+def measure(name, function, count, out=sys.stdout):
+    """
+    Calls C{function(count)} once and reports how long it took.
+
+    Every benchmark line has the same, tab-separated format::
+
+        name    count    total seconds    microseconds per operation
+
+    @param function: A callable performing C{count} operations.
+    @return: The total time taken, in seconds.
+    """
+    start = time.time()
+    function(count)
+    elapsed = time.time() - start
+    report(name, count, elapsed, out)
+    return elapsed
+
+
+def report(name, count, elapsed, out=sys.stdout):
+    """
+    Reports the time taken by C{count} operations, measured elsewhere (for
+    example, in another process), in the same format as L{measure}.
+    """
+    perOperation = elapsed / count * 1e6 if count else 0.0
+    out.write("%s\t%d\t%.6f\t%.3f\n" % (name, count, elapsed, perOperation))
+    out.flush()
+
+
+def measureSize(name, size, out=sys.stdout):
+    """
+    Reports a size, in bytes.
+
+    Size lines use the same format as timing lines; their name ends in
+    C{.bytes}, their count is C{1}, the time taken is C{0} and the last
+    column is the size.
+    """
+    out.write("%s.bytes\t1\t0.000000\t%d\n" % (name, size))
+    out.flush()
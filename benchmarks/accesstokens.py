@@ -0,0 +1,56 @@
+"""
+Benchmarks for issuing and checking access tokens.
+
+Usage: python -m benchmarks.accesstokens [count]
+"""
+import sys
+
+from txoauth.contrib import accesstokens, signed
+
+from twisted.internet import task
+
+from benchmarks._harness import measure
+
+
+def benchmark(name, store, count):
+    issued = []
+
+    def issue(count):
+        for _ in xrange(count):
+            store.issueAccessToken("client").addCallback(issued.append)
+
+    def check(count):
+        tokens = [accessToken.accessToken for accessToken in issued]
+        for accessToken in tokens[:count]:
+            store.checkAccessToken(accessToken)
+
+    measure("%s.issue" % (name,), issue, count)
+    measure("%s.check" % (name,), check, count)
+
+
+def run(count):
+    clock = task.Clock()
+
+    memory = accesstokens.MemoryAccessTokenStore(clock=clock)
+    benchmark("MemoryAccessTokenStore", memory, count)
+    memory.stop()
+
+    keySet = signed.KeySet([("1", "a secret key")])
+    signedStore = signed.SignedAccessTokenStore(keySet, clock=clock)
+    benchmark("SignedAccessTokenStore", signedStore, count)
+
+    tokens = [signedStore.sign("client") for _ in xrange(count)]
+
+    def verify(count):
+        for accessToken in tokens[:count]:
+            signedStore.verify(accessToken)
+
+    measure("SignedAccessTokenStore.verify", verify, count)
+
+
+def main(argv):
+    run(int(argv[1]) if len(argv) > 1 else 10 ** 5)
+
+
+if __name__ == "__main__":
+    main(sys.argv)
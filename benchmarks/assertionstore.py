@@ -0,0 +1,96 @@
+"""
+Benchmarks for in-memory assertion stores.
+
+Every operation is measured on stores holding 10**3 up to 10**maxExponent
+assertions.
+
+Usage: python -m benchmarks.assertionstore [maxExponent]
+"""
+import os, sys, tempfile
+
+from txoauth import clientcred, token
+from txoauth.contrib import snapshot
+from txoauth.contrib.simple import SimpleAssertionStore
+from txoauth.contrib.sharded import ShardedAssertionStore
+
+from twisted.internet import task
+
+from benchmarks._harness import measure, measureSize
+
+
+TTL = 600
+
+
+def buildAssertions(count):
+    client = clientcred.ClientIdentifier("client")
+    return [token.Assertion(client, "type", str(i)) for i in xrange(count)]
+
+
+def benchmarkStore(name, store, assertions, clock=None):
+    def add(count):
+        for assertion in assertions:
+            store.addAssertion(assertion)
+
+    def addBulk(count):
+        store.addAssertions(assertions)
+
+    def check(count):
+        for assertion in assertions:
+            store.checkAssertion(assertion)
+
+    def expire(count):
+        for assertion in assertions:
+            store.addAssertion(assertion)
+        clock.advance(TTL + 1)
+
+    count = len(assertions)
+    measure("%s.addAssertion" % (name,), add, count)
+    measure("%s.checkAssertion" % (name,), check, count)
+    measure("%s.addAssertions" % (name,), addBulk, count)
+    measure("%s.checkAssertion.afterAddAssertions" % (name,), check, count)
+    if clock is not None:
+        measure("%s.expire" % (name,), expire, count)
+
+
+def benchmarkSnapshot(assertions):
+    store = SimpleAssertionStore()
+    store.addAssertions(assertions)
+    fd, path = tempfile.mkstemp()
+    os.close(fd)
+
+    def write(count):
+        snapshot.snapshot(store, path)
+
+    def restore(count):
+        snapshot.restore(SimpleAssertionStore(), path)
+
+    try:
+        count = len(assertions)
+        measure("snapshot.SimpleAssertionStore.write", write, count)
+        measureSize("snapshot.SimpleAssertionStore.%d" % (count,),
+                    os.path.getsize(path))
+        measure("snapshot.SimpleAssertionStore.restore", restore, count)
+    finally:
+        os.remove(path)
+
+
+def run(maxExponent):
+    for exponent in xrange(3, maxExponent + 1):
+        assertions = buildAssertions(10 ** exponent)
+
+        benchmarkStore("SimpleAssertionStore", SimpleAssertionStore(),
+                       assertions)
+        benchmarkSnapshot(assertions)
+
+        clock = task.Clock()
+        store = ShardedAssertionStore(ttl=TTL, clock=clock)
+        benchmarkStore("ShardedAssertionStore", store, assertions, clock)
+        store.stop()
+
+
+def main(argv):
+    run(int(argv[1]) if len(argv) > 1 else 7)
+
+
+if __name__ == "__main__":
+    main(sys.argv)
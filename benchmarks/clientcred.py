@@ -0,0 +1,118 @@
+"""
+Benchmarks for client authentication.
+
+Usage: python -m benchmarks.clientcred [count]
+"""
+import sys
+
+from txoauth import clientcred
+from txoauth.clientcred import IClientIdentifier, IClientIdentifierSecret
+from txoauth.interfaces import IClient
+from txoauth.contrib.simple import SimpleRedirectURIFactory
+
+from twisted.cred.checkers import ICredentialsChecker
+from twisted.cred.portal import Portal
+from twisted.internet import defer
+from twisted.web.iweb import IRequest
+
+from zope.interface import implements
+
+from benchmarks._harness import measure
+
+
+class FakeRequest(object):
+    """
+    Just enough of a web request for extracting client credentials.
+    """
+    implements(IRequest)
+
+    def __init__(self, user="", password="", args=None):
+        self._user, self._password = user, password
+        self.args = args or {}
+
+
+    def getUser(self):
+        return self._user
+
+
+    def getPassword(self):
+        return self._password
+
+
+
+class IdentifierChecker(object):
+    """
+    A checker which accepts any client identifier.
+    """
+    implements(ICredentialsChecker)
+    credentialInterfaces = (IClientIdentifier,)
+
+    def requestAvatarId(self, credentials):
+        return defer.succeed(credentials.identifier)
+
+
+
+def basicRequest():
+    return FakeRequest("client", "secret")
+
+
+def formRequest():
+    return FakeRequest(args={"client_id": ["client"],
+                             "client_secret": ["secret"]})
+
+
+def run(count):
+    extract = clientcred._extractClientCredentials
+
+    def extracting(requestFactory, fresh=True):
+        """
+        Extracts credentials from a new request every time, or from the
+        same (already parsed) request.
+        """
+        if fresh:
+            requests = [requestFactory() for _ in xrange(count)]
+        else:
+            requests = [requestFactory()] * count
+
+        def extractAll(count):
+            for request in requests[:count]:
+                extract(request)
+        return extractAll
+
+    def adaptBoth(count):
+        requests = [basicRequest() for _ in xrange(count)]
+        for request in requests:
+            IClientIdentifier(request)
+            IClientIdentifierSecret(request)
+
+    factory = SimpleRedirectURIFactory(client="http://client.example.com/")
+
+    def login(realm):
+        portal = Portal(realm, [IdentifierChecker()])
+        credentials = clientcred.ClientIdentifier("client")
+
+        def login(count):
+            for _ in xrange(count):
+                portal.login(credentials, None, IClient)
+        return login
+
+    measure("clientcred._extractClientCredentials.basic",
+            extracting(basicRequest), count)
+    measure("clientcred._extractClientCredentials.form",
+            extracting(formRequest), count)
+    measure("clientcred._extractClientCredentials.parsed",
+            extracting(formRequest, fresh=False), count)
+    measure("clientcred.IClientIdentifier+IClientIdentifierSecret",
+            adaptBoth, count)
+    measure("clientcred.ClientRealm.login",
+            login(clientcred.ClientRealm(factory)), count)
+    measure("clientcred.ClientRealm.login.cached",
+            login(clientcred.ClientRealm(factory, cacheSize=100)), count)
+
+
+def main(argv):
+    run(int(argv[1]) if len(argv) > 1 else 10 ** 5)
+
+
+if __name__ == "__main__":
+    main(sys.argv)
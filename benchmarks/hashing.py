@@ -0,0 +1,116 @@
+"""
+Benchmarks for hashing and comparing token requests.
+
+The "legacy" classes replicate the token request layout from before hashes
+were cached and C{__slots__} were used, so both can be compared in one run.
+Like the original classes, the legacy assertion lists C{object} before
+L{FancyHashMixin}, so it hashes by identity; its hash and set membership
+numbers are therefore not comparable, only its equality numbers are.
+
+Usage: python -m benchmarks.hashing [count]
+"""
+import sys
+
+from txoauth import clientcred, token
+from txoauth._twisted import FancyHashMixin
+
+from benchmarks._harness import measure, measureSize
+
+
+class LegacyClientIdentifier(object):
+    def __init__(self, identifier, redirectURI=None):
+        self._identifier = identifier
+        self._redirectURI = redirectURI
+
+
+    @property
+    def identifier(self):
+        return self._identifier
+
+
+    @property
+    def redirectURI(self):
+        return self._redirectURI
+
+
+
+class LegacyAssertion(object, FancyHashMixin):
+    compareAttributes = hashAttributes = ("clientCredentials",
+                                          "assertion",
+                                          "assertionType")
+
+    def __init__(self, clientCredentials, assertionType, assertion):
+        self._clientCredentials = clientCredentials
+        self._assertionType = assertionType
+        self._assertion = assertion
+
+
+    @property
+    def clientCredentials(self):
+        return self._clientCredentials
+
+
+    @property
+    def assertionType(self):
+        return self._assertionType
+
+
+    @property
+    def assertion(self):
+        return self._assertion
+
+
+
+def sizeOf(obj):
+    """
+    Returns the size of an object and its instance dictionary, in bytes.
+    """
+    size = sys.getsizeof(obj)
+    if hasattr(obj, "__dict__"):
+        size += sys.getsizeof(obj.__dict__)
+    return size
+
+
+def benchmark(name, clientFactory, assertionFactory, count):
+    client = clientFactory("client", "uri")
+    a = assertionFactory(client, "type", "value")
+    b = assertionFactory(client, "type", "value")
+
+    def hashing(count):
+        for _ in xrange(count):
+            hash(a)
+
+    def equality(count):
+        for _ in xrange(count):
+            a == b
+
+    def inequality(count):
+        c = assertionFactory(client, "type", "other")
+        for _ in xrange(count):
+            a == c
+
+    def setMembership(count):
+        s = set([a])
+        for _ in xrange(count):
+            b in s
+
+    measure("%s.hash" % (name,), hashing, count)
+    measure("%s.eq" % (name,), equality, count)
+    measure("%s.ne" % (name,), inequality, count)
+    measure("%s.setMembership" % (name,), setMembership, count)
+    measureSize("%s.perObject" % (name,), sizeOf(a) + sizeOf(client))
+
+
+def run(count):
+    benchmark("FancyHashMixin", LegacyClientIdentifier, LegacyAssertion,
+              count)
+    benchmark("ImmutableFancyHashMixin", clientcred.ClientIdentifier,
+              token.Assertion, count)
+
+
+def main(argv):
+    run(int(argv[1]) if len(argv) > 1 else 10 ** 6)
+
+
+if __name__ == "__main__":
+    main(sys.argv)
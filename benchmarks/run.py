@@ -0,0 +1,44 @@
+"""
+Runs every txOAuth benchmark.
+
+The output starts with a few lines describing the environment, each starting
+with C{#}. Every other line is a tab-separated measurement, as written by
+L{benchmarks._harness.measure} and L{benchmarks._harness.measureSize}, so
+runs of different releases can be compared line by line.
+
+Usage: python -m benchmarks.run [maxExponent]
+
+C{maxExponent} bounds the size of the assertion store benchmarks (10**3 up
+to 10**maxExponent entries) and defaults to 6; pass 7 for the full range.
+The startup benchmarks don't depend on it; the other benchmarks perform
+10**(maxExponent - 1) operations.
+"""
+import platform, sys
+
+import twisted
+
+from txoauth._version import verstr
+
+from benchmarks import accesstokens, assertionstore, clientcred, hashing
+from benchmarks import startup
+
+
+def main(argv):
+    maxExponent = int(argv[1]) if len(argv) > 1 else 6
+    count = 10 ** (maxExponent - 1)
+
+    sys.stdout.write("# txoauth %s\n" % (verstr,))
+    sys.stdout.write("# twisted %s\n" % (twisted.__version__,))
+    sys.stdout.write("# python %s (%s)\n" % (platform.python_version(),
+                                             platform.python_implementation()))
+    sys.stdout.write("# name\tcount\tseconds\tusec/op\n")
+
+    startup.run(5)
+    clientcred.run(count)
+    hashing.run(count)
+    accesstokens.run(count)
+    assertionstore.run(maxExponent)
+
+
+if __name__ == "__main__":
+    main(sys.argv)
@@ -0,0 +1,126 @@
+"""
+Benchmarks for importing txOAuth.
+
+Every module is imported in a fresh interpreter, several times; the fastest
+import is reported, with the peak resident memory of that interpreter. The
+time it takes to start (and exit) a bare interpreter which imports nothing,
+and its peak resident memory, are reported as C{startup.baseline}.
+
+With C{--check}, the benchmark fails if importing a module takes longer
+than its budget in L{BUDGETS}, or grows the interpreter by more memory.
+
+Usage: python -m benchmarks.startup [repeat] [--check]
+"""
+import subprocess, sys, time
+
+from benchmarks._harness import measureSize, report
+
+
+MODULES = ["txoauth.interfaces", "txoauth.clientcred", "txoauth.token",
+           "txoauth.contrib.simple", "txoauth.contrib.checkers",
+           "txoauth.endpoint"]
+
+_MB = 1024 * 1024
+
+# The import time (in seconds) and the peak resident memory on top of a
+# bare interpreter (in bytes) every module may take. They leave room for
+# noise: a module which starts importing twisted.web still blows them.
+BUDGETS = {
+    "txoauth.interfaces": (0.1, 4 * _MB),
+    "txoauth.clientcred": (0.4, 16 * _MB),
+    "txoauth.token": (0.4, 16 * _MB),
+    "txoauth.contrib.simple": (0.4, 16 * _MB),
+    "txoauth.contrib.checkers": (0.4, 16 * _MB),
+    "txoauth.endpoint": (0.8, 24 * _MB),
+}
+
+_CHILD = """
+import resource, sys, time
+start = time.time()
+if %(module)r:
+    __import__(%(module)r)
+elapsed = time.time() - start
+maxRSS = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+print elapsed, maxRSS
+"""
+
+
+def importInChild(module):
+    """
+    Imports a module in a fresh interpreter. If C{module} is empty, nothing
+    is imported.
+
+    @return: The time the interpreter took from start to exit and the time
+    the import took, in seconds, and the peak resident memory of the
+    interpreter in bytes.
+    """
+    start = time.time()
+    output = subprocess.Popen([sys.executable, "-c", _CHILD % locals()],
+                              stdout=subprocess.PIPE).communicate()[0]
+    total = time.time() - start
+    elapsed, maxRSS = output.split()
+    maxRSS = int(maxRSS)
+    if sys.platform != "darwin":
+        maxRSS *= 1024
+    return total, float(elapsed), maxRSS
+
+
+def benchmarkBaseline(repeat):
+    """
+    Measures a bare interpreter.
+
+    @return: Its peak resident memory, in bytes.
+    """
+    total, _, maxRSS = min(importInChild("") for _ in xrange(repeat))
+    report("startup.baseline", 1, total)
+    measureSize("startup.baseline.maxRSS", maxRSS)
+    return maxRSS
+
+
+def benchmarkImport(module, repeat):
+    """
+    Measures importing a module.
+
+    @return: The time the import took, in seconds, and the peak resident
+    memory of the interpreter, in bytes.
+    """
+    results = [importInChild(module)[1:] for _ in xrange(repeat)]
+    elapsed, maxRSS = min(results)
+    name = "startup.import.%s" % (module,)
+    report(name, 1, elapsed)
+    measureSize(name + ".maxRSS", maxRSS)
+    return elapsed, maxRSS
+
+
+def run(repeat):
+    """
+    Runs the startup benchmarks.
+
+    @return: A description of every budget in L{BUDGETS} which was blown.
+    """
+    baselineRSS = benchmarkBaseline(repeat)
+    overBudget = []
+    for module in MODULES:
+        elapsed, maxRSS = benchmarkImport(module, repeat)
+        timeBudget, memoryBudget = BUDGETS[module]
+        if elapsed > timeBudget:
+            overBudget.append("importing %s took %.3fs, budget is %.3fs"
+                              % (module, elapsed, timeBudget))
+        if maxRSS - baselineRSS > memoryBudget:
+            overBudget.append("importing %s took %d bytes, budget is %d"
+                              % (module, maxRSS - baselineRSS, memoryBudget))
+    return overBudget
+
+
+def main(argv):
+    check = "--check" in argv
+    args = [arg for arg in argv[1:] if arg != "--check"]
+    overBudget = run(int(args[0]) if args else 5)
+    if check and overBudget:
+        for problem in overBudget:
+            sys.stderr.write("over budget: %s\n" % (problem,))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main(sys.argv)
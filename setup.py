@@ -49,7 +49,7 @@ setup(
     author="Zooko Ofsimplegeo", # original author: Laurens Van Houtven
     author_email="zooko@simplegeo.com",
     url="https://github.com/simplegeo/txoauth",
-    packages = find_packages(),
+    packages = find_packages(exclude=["benchmarks", "benchmarks.*"]),
     test_suite="txoauth.test",
     install_requires=["Twisted >= 9.0.0"],
     setup_requires=['setuptools_trial'],
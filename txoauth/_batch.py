@@ -0,0 +1,83 @@
+"""
+Batching of calls made during a single reactor iteration.
+"""
+from twisted.internet import defer
+from twisted.python.failure import Failure
+
+
+class TickBatcher(object):
+    """
+    Collects items added during one reactor iteration and dispatches them as
+    a single batch.
+
+    The dispatch function is called with the list of items, in the order in
+    which they were added, and returns a list (or a C{Deferred} firing with a
+    list) of results in the same order. A result which is a L{Failure} is
+    delivered only to the caller which added that item; if the dispatch
+    function fails as a whole, every caller in the batch gets the failure.
+    """
+    def __init__(self, dispatch, clock=None):
+        """
+        Initializes a batcher.
+
+        @param dispatch: Called with each batch of items.
+        @type dispatch: one-argument callable
+        @param clock: The clock used to schedule dispatching. Defaults to the
+        global reactor.
+        @type clock: L{twisted.internet.interfaces.IReactorTime}
+        """
+        if clock is None:
+            from twisted.internet import reactor as clock
+
+        self._dispatch = dispatch
+        self._clock = clock
+        self._items, self._waiting = [], []
+        self._call = None
+
+
+    def add(self, item):
+        """
+        Adds an item to the current batch.
+
+        @return: A C{Deferred} which will fire with the result for this item.
+        """
+        d = defer.Deferred()
+        self._items.append(item)
+        self._waiting.append(d)
+        if self._call is None:
+            self._call = self._clock.callLater(0, self.flush)
+        return d
+
+
+    def flush(self):
+        """
+        Dispatches the current batch right away.
+        """
+        if self._call is not None:
+            if self._call.active():
+                self._call.cancel()
+            self._call = None
+
+        items, waiting = self._items, self._waiting
+        if not items:
+            return
+        self._items, self._waiting = [], []
+
+        d = defer.maybeDeferred(self._dispatch, items)
+
+        @d.addCallback
+        def deliver(results):
+            if len(results) != len(waiting):
+                raise ValueError("batch of %d items produced %d results"
+                                 % (len(waiting), len(results)))
+            for d, result in zip(waiting, results):
+                if isinstance(result, Failure):
+                    d.errback(result)
+                else:
+                    d.callback(result)
+
+        @d.addErrback
+        def fail(failure):
+            for d in waiting:
+                if not d.called:
+                    d.errback(failure)
@@ -0,0 +1,87 @@
+"""
+Counting Bloom filters.
+"""
+import math, struct
+from array import array
+from hashlib import sha1
+
+_MAX_COUNT = 255
+
+
+class CountingBloomFilter(object):
+    """
+    A Bloom filter which supports removal.
+
+    Every position holds a small counter instead of a bit. Adding a key
+    increments its counters and removing it decrements them, so a key is
+    only reported missing once every key sharing one of its positions has
+    been removed. Counters saturate: once a counter reaches its maximum, it
+    is never decremented again, which can cause false positives but never
+    false negatives.
+
+    Keys are byte strings. Removing a key that was never added breaks the
+    guarantee that there are no false negatives.
+    """
+    def __init__(self, capacity, errorRate=0.01):
+        """
+        Initializes a counting Bloom filter.
+
+        @param capacity: The number of keys the filter is sized for.
+        @type capacity: C{int}
+        @param errorRate: The false positive rate at that capacity.
+        @type errorRate: C{float}
+        """
+        if capacity < 1:
+            raise ValueError("capacity must be positive")
+        if not 0 < errorRate < 1:
+            raise ValueError("errorRate must be between 0 and 1")
+
+        log2 = math.log(2)
+        size = -capacity * math.log(errorRate) / (log2 * log2)
+        self.size = max(int(math.ceil(size)), 1)
+        self.hashes = max(int(round(self.size / float(capacity) * log2)), 1)
+        self.capacity = capacity
+        self.errorRate = errorRate
+        self._counters = array("B", [0]) * self.size
+
+
+    def _positions(self, key):
+        """
+        Gets the positions of a key, using double hashing of a digest.
+        """
+        h1, h2 = struct.unpack("<QQ", sha1(key).digest()[:16])
+        size = self.size
+        return [(h1 + i * h2) % size for i in xrange(self.hashes)]
+
+
+    def add(self, key):
+        counters = self._counters
+        for position in self._positions(key):
+            if counters[position] < _MAX_COUNT:
+                counters[position] += 1
+
+
+    def remove(self, key):
+        """
+        Removes a key which was added earlier.
+        """
+        counters = self._counters
+        for position in self._positions(key):
+            count = counters[position]
+            if 0 < count < _MAX_COUNT:
+                counters[position] = count - 1
+
+
+    def __contains__(self, key):
+        counters = self._counters
+        for position in self._positions(key):
+            if not counters[position]:
+                return False
+        return True
+
+
+    def clear(self):
+        """
+        Removes all keys.
+        """
+        self._counters = array("B", [0]) * self.size
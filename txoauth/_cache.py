@@ -0,0 +1,99 @@
+"""
+Bounded caches.
+"""
+_PREV, _NEXT, _KEY, _VALUE = 0, 1, 2, 3
+
+
+class LRUCache(object):
+    """
+    A mapping of bounded size which evicts the least recently used entry.
+
+    Entries are kept in a circular doubly linked list of small lists, so
+    lookups, updates and evictions are all constant time.
+    """
+    def __init__(self, maxSize):
+        """
+        Initializes an LRU cache.
+
+        @param maxSize: The maximum number of entries in the cache.
+        @type maxSize: C{int}
+        """
+        if maxSize < 1:
+            raise ValueError("maxSize must be positive")
+
+        self.maxSize = maxSize
+        self._links = {}
+        self._root = root = []
+        root[:] = [root, root, None, None]
+
+
+    def __len__(self):
+        return len(self._links)
+
+
+    def __contains__(self, key):
+        return key in self._links
+
+
+    def get(self, key, default=None):
+        """
+        Gets the value for a key, marking it as most recently used.
+        """
+        link = self._links.get(key)
+        if link is None:
+            return default
+
+        root = self._root
+        prev, next = link[_PREV], link[_NEXT]
+        prev[_NEXT], next[_PREV] = next, prev
+        last = root[_PREV]
+        last[_NEXT] = root[_PREV] = link
+        link[_PREV], link[_NEXT] = last, root
+        return link[_VALUE]
+
+
+    def set(self, key, value):
+        """
+        Sets the value for a key, marking it as most recently used.
+
+        If the cache is full, the least recently used entry is evicted.
+        """
+        link = self._links.get(key)
+        if link is not None:
+            self.get(key)
+            link[_VALUE] = value
+            return
+
+        root = self._root
+        if len(self._links) >= self.maxSize:
+            oldest = root[_NEXT]
+            root[_NEXT] = oldest[_NEXT]
+            oldest[_NEXT][_PREV] = root
+            del self._links[oldest[_KEY]]
+
+        last = root[_PREV]
+        link = [last, root, key, value]
+        last[_NEXT] = root[_PREV] = self._links[key] = link
+
+
+    def pop(self, key, default=None):
+        """
+        Removes a key, returning its value (or C{default} if it wasn't
+        present).
+        """
+        link = self._links.pop(key, None)
+        if link is None:
+            return default
+
+        prev, next = link[_PREV], link[_NEXT]
+        prev[_NEXT], next[_PREV] = next, prev
+        return link[_VALUE]
+
+
+    def clear(self):
+        """
+        Removes all entries.
+        """
+        self._links.clear()
+        root = self._root
+        root[:] = [root, root, None, None]
@@ -0,0 +1,51 @@
+"""
+Small cryptographic helpers.
+
+The standard library versions are used where they are available.
+"""
+import hashlib, hmac, struct
+
+
+def _compareDigests(a, b):
+    """
+    Compares two strings in time which only depends on their length.
+    """
+    if len(a) != len(b):
+        return False
+    result = 0
+    for x, y in zip(a, b):
+        result |= ord(x) ^ ord(y)
+    return result == 0
+
+
+compareDigests = getattr(hmac, "compare_digest", _compareDigests)
+
+
+def _pbkdf2(hashName, password, salt, iterations, keyLength=None):
+    """
+    Derives a key from a password with PBKDF2, as described in RFC 2898.
+
+    This has the same signature as C{hashlib.pbkdf2_hmac}.
+    """
+    prf = hmac.new(password, digestmod=getattr(hashlib, hashName))
+    if keyLength is None:
+        keyLength = prf.digest_size
+
+    def f(data):
+        mac = prf.copy()
+        mac.update(data)
+        return mac.digest()
+
+    blocks = []
+    for index in xrange(1, -(-keyLength // prf.digest_size) + 1):
+        u = f(salt + struct.pack(">I", index))
+        block = [ord(c) for c in u]
+        for _ in xrange(iterations - 1):
+            u = f(u)
+            block = [x ^ ord(y) for x, y in zip(block, u)]
+        blocks.append("".join(chr(x) for x in block))
+
+    return "".join(blocks)[:keyLength]
+
+
+pbkdf2 = getattr(hashlib, "pbkdf2_hmac", _pbkdf2)
@@ -0,0 +1,21 @@
+"""
+Compact keys for token requests.
+"""
+from hashlib import sha1
+
+
+def assertionDigest(assertion):
+    """
+    Gets a digest identifying an assertion by its client identifier, type
+    and value.
+
+    @type assertion: L{txoauth.token.IAssertion}
+    @return: A 20 byte SHA-1 digest.
+    @rtype: C{str}
+    """
+    credentials = assertion.clientCredentials
+    parts = [credentials.identifier, assertion.assertionType,
+             assertion.assertion]
+    encoded = "\0".join(p.encode("utf-8") if isinstance(p, unicode) else p
+                        for p in parts)
+    return sha1(encoded).digest()
@@ -1,6 +1,8 @@
 """
 txOAuth stuff suggested for contribution back to Twisted.
 """
+from operator import attrgetter
+
 from twisted.python.util import FancyEqMixin
 
 
@@ -10,3 +12,90 @@ class FancyHashMixin(FancyEqMixin):
     def __hash__(self):
         values = tuple(getattr(self, name) for name in self.hashAttributes)
         return hash(values)
+
+
+
+_comparers = {}
+
+
+def _comparedValues(cls):
+    """
+    Gets a function which returns a tuple of the values of the compared
+    attributes of an instance of C{cls}.
+
+    The function is built once per class.
+    """
+    compared = _comparers.get(cls)
+    if compared is None:
+        names = cls.compareAttributes
+        if not names:
+            compared = id
+        elif len(names) == 1:
+            getter = attrgetter(names[0])
+            compared = lambda obj: (getter(obj),)
+        else:
+            compared = attrgetter(*names)
+        _comparers[cls] = compared
+    return compared
+
+
+
+class ImmutableFancyHashMixin(object):
+    """
+    A L{FancyHashMixin} for objects whose compared attributes never change.
+
+    The hash is computed the first time it is needed and kept in C{_hash};
+    classes using C{__slots__} need to provide a slot for it. Since equal
+    objects have equal hashes, comparisons bail out early when the hashes
+    differ. This requires C{hashAttributes} to be a subset of
+    C{compareAttributes}. Naming the underlying slots instead of the
+    properties wrapping them keeps comparisons from calling any Python code.
+
+    Unlike L{FancyEqMixin}, an instance compares unequal to an instance of a
+    subclass which compares more attributes, instead of failing.
+
+    This is a new-style class without instance attributes of its own, so that
+    subclasses can use C{__slots__} and so that its C{__hash__} isn't shadowed
+    by C{object}'s.
+    """
+    __slots__ = ()
+    compareAttributes = hashAttributes = ()
+
+    def __hash__(self):
+        try:
+            return self._hash
+        except AttributeError:
+            values = tuple(getattr(self, name) for name in self.hashAttributes)
+            h = hash(values)
+            try:
+                self._hash = h
+            except AttributeError:
+                pass # no room to cache it
+            return h
+
+
+    def __eq__(self, other):
+        if self is other:
+            return True
+        cls = self.__class__
+        if not isinstance(self, other.__class__):
+            return NotImplemented
+        try:
+            if self._hash != other._hash:
+                return False
+        except AttributeError:
+            if hash(self) != hash(other):
+                return False
+
+        compared = _comparers.get(cls) or _comparedValues(cls)
+        try:
+            return compared(self) == compared(other)
+        except AttributeError:
+            return False
+
+
+    def __ne__(self, other):
+        result = self.__eq__(other)
+        if result is NotImplemented:
+            return result
+        return not result
@@ -0,0 +1,278 @@
+"""
+Timing wheels for expiring large numbers of entries cheaply.
+
+Instead of scheduling a delayed call per entry, entries are dropped into
+slots of a wheel which is advanced by a single L{LoopingCall}.
+"""
+from twisted.internet import task
+
+
+class TimingWheel(object):
+    """
+    A single-level timing wheel.
+
+    Each slot covers C{resolution} seconds. Entries further away than one
+    full revolution stay in their slot until the wheel has gone around often
+    enough for them to be due.
+
+    Entries go in the first slot starting at or after their expiry time, so
+    they never expire early. Cancelling an entry is not supported: owners
+    should check whether the entry is still live (and still due) when they
+    are told it expired.
+    """
+    def __init__(self, expire, resolution=1.0, slots=512, clock=None):
+        """
+        Initializes a timing wheel.
+
+        @param expire: Called with every key that has expired.
+        @type expire: one-argument callable
+        @param resolution: The amount of time covered by a single slot, in
+        seconds.
+        @type resolution: C{float}
+        @param slots: The number of slots in the wheel.
+        @type slots: C{int}
+        @param clock: The clock used to drive the wheel. Defaults to the
+        global reactor.
+        @type clock: L{twisted.internet.interfaces.IReactorTime}
+        """
+        if clock is None:
+            from twisted.internet import reactor as clock
+
+        self._expire = expire
+        self._resolution = resolution
+        self._slots = [[] for _ in xrange(slots)]
+        self._clock = clock
+        self._tick = self._tickFor(clock.seconds())
+        self._size = 0
+
+        self._call = task.LoopingCall(self.advance)
+        self._call.clock = clock
+
+
+    def __len__(self):
+        """
+        Returns the number of entries on the wheel, including those whose
+        owners have already discarded them.
+        """
+        return self._size
+
+
+    def _tickFor(self, when):
+        return int(when // self._resolution)
+
+
+    def _dueTick(self, when):
+        """
+        Gets the first tick starting at or after a given time.
+        """
+        tick = self._tickFor(when)
+        if tick * self._resolution < when:
+            tick += 1
+        return tick
+
+
+    def start(self):
+        """
+        Starts advancing the wheel periodically.
+        """
+        if not self._call.running:
+            self._call.start(self._resolution, now=False)
+
+
+    def stop(self):
+        """
+        Stops advancing the wheel.
+        """
+        if self._call.running:
+            self._call.stop()
+
+
+    def schedule(self, key, when):
+        """
+        Schedules a key to expire at a given time.
+
+        @param when: The time at which the key expires, in the same units as
+        the clock's C{seconds}.
+        @type when: C{float}
+        """
+        tick = max(self._dueTick(when), self._tick + 1)
+        self._slots[tick % len(self._slots)].append((tick, key))
+        self._size += 1
+
+
+    def advance(self):
+        """
+        Advances the wheel to the current time, expiring everything that has
+        become due.
+
+        If the wheel fell behind (for example because the reactor was busy),
+        all skipped slots are processed. Keys are only expired once the wheel
+        has moved on, so owners may schedule them again.
+        """
+        now = self._tickFor(self._clock.seconds())
+        slots, last = self._slots, self._tick
+        stop = min(now, last + len(slots))
+
+        due = []
+        for tick in xrange(last + 1, stop + 1):
+            index = tick % len(slots)
+            slot = slots[index]
+            if not slot:
+                continue
+
+            pending = []
+            for entry in slot:
+                if entry[0] <= now:
+                    due.append(entry[1])
+                else:
+                    pending.append(entry)
+            slots[index] = pending
+
+        self._tick = max(now, last)
+        self._size -= len(due)
+        for key in due:
+            self._expire(key)
+
+
+
+class HierarchicalTimingWheel(object):
+    """
+    A hierarchical timing wheel.
+
+    Level C{n} of the wheel has C{slots} slots which each cover
+    C{slots ** n} ticks. Entries are put on the coarsest level they fit in;
+    whenever a slot of a coarser level comes up, its entries are cascaded
+    down to finer levels. That way, a handful of small wheels cover a huge
+    range of expiry times, and every entry is only moved a few times.
+
+    Like L{TimingWheel}, entries never expire early, and cancelling them is
+    not supported.
+    """
+    def __init__(self, expire, resolution=1.0, slots=64, levels=4,
+                 clock=None):
+        """
+        Initializes a hierarchical timing wheel.
+
+        @param expire: Called with every key that has expired.
+        @type expire: one-argument callable
+        @param resolution: The amount of time covered by a single tick, in
+        seconds.
+        @type resolution: C{float}
+        @param slots: The number of slots on each level.
+        @type slots: C{int}
+        @param levels: The number of levels.
+        @type levels: C{int}
+        @param clock: The clock used to drive the wheel. Defaults to the
+        global reactor.
+        @type clock: L{twisted.internet.interfaces.IReactorTime}
+        """
+        if clock is None:
+            from twisted.internet import reactor as clock
+
+        self._expire = expire
+        self._resolution = resolution
+        self._slots = slots
+        self._spans = [slots ** level for level in xrange(levels + 1)]
+        self._levels = [[[] for _ in xrange(slots)] for _ in xrange(levels)]
+        self._clock = clock
+        self._tick = self._tickFor(clock.seconds())
+        self._size = 0
+
+        self._call = task.LoopingCall(self.advance)
+        self._call.clock = clock
+
+
+    def __len__(self):
+        """
+        Returns the number of entries on the wheel, including those whose
+        owners have already discarded them.
+        """
+        return self._size
+
+
+    def _tickFor(self, when):
+        return int(when // self._resolution)
+
+
+    def _dueTick(self, when):
+        """
+        Gets the first tick starting at or after a given time.
+        """
+        tick = self._tickFor(when)
+        if tick * self._resolution < when:
+            tick += 1
+        return tick
+
+
+    def start(self):
+        """
+        Starts advancing the wheel periodically.
+        """
+        if not self._call.running:
+            self._call.start(self._resolution, now=False)
+
+
+    def stop(self):
+        """
+        Stops advancing the wheel.
+        """
+        if self._call.running:
+            self._call.stop()
+
+
+    def schedule(self, key, when):
+        """
+        Schedules a key to expire at a given time.
+
+        @param when: The time at which the key expires, in the same units as
+        the clock's C{seconds}.
+        @type when: C{float}
+        """
+        tick = max(self._dueTick(when), self._tick + 1)
+        self._place(tick, key)
+        self._size += 1
+
+
+    def _place(self, tick, key):
+        """
+        Puts an entry on the coarsest level it fits in.
+        """
+        delta = tick - self._tick
+        spans, top = self._spans, len(self._levels) - 1
+        level = 0
+        while level < top and delta >= spans[level + 1]:
+            level += 1
+        index = (tick // spans[level]) % self._slots
+        self._levels[level][index].append((tick, key))
+
+
+    def advance(self):
+        """
+        Advances the wheel to the current time, expiring everything that has
+        become due.
+        """
+        now = self._tickFor(self._clock.seconds())
+        while self._tick < now:
+            self._tick += 1
+            self._advanceOne(self._tick)
+
+
+    def _advanceOne(self, tick):
+        """
+        Cascades and expires the slots that come up at a given tick.
+        """
+        slots, spans, levels = self._slots, self._spans, self._levels
+
+        for level in xrange(len(levels) - 1, 0, -1):
+            if tick % spans[level]:
+                continue
+            index = (tick // spans[level]) % slots
+            entries, levels[level][index] = levels[level][index], []
+            for entry in entries:
+                self._place(*entry)
+
+        index = tick % slots
+        entries, levels[0][index] = levels[0][index], []
+        self._size -= len(entries)
+        for _, key in entries:
+            self._expire(key)
@@ -1,15 +1,22 @@
 """
 Cred stuff for authenticating OAuth clients.
+
+Requests are adapted to client credentials. Those adapters are registered the
+first time anything is adapted to client credentials, so that importing this
+module doesn't import C{twisted.web}.
 """
 from txoauth.interfaces import IClient
+from txoauth.request import parseRequest
+from txoauth._cache import LRUCache
+from txoauth._twisted import ImmutableFancyHashMixin
 
 from twisted.cred.credentials import ICredentials
 from twisted.cred.portal import IRealm
 from twisted.internet import defer
 from twisted.python.components import registerAdapter
-from twisted.web.iweb import IRequest
 
 from zope.interface import implements, Attribute
+from zope.interface.interface import adapter_hooks
 
 
 _UNSET = object()
@@ -53,7 +60,7 @@ class ClientRealm(object):
     """
     implements(IRealm)
 
-    def __init__(self, redirectURIFactory):
+    def __init__(self, redirectURIFactory, cacheSize=None):
         """
         Initializes a client realm.
 
@@ -61,8 +68,14 @@ class ClientRealm(object):
         produced by this realm will use to find their registered redirect URI
         (if any).
         @type: L{txoauth.interfaces.IRedirectURIFactory}
+        @param cacheSize: If not C{None}, the realm keeps up to this many
+        clients around and hands out the same client (with its memoized
+        redirect URI) for every login with the same identifier. The least
+        recently used clients are evicted first.
+        @type cacheSize: C{int} or C{None}
         """
         self._redirectURIFactory = redirectURIFactory
+        self._clients = None if cacheSize is None else LRUCache(cacheSize)
 
 
     def requestAvatar(self, clientIdentifier, mind=None, *interfaces):
@@ -77,12 +90,34 @@ class ClientRealm(object):
         supports L{IClient}
         """
         if IClient in interfaces:
-            c = Client(clientIdentifier, self._redirectURIFactory)
+            c = self._getClient(clientIdentifier)
             return defer.succeed((IClient, c, lambda: None))
 
         raise NotImplementedError("ClientRealm only produces IClients")
 
 
+    def _getClient(self, clientIdentifier):
+        if self._clients is None:
+            return Client(clientIdentifier, self._redirectURIFactory)
+
+        c = self._clients.get(clientIdentifier)
+        if c is None:
+            c = Client(clientIdentifier, self._redirectURIFactory)
+            self._clients.set(clientIdentifier, c)
+        return c
+
+
+    def invalidate(self, clientIdentifier):
+        """
+        Forgets the cached client for an identifier.
+
+        Call this when a client's registration changes, so that the next
+        login produces a client which looks up its redirect URI again.
+        """
+        if self._clients is not None:
+            self._clients.pop(clientIdentifier)
+
+
 
 class IClientIdentifier(ICredentials):
     """
@@ -107,8 +142,10 @@ class IClientIdentifier(ICredentials):
 
 
 
-class ClientIdentifier(object):
+class ClientIdentifier(ImmutableFancyHashMixin):
     implements(IClientIdentifier)
+    __slots__ = ("_identifier", "_redirectURI", "_hash")
+    compareAttributes = hashAttributes = ("_identifier", "_redirectURI")
 
     def __init__(self, identifier, redirectURI=None):
         self._identifier = identifier
@@ -141,6 +178,10 @@ class IClientIdentifierSecret(IClientIdentifier):
 
 class ClientIdentifierSecret(ClientIdentifier):
     implements(IClientIdentifierSecret)
+    __slots__ = ("_secret",)
+    compareAttributes = hashAttributes = ("_identifier",
+                                          "_redirectURI",
+                                          "_secret")
 
     def __init__(self, identifier, secret, redirectURI=None):
         super(ClientIdentifierSecret, self).__init__(identifier, redirectURI)
@@ -159,20 +200,17 @@ def _extractClientCredentials(request):
     This will try to extract L{IClientIdentifierSecret}. If the secret is not
     present in the request, it will extract L{IClientIdentifier}. If neither
     the identifier nor the secret is present, it will raise C{TypeError}.
+
+    The request is only parsed once (see L{parseRequest}), no matter how
+    often it is adapted.
     """
-    identifier = request.getUser() or request.args.get("client_id")
-    if not identifier:
+    parsed = parseRequest(request)
+    if parsed.identifier is None:
         raise TypeError("request doesn't contain client identifier")
 
-    secret = request.getPassword() or request.args.get("client_secret")
-    if not secret:
-        return ClientIdentifier(identifier)
-    return ClientIdentifierSecret(identifier, secret)
-
-
-registerAdapter(_extractClientCredentials,
-                IRequest,
-                IClientIdentifier)
+    if parsed.secret is None:
+        return ClientIdentifier(parsed.identifier)
+    return ClientIdentifierSecret(parsed.identifier, parsed.secret)
 
 
 def _adaptToIClientIdentifierSecret(request):
@@ -182,6 +220,31 @@ def _adaptToIClientIdentifierSecret(request):
     return adapted
 
 
-registerAdapter(_adaptToIClientIdentifierSecret,
-                IRequest,
-                IClientIdentifierSecret)
+def _registerAdapters():
+    """
+    Registers the adapters from requests to client credentials.
+    """
+    from twisted.web.iweb import IRequest
+    registerAdapter(_extractClientCredentials,
+                    IRequest,
+                    IClientIdentifier)
+    registerAdapter(_adaptToIClientIdentifierSecret,
+                    IRequest,
+                    IClientIdentifierSecret)
+
+
+def _registerAdaptersOnFirstUse(interface, obj):
+    """
+    An adapter hook which registers the adapters to client credentials, and
+    removes itself, the first time something is adapted to them.
+    """
+    if not interface.isOrExtends(IClientIdentifier):
+        return None
+
+    if _registerAdaptersOnFirstUse in adapter_hooks:
+        adapter_hooks.remove(_registerAdaptersOnFirstUse)
+        _registerAdapters()
+    return interface(obj, None)
+
+
+adapter_hooks.append(_registerAdaptersOnFirstUse)
@@ -0,0 +1,112 @@
+"""
+An expiring, in-memory access token store.
+"""
+import os
+from base64 import urlsafe_b64encode
+
+from txoauth.token import AccessToken, AccessTokenNotFound
+from txoauth.interfaces import IAccessTokenStore
+from txoauth._wheel import HierarchicalTimingWheel
+
+from twisted.internet import defer
+
+from zope.interface import implements
+
+
+def _generateToken(size):
+    """
+    Generates a random, URL-safe access token from C{size} random bytes.
+    """
+    return urlsafe_b64encode(os.urandom(size)).rstrip("=")
+
+
+
+class MemoryAccessTokenStore(object):
+    """
+    An in-memory access token store which expires access tokens.
+
+    Access tokens are random strings, which are mapped to the client they
+    were issued to and the time at which they expire. Expired tokens are
+    removed by a hierarchical timing wheel, which is driven by a single
+    looping call no matter how many tokens are live, and which handles long
+    lifetimes without having a slot for every tick.
+    """
+    implements(IAccessTokenStore)
+
+    def __init__(self, expiresIn=3600, tokenSize=24, resolution=1.0,
+                 clock=None):
+        """
+        Initializes the access token store.
+
+        @param expiresIn: The default lifetime of access tokens, in seconds.
+        @type expiresIn: C{int}
+        @param tokenSize: The number of random bytes in an access token.
+        @type tokenSize: C{int}
+        @param resolution: The granularity of expiry, in seconds.
+        @type resolution: C{float}
+        @param clock: The clock used for expiry. Defaults to the global
+        reactor.
+        @type clock: L{twisted.internet.interfaces.IReactorTime}
+        """
+        if clock is None:
+            from twisted.internet import reactor as clock
+
+        self._expiresIn = expiresIn
+        self._tokenSize = tokenSize
+        self._clock = clock
+        self._tokens = {}
+
+        self._wheel = HierarchicalTimingWheel(self._expire, resolution,
+                                              clock=clock)
+        self._wheel.start()
+
+
+    def __len__(self):
+        """
+        Returns the number of access tokens in this store, including expired
+        ones which have not been removed yet.
+        """
+        return len(self._tokens)
+
+
+    def stop(self):
+        """
+        Stops expiring access tokens.
+        """
+        self._wheel.stop()
+
+
+    def _expire(self, accessToken):
+        entry = self._tokens.get(accessToken)
+        if entry is None:
+            return
+        if entry[1] <= self._clock.seconds():
+            del self._tokens[accessToken]
+        else:
+            self._wheel.schedule(accessToken, entry[1])
+
+
+    def issueAccessToken(self, clientIdentifier, expiresIn=None):
+        if expiresIn is None:
+            expiresIn = self._expiresIn
+
+        accessToken = _generateToken(self._tokenSize)
+        while accessToken in self._tokens:
+            accessToken = _generateToken(self._tokenSize)
+
+        deadline = self._clock.seconds() + expiresIn
+        self._tokens[accessToken] = clientIdentifier, deadline
+        self._wheel.schedule(accessToken, deadline)
+        return defer.succeed(AccessToken(accessToken, expiresIn))
+
+
+    def checkAccessToken(self, accessToken):
+        entry = self._tokens.get(accessToken)
+        if entry is None or entry[1] <= self._clock.seconds():
+            return defer.fail(AccessTokenNotFound())
+        return defer.succeed(entry[0])
+
+
+    def revokeAccessToken(self, accessToken):
+        self._tokens.pop(accessToken, None)
+        return defer.succeed(None)
@@ -0,0 +1,160 @@
+"""
+An in-memory store for short-lived authorization codes.
+"""
+import math
+
+from txoauth.token import AuthorizationCodeNotFound
+from txoauth.interfaces import IBatchAuthorizationCodeStore
+from txoauth.contrib.accesstokens import _generateToken
+
+from twisted.internet import defer, task
+from twisted.python.failure import Failure
+
+from zope.interface import implements
+
+
+class MemoryAuthorizationCodeStore(object):
+    """
+    An in-memory authorization code store, for codes which only live for a
+    minute or so.
+
+    Codes are kept in a ring buffer of dictionaries. Every dictionary holds
+    the codes expiring during one C{resolution}-long tick, and is tagged
+    with that tick. Codes start with the tick they expire in, so redeeming a
+    code only looks in one dictionary. Once a tick has passed, its whole
+    dictionary is dropped at once, by a single looping call: expiring codes
+    costs the same no matter how many there are.
+    """
+    implements(IBatchAuthorizationCodeStore)
+
+    def __init__(self, expiresIn=60, codeSize=16, resolution=1.0,
+                 clock=None):
+        """
+        Initializes the authorization code store.
+
+        @param expiresIn: The lifetime of authorization codes, in seconds.
+        @type expiresIn: C{float}
+        @param codeSize: The number of random bytes in an authorization code.
+        @type codeSize: C{int}
+        @param resolution: The granularity of expiry, in seconds. Expired
+        codes are never redeemed, but they are only dropped once the tick
+        they expired in has passed.
+        @type resolution: C{float}
+        @param clock: The clock used for expiry. Defaults to the global
+        reactor.
+        @type clock: L{twisted.internet.interfaces.IReactorTime}
+        """
+        if clock is None:
+            from twisted.internet import reactor as clock
+
+        self._expiresIn = expiresIn
+        self._codeSize = codeSize
+        self._resolution = resolution
+        self._clock = clock
+
+        slots = int(math.ceil(expiresIn / resolution)) + 2
+        self._ticks = [None] * slots
+        self._buckets = [{} for _ in xrange(slots)]
+
+        self._call = task.LoopingCall(self.sweep)
+        self._call.clock = clock
+        self._call.start(resolution, now=False)
+
+
+    def __len__(self):
+        """
+        Returns the number of authorization codes in this store, including
+        expired ones which have not been dropped yet.
+        """
+        return sum(len(bucket) for bucket in self._buckets)
+
+
+    def stop(self):
+        """
+        Stops dropping expired authorization codes.
+        """
+        if self._call.running:
+            self._call.stop()
+
+
+    def _tickFor(self, when):
+        return int(when // self._resolution)
+
+
+    def sweep(self):
+        """
+        Drops the authorization codes of every tick which has passed.
+        """
+        current = self._tickFor(self._clock.seconds())
+        for index, tick in enumerate(self._ticks):
+            if tick is not None and tick < current:
+                self._ticks[index] = None
+                self._buckets[index] = {}
+
+
+    def _bucketFor(self, tick):
+        """
+        Gets the dictionary for a tick, or C{None} if there isn't one.
+        """
+        index = tick % len(self._buckets)
+        if self._ticks[index] != tick:
+            return None
+        return self._buckets[index]
+
+
+    def issueAuthorizationCode(self, clientIdentifier, avatarId,
+                               redirectURI=None):
+        deadline = self._clock.seconds() + self._expiresIn
+        tick = self._tickFor(deadline)
+
+        bucket = self._bucketFor(tick)
+        if bucket is None:
+            index = tick % len(self._buckets)
+            self._ticks[index] = tick
+            self._buckets[index] = bucket = {}
+
+        prefix = "%x." % (tick,)
+        code = prefix + _generateToken(self._codeSize)
+        while code in bucket:
+            code = prefix + _generateToken(self._codeSize)
+
+        bucket[code] = clientIdentifier, redirectURI, avatarId, deadline
+        return defer.succeed(code)
+
+
+    def _redeem(self, authorizationCode):
+        """
+        Removes an authorization code, and returns the avatar ID it was
+        issued for if it's valid for the credentials it was presented with.
+        """
+        code = authorizationCode.authorizationCode
+        try:
+            tick = int(code.split(".", 1)[0], 16)
+        except ValueError:
+            raise AuthorizationCodeNotFound()
+
+        bucket = self._bucketFor(tick)
+        if bucket is None or code not in bucket:
+            raise AuthorizationCodeNotFound()
+        clientIdentifier, redirectURI, avatarId, deadline = bucket.pop(code)
+        credentials = authorizationCode.clientCredentials
+        if (deadline <= self._clock.seconds()
+            or credentials.identifier != clientIdentifier
+            or redirectURI is not None
+            and credentials.redirectURI != redirectURI):
+            raise AuthorizationCodeNotFound()
+        return avatarId
+
+
+    def redeemAuthorizationCode(self, authorizationCode):
+        return defer.maybeDeferred(self._redeem, authorizationCode)
+
+
+    def redeemAuthorizationCodes(self, authorizationCodes):
+        results = []
+        for authorizationCode in authorizationCodes:
+            try:
+                results.append(self._redeem(authorizationCode))
+            except AuthorizationCodeNotFound:
+                results.append(Failure())
+        return defer.succeed(results)
@@ -0,0 +1,85 @@
+"""
+Batching wrappers for txOAuth interfaces.
+"""
+from txoauth.interfaces import IRedirectURIFactory, IBatchRedirectURIFactory
+from txoauth._batch import TickBatcher
+
+from twisted.internet import defer
+
+from zope.interface import implements
+
+
+class BatchingRedirectURIFactory(object):
+    """
+    A redirect URI factory which batches lookups.
+
+    All lookups made during a single reactor iteration are sent to the
+    wrapped factory as one call to C{getRedirectURIs}, with every client
+    identifier appearing at most once. Factories which don't provide
+    L{IBatchRedirectURIFactory} are asked once per client identifier
+    instead.
+    """
+    implements(IBatchRedirectURIFactory)
+
+    def __init__(self, factory, clock=None):
+        """
+        Initializes a batching redirect URI factory.
+
+        @param factory: The factory to batch lookups for.
+        @type factory: L{IRedirectURIFactory}
+        @param clock: The clock used to schedule batches. Defaults to the
+        global reactor.
+        @type clock: L{twisted.internet.interfaces.IReactorTime}
+        """
+        self._factory = IRedirectURIFactory(factory)
+        self._batch = IBatchRedirectURIFactory.providedBy(self._factory)
+        self._batcher = TickBatcher(self._dispatch, clock)
+
+
+    def getRedirectURI(self, clientIdentifier):
+        return self._batcher.add(clientIdentifier)
+
+
+    def _lookUpOneByOne(self, clientIdentifiers):
+        """
+        Looks up redirect URIs one client at a time.
+
+        @return: A C{Deferred} firing with a mapping of client identifiers
+        to redirect URIs, or to a L{twisted.python.failure.Failure} if the
+        lookup failed.
+        """
+        clientIdentifiers = list(clientIdentifiers)
+        d = defer.DeferredList(
+            [defer.maybeDeferred(self._factory.getRedirectURI, i)
+             for i in clientIdentifiers], consumeErrors=True)
+
+        @d.addCallback
+        def collect(outcomes):
+            return dict((i, result) for i, (_, result)
+                        in zip(clientIdentifiers, outcomes))
+
+        return d
+
+
+    def getRedirectURIs(self, clientIdentifiers):
+        if self._batch:
+            return self._factory.getRedirectURIs(clientIdentifiers)
+        clientIdentifiers = list(clientIdentifiers)
+        d = defer.gatherResults(
+            [defer.maybeDeferred(self._factory.getRedirectURI, i)
+             for i in clientIdentifiers])
+        d.addCallback(lambda uris: dict(zip(clientIdentifiers, uris)))
+        return d
+
+
+    def _dispatch(self, clientIdentifiers):
+        if self._batch:
+            d = self._factory.getRedirectURIs(set(clientIdentifiers))
+        else:
+            d = self._lookUpOneByOne(set(clientIdentifiers))
+
+        @d.addCallback
+        def unpack(uris):
+            return [uris.get(i) for i in clientIdentifiers]
+
+        return d
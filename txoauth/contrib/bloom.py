@@ -0,0 +1,173 @@
+"""
+A Bloom filter in front of an assertion store.
+"""
+from txoauth.token import AssertionNotFound
+from txoauth.interfaces import IAssertionStore, IEnumerableAssertionStore
+from txoauth._bloom import CountingBloomFilter
+from txoauth._keys import assertionDigest
+
+from twisted.internet import defer, task
+
+from zope.interface import implements
+
+
+class BloomFilteredAssertionStore(object):
+    """
+    An assertion store which answers definite misses without asking the
+    store it wraps.
+
+    A counting Bloom filter holds every assertion added through this
+    wrapper. Checking an assertion which isn't in the filter fails right
+    away; only assertions which might be in the store are checked there.
+    Assertions are removed from the filter once they have been successfully
+    checked while invalidating them.
+
+    The filter is built from the wrapped store when the wrapper is created,
+    so the store has to provide L{IEnumerableAssertionStore}. A filter
+    which started out empty would reject assertions added by other
+    processes. Until the first build has finished, every check is passed on
+    to the wrapped store. The filter does not know when assertions expire,
+    so it is rebuilt periodically to forget them. Rebuilding also resets
+    counters which saturated, and which would otherwise never go down.
+
+    A failed add leaves the filter alone: an equal assertion may have been
+    added successfully, and removing its key could make it go missing. The
+    leftover key only causes false positives until the next rebuild.
+
+    @ivar rejected: The number of checks answered by the filter.
+    """
+    implements(IAssertionStore)
+
+    def __init__(self, store, capacity=1000000, errorRate=0.01,
+                 rebuildInterval=600, clock=None):
+        """
+        Initializes a Bloom filtered assertion store.
+
+        @param store: The assertion store to wrap. Only assertions added
+        through this wrapper, or listed by the store when the filter is
+        rebuilt, can be found.
+        @type store: L{IEnumerableAssertionStore}
+        @param capacity: The number of live assertions the filter is sized
+        for.
+        @type capacity: C{int}
+        @param errorRate: The rate at which missing assertions are passed on
+        to the wrapped store, when the filter is at capacity.
+        @type errorRate: C{float}
+        @param rebuildInterval: The time between rebuilds of the filter, in
+        seconds, or C{None} to only build it when the wrapper is created.
+        Without periodic rebuilds, expired assertions are never forgotten
+        and the filter slowly fills up.
+        @type rebuildInterval: C{float} or C{None}
+        @param clock: The clock used to schedule rebuilds. Defaults to the
+        global reactor.
+        @type clock: L{twisted.internet.interfaces.IReactorTime}
+        @raise TypeError: If C{store} doesn't provide
+        L{IEnumerableAssertionStore}.
+        """
+        if not IEnumerableAssertionStore.providedBy(store):
+            raise TypeError("can only filter stores providing "
+                            "IEnumerableAssertionStore")
+
+        self._store = store
+        self._capacity = capacity
+        self._errorRate = errorRate
+        self._filter = None
+        self._rebuilding = None
+        self._rebuildCall = None
+
+        self.rejected = 0
+
+        if rebuildInterval is None:
+            self.rebuild()
+        else:
+            if clock is None:
+                from twisted.internet import reactor as clock
+            self._rebuildCall = task.LoopingCall(self.rebuild)
+            self._rebuildCall.clock = clock
+            self._rebuildCall.start(rebuildInterval, now=True)
+
+
+    def _newFilter(self):
+        return CountingBloomFilter(self._capacity, self._errorRate)
+
+
+    def stop(self):
+        """
+        Stops rebuilding the filter periodically.
+        """
+        if self._rebuildCall is not None and self._rebuildCall.running:
+            self._rebuildCall.stop()
+
+
+    def rebuild(self):
+        """
+        Rebuilds the filter from the assertions in the wrapped store.
+
+        Assertions added while the filter is being rebuilt are added to the
+        new filter as well.
+
+        @return: A C{Deferred} which fires when the new filter is in use.
+        """
+        if self._rebuilding is not None:
+            return defer.succeed(None)
+
+        self._rebuilding = added = []
+        d = self._store.getAssertions()
+
+        @d.addBoth
+        def rebuilt(result):
+            self._rebuilding = None
+            return result
+
+        @d.addCallback
+        def swap(assertions):
+            new = self._newFilter()
+            for assertion in assertions:
+                new.add(assertionDigest(assertion))
+            for key in added:
+                new.add(key)
+            self._filter = new
+
+        return d
+
+
+    def addAssertion(self, assertion, *args, **kwargs):
+        """
+        Adds an assertion to the wrapped store, and to the filter.
+
+        Any extra arguments are passed on to the wrapped store.
+        """
+        self._addKey(assertionDigest(assertion))
+        return defer.maybeDeferred(self._store.addAssertion,
+                                   assertion, *args, **kwargs)
+
+
+    def _addKey(self, key):
+        if self._filter is not None:
+            self._filter.add(key)
+        if self._rebuilding is not None:
+            self._rebuilding.append(key)
+
+
+    def _removeKey(self, key):
+        if self._filter is not None:
+            self._filter.remove(key)
+        if self._rebuilding is not None and key in self._rebuilding:
+            self._rebuilding.remove(key)
+
+
+    def checkAssertion(self, assertion, invalidate=True):
+        key = assertionDigest(assertion)
+        if self._filter is not None and key not in self._filter:
+            self.rejected += 1
+            return defer.fail(AssertionNotFound())
+
+        d = self._store.checkAssertion(assertion, invalidate)
+
+        if invalidate:
+            @d.addCallback
+            def invalidated(result):
+                self._removeKey(key)
+                return result
+
+        return d
@@ -0,0 +1,92 @@
+"""
+Caching wrappers for txOAuth interfaces.
+"""
+from txoauth.interfaces import IRedirectURIFactory
+from txoauth._cache import LRUCache
+
+from twisted.internet import defer
+from twisted.python.failure import Failure
+
+from zope.interface import implements
+
+
+class CachingRedirectURIFactory(object):
+    """
+    A redirect URI factory which caches the results of another one.
+
+    The cache is a bounded LRU cache in which every entry has a time to live.
+    Clients without a registered redirect URI are cached as well, with their
+    own (usually shorter) time to live.
+
+    @ivar hits: The number of lookups answered from the cache.
+    @ivar misses: The number of lookups passed on to the wrapped factory.
+    """
+    implements(IRedirectURIFactory)
+
+    def __init__(self, factory, maxSize=10000, ttl=300, negativeTTL=30,
+                 clock=None):
+        """
+        Initializes a caching redirect URI factory.
+
+        @param factory: The factory to cache lookups for.
+        @type factory: L{IRedirectURIFactory}
+        @param maxSize: The maximum number of cached clients.
+        @type maxSize: C{int}
+        @param ttl: The time to live for registered redirect URIs, in
+        seconds.
+        @type ttl: C{float}
+        @param negativeTTL: The time to live for clients without a registered
+        redirect URI, in seconds.
+        @type negativeTTL: C{float}
+        @param clock: The clock used for expiry. Defaults to the global
+        reactor.
+        @type clock: L{twisted.internet.interfaces.IReactorTime}
+        """
+        if clock is None:
+            from twisted.internet import reactor as clock
+
+        self._factory = factory
+        self._cache = LRUCache(maxSize)
+        self._ttl = ttl
+        self._negativeTTL = negativeTTL
+        self._clock = clock
+        self._pending = {}
+
+        self.hits = self.misses = 0
+
+
+    def getRedirectURI(self, clientIdentifier):
+        entry = self._cache.get(clientIdentifier)
+        if entry is not None:
+            uri, expires = entry
+            if expires > self._clock.seconds():
+                self.hits += 1
+                return defer.succeed(uri)
+            self._cache.pop(clientIdentifier)
+
+        self.misses += 1
+        self._pending[clientIdentifier] = marker = object()
+        d = defer.maybeDeferred(self._factory.getRedirectURI,
+                                clientIdentifier)
+
+        @d.addBoth
+        def store(result):
+            if self._pending.get(clientIdentifier) is marker:
+                del self._pending[clientIdentifier]
+                if not isinstance(result, Failure):
+                    ttl = self._negativeTTL if result is None else self._ttl
+                    expires = self._clock.seconds() + ttl
+                    self._cache.set(clientIdentifier, (result, expires))
+            return result
+
+        return d
+
+
+    def invalidate(self, clientIdentifier):
+        """
+        Forgets the cached redirect URI for a client.
+
+        Lookups for this client which are in progress will not be cached.
+        """
+        self._cache.pop(clientIdentifier)
+        self._pending.pop(clientIdentifier, None)
@@ -0,0 +1,387 @@
+"""
+Credentials checkers for OAuth clients and access grants.
+"""
+import hmac, os
+from base64 import b64encode, b64decode
+from hashlib import sha256
+
+from txoauth.clientcred import IClientIdentifierSecret
+from txoauth.token import IAssertion, AssertionNotFound
+from txoauth.token import IAuthorizationCode, AuthorizationCodeNotFound
+from txoauth.token import IRefreshToken, RefreshTokenNotFound
+from txoauth.interfaces import IClientSecretStore, IBatchAssertionStore
+from txoauth.interfaces import IBatchAuthorizationCodeStore
+from txoauth.interfaces import IBatchRefreshTokenStore
+from txoauth._batch import TickBatcher
+from txoauth._cache import LRUCache
+from txoauth._crypto import compareDigests, pbkdf2
+
+from twisted.cred.checkers import ICredentialsChecker
+from twisted.cred.error import UnauthorizedLogin
+from twisted.internet import defer, threads
+
+from zope.interface import implements
+
+
+DEFAULT_ITERATIONS = 10000
+
+
+def hashSecret(secret, salt=None, iterations=DEFAULT_ITERATIONS):
+    """
+    Hashes a client secret with PBKDF2-HMAC-SHA256.
+
+    This is slow on purpose; don't call it from the reactor thread.
+
+    @param secret: The client secret.
+    @type secret: C{str}
+    @param salt: The salt. If C{None}, 16 random bytes are used.
+    @type salt: C{str}
+    @param iterations: The number of PBKDF2 iterations.
+    @type iterations: C{int}
+    @return: The hashed secret, in the form
+    C{pbkdf2_sha256$iterations$salt$hash}, with the salt and hash encoded in
+    base64.
+    @rtype: C{str}
+    """
+    if salt is None:
+        salt = os.urandom(16)
+    derived = pbkdf2("sha256", secret, salt, iterations)
+    return "pbkdf2_sha256$%d$%s$%s" % (iterations, b64encode(salt),
+                                       b64encode(derived))
+
+
+def verifySecret(secret, secretHash):
+    """
+    Checks a client secret against a hashed secret, in constant time.
+
+    This is slow on purpose; don't call it from the reactor thread.
+
+    @param secretHash: A hashed secret, as produced by L{hashSecret}.
+    @type secretHash: C{str}
+    @rtype: C{bool}
+    """
+    try:
+        algorithm, iterations, salt, expected = secretHash.split("$")
+        iterations = int(iterations)
+        salt, expected = b64decode(salt), b64decode(expected)
+    except (ValueError, TypeError):
+        return False
+    if algorithm != "pbkdf2_sha256":
+        return False
+    derived = pbkdf2("sha256", secret, salt, iterations, len(expected))
+    return compareDigests(derived, expected)
+
+
+
+class SimpleClientSecretStore(object):
+    """
+    A simplistic, in-memory client secret store.
+
+    This is a wrapper around a dictionary of hashed secrets.
+    """
+    implements(IClientSecretStore)
+
+    def __init__(self, **secretHashes):
+        self._secretHashes = secretHashes
+
+
+    def getSecretHash(self, clientIdentifier):
+        return defer.succeed(self._secretHashes.get(clientIdentifier))
+
+
+
+class ClientSecretChecker(object):
+    """
+    A credentials checker for client identifiers with shared secrets.
+
+    Secrets are stored hashed with PBKDF2 (see L{hashSecret}). Since that is
+    slow on purpose, it is done in a thread pool instead of the reactor
+    thread.
+
+    Successful verifications are remembered for a short while, so clients
+    that request tokens often don't pay for the key derivation every time.
+    The cache is keyed by an HMAC of the client identifier and secret, under
+    a key which is random for every checker: secrets are never kept in
+    memory, and the cache can't be used to test guesses without knowing the
+    key. Failed verifications are never cached.
+    """
+    implements(ICredentialsChecker)
+    credentialInterfaces = (IClientIdentifierSecret,)
+
+    def __init__(self, secretStore, threadpool=None, cacheSize=10000,
+                 cacheTTL=60, reactor=None):
+        """
+        Initializes a client secret checker.
+
+        @param secretStore: The store to look up hashed secrets in.
+        @type secretStore: L{IClientSecretStore}
+        @param threadpool: The thread pool to hash secrets in. Defaults to
+        the reactor's thread pool.
+        @type threadpool: L{twisted.python.threadpool.ThreadPool}
+        @param cacheSize: The maximum number of remembered verifications. If
+        C{0}, verifications are not remembered.
+        @type cacheSize: C{int}
+        @param cacheTTL: The time verifications are remembered for, in
+        seconds.
+        @type cacheTTL: C{float}
+        @param reactor: The reactor. Defaults to the global reactor.
+        """
+        if reactor is None:
+            from twisted.internet import reactor
+
+        self._secretStore = secretStore
+        self._threadpool = threadpool
+        self._reactor = reactor
+        self._cache = LRUCache(cacheSize) if cacheSize else None
+        self._cacheTTL = cacheTTL
+        self._cacheKey = os.urandom(32)
+
+
+    def _cacheKeyFor(self, credentials):
+        identifier, secret = credentials.identifier, credentials.secret
+        if isinstance(identifier, unicode):
+            identifier = identifier.encode("utf-8")
+        if isinstance(secret, unicode):
+            secret = secret.encode("utf-8")
+        message = "%d:%s%s" % (len(identifier), identifier, secret)
+        return hmac.new(self._cacheKey, message, sha256).digest()
+
+
+    def _verify(self, secret, secretHash):
+        if isinstance(secret, unicode):
+            secret = secret.encode("utf-8")
+        threadpool = self._threadpool
+        if threadpool is None:
+            threadpool = self._reactor.getThreadPool()
+        return threads.deferToThreadPool(self._reactor, threadpool,
+                                         verifySecret, secret, secretHash)
+
+
+    def requestAvatarId(self, credentials):
+        identifier = credentials.identifier
+
+        if self._cache is not None:
+            key = self._cacheKeyFor(credentials)
+            expires = self._cache.get(key)
+            if expires is not None:
+                if expires > self._reactor.seconds():
+                    return defer.succeed(identifier)
+                self._cache.pop(key)
+
+        d = self._secretStore.getSecretHash(identifier)
+
+        @d.addCallback
+        def verify(secretHash):
+            if secretHash is None:
+                raise UnauthorizedLogin()
+            return self._verify(credentials.secret, secretHash)
+
+        @d.addCallback
+        def verified(valid):
+            if not valid:
+                raise UnauthorizedLogin()
+            if self._cache is not None:
+                expires = self._reactor.seconds() + self._cacheTTL
+                self._cache.set(key, expires)
+            return identifier
+
+        return d
+
+
+
+class AuthorizationCodeChecker(object):
+    """
+    A credentials checker for authorization codes.
+
+    Checking an authorization code redeems it, so every code can only be
+    exchanged for an access token once. The avatar ID is whatever the code
+    was issued for.
+    """
+    implements(ICredentialsChecker)
+    credentialInterfaces = (IAuthorizationCode,)
+
+    def __init__(self, codeStore):
+        """
+        Initializes an authorization code checker.
+
+        @param codeStore: The store to redeem authorization codes with.
+        @type codeStore: L{txoauth.interfaces.IAuthorizationCodeStore}
+        """
+        self._codeStore = codeStore
+
+
+    def requestAvatarId(self, credentials):
+        d = self._codeStore.redeemAuthorizationCode(credentials)
+
+        @d.addErrback
+        def notFound(failure):
+            failure.trap(AuthorizationCodeNotFound)
+            raise UnauthorizedLogin()
+
+        return d
+
+
+
+class RefreshTokenChecker(object):
+    """
+    A credentials checker for refresh tokens.
+
+    Checking a refresh token rotates it. The avatar ID is a
+    L{txoauth.token.RefreshTokenRotation}, holding what the token's family
+    was issued for and the new refresh token, which the realm should return
+    along with the access token.
+    """
+    implements(ICredentialsChecker)
+    credentialInterfaces = (IRefreshToken,)
+
+    def __init__(self, tokenStore):
+        """
+        Initializes a refresh token checker.
+
+        @param tokenStore: The store to rotate refresh tokens with.
+        @type tokenStore: L{txoauth.interfaces.IRefreshTokenStore}
+        """
+        self._tokenStore = tokenStore
+
+
+    def requestAvatarId(self, credentials):
+        d = self._tokenStore.rotateRefreshToken(credentials)
+
+        @d.addErrback
+        def notFound(failure):
+            failure.trap(RefreshTokenNotFound)
+            raise UnauthorizedLogin()
+
+        return d
+
+
+
+def _checkOneByOne(check, items):
+    """
+    Checks items one at a time, for stores which can't check many at once.
+
+    @return: A C{Deferred} firing with a list holding, for every item, the
+    result of checking it or a L{twisted.python.failure.Failure}.
+    """
+    d = defer.DeferredList([defer.maybeDeferred(check, item)
+                            for item in items], consumeErrors=True)
+
+    @d.addCallback
+    def results(outcomes):
+        return [result for _, result in outcomes]
+
+    return d
+
+
+
+class _BatchingChecker(object):
+    """
+    A credentials checker which sends all checks made during a single
+    reactor iteration to its store as one batch.
+
+    Every caller still gets its own result: a credential which isn't found
+    only fails the check it was presented to.
+
+    @cvar batchInterface: The interface of stores which can check batches.
+    @cvar notFound: The exception the store fails with for credentials it
+    doesn't know.
+    """
+    implements(ICredentialsChecker)
+
+    def __init__(self, store, clock=None):
+        """
+        Initializes a batching checker.
+
+        @param store: The store to check credentials with. If it doesn't
+        provide C{batchInterface}, the credentials of a batch are checked
+        one at a time.
+        @param clock: The clock used to schedule batches. Defaults to the
+        global reactor.
+        @type clock: L{twisted.internet.interfaces.IReactorTime}
+        """
+        self._store = store
+        self._batcher = TickBatcher(self._dispatch, clock)
+
+
+    def _dispatch(self, credentials):
+        if self.batchInterface.providedBy(self._store):
+            return self._checkMany(credentials)
+        return _checkOneByOne(self._checkOne, credentials)
+
+
+    def requestAvatarId(self, credentials):
+        d = self._batcher.add(credentials)
+
+        @d.addErrback
+        def notFound(failure):
+            failure.trap(self.notFound)
+            raise UnauthorizedLogin()
+
+        return d
+
+
+
+class BatchingAssertionChecker(_BatchingChecker):
+    """
+    A credentials checker for assertions, which checks them in batches.
+
+    Checking an assertion invalidates it. The avatar ID is the identifier
+    of the client which presented it.
+    """
+    credentialInterfaces = (IAssertion,)
+    batchInterface = IBatchAssertionStore
+    notFound = AssertionNotFound
+
+    def _checkOne(self, assertion):
+        return self._store.checkAssertion(assertion)
+
+
+    def _checkMany(self, assertions):
+        return self._store.checkAssertions(assertions)
+
+
+    def requestAvatarId(self, credentials):
+        d = _BatchingChecker.requestAvatarId(self, credentials)
+        d.addCallback(lambda _: credentials.clientCredentials.identifier)
+        return d
+
+
+
+class BatchingAuthorizationCodeChecker(_BatchingChecker):
+    """
+    A credentials checker for authorization codes, which redeems them in
+    batches.
+
+    Like L{AuthorizationCodeChecker}, the avatar ID is whatever the code was
+    issued for.
+    """
+    credentialInterfaces = (IAuthorizationCode,)
+    batchInterface = IBatchAuthorizationCodeStore
+    notFound = AuthorizationCodeNotFound
+
+    def _checkOne(self, authorizationCode):
+        return self._store.redeemAuthorizationCode(authorizationCode)
+
+
+    def _checkMany(self, authorizationCodes):
+        return self._store.redeemAuthorizationCodes(authorizationCodes)
+
+
+
+class BatchingRefreshTokenChecker(_BatchingChecker):
+    """
+    A credentials checker for refresh tokens, which rotates them in batches.
+
+    Like L{RefreshTokenChecker}, the avatar ID is a
+    L{txoauth.token.RefreshTokenRotation}.
+    """
+    credentialInterfaces = (IRefreshToken,)
+    batchInterface = IBatchRefreshTokenStore
+    notFound = RefreshTokenNotFound
+
+    def _checkOne(self, refreshToken):
+        return self._store.rotateRefreshToken(refreshToken)
+
+
+    def _checkMany(self, refreshTokens):
+        return self._store.rotateRefreshTokens(refreshTokens)
@@ -0,0 +1,58 @@
+"""
+Request coalescing for txOAuth interfaces.
+"""
+from txoauth.interfaces import IRedirectURIFactory
+
+from twisted.internet import defer
+from twisted.python.failure import Failure
+
+from zope.interface import implements
+
+
+class CoalescingRedirectURIFactory(object):
+    """
+    A redirect URI factory which coalesces concurrent lookups.
+
+    While a lookup for a client is in progress, further lookups for the same
+    client wait for its result instead of hitting the wrapped factory again.
+    Every caller gets its own C{Deferred}, so callers can't interfere with
+    each other's callback chains.
+    """
+    implements(IRedirectURIFactory)
+
+    def __init__(self, factory):
+        """
+        Initializes a coalescing redirect URI factory.
+
+        @param factory: The factory to coalesce lookups for.
+        @type factory: L{IRedirectURIFactory}
+        """
+        self._factory = factory
+        self._waiting = {}
+
+
+    def getRedirectURI(self, clientIdentifier):
+        d = defer.Deferred()
+
+        waiting = self._waiting.get(clientIdentifier)
+        if waiting is not None:
+            waiting.append(d)
+            return d
+
+        self._waiting[clientIdentifier] = [d]
+        lookup = defer.maybeDeferred(self._factory.getRedirectURI,
+                                     clientIdentifier)
+        lookup.addBoth(self._fanOut, clientIdentifier)
+        return d
+
+
+    def _fanOut(self, result, clientIdentifier):
+        """
+        Passes the result of a lookup on to everyone waiting for it.
+        """
+        waiting = self._waiting.pop(clientIdentifier)
+        for d in waiting:
+            if isinstance(result, Failure):
+                d.errback(result)
+            else:
+                d.callback(result)
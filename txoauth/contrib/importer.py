@@ -0,0 +1,124 @@
+"""
+Streaming import of assertions.
+"""
+try:
+    import json
+except ImportError:
+    import simplejson as json
+
+from txoauth import clientcred, token
+from txoauth.interfaces import IBulkAssertionStore
+
+from twisted.internet import defer
+
+
+def _encode(value):
+    if isinstance(value, unicode):
+        return value.encode("utf-8")
+    return value
+
+
+def parseAssertion(line):
+    """
+    Parses an assertion from a line of newline-delimited JSON.
+
+    Every line is an object with C{client_id}, C{assertion_type} and
+    C{assertion} keys, all strings.
+
+    @rtype: L{token.Assertion}
+    @raise ValueError: If the line isn't such an object.
+    """
+    record = json.loads(line)
+    try:
+        identifier = record["client_id"]
+        assertionType = record["assertion_type"]
+        assertion = record["assertion"]
+    except (KeyError, TypeError):
+        raise ValueError("not an assertion record: %r" % (line,))
+
+    credentials = clientcred.ClientIdentifier(_encode(identifier))
+    return token.Assertion(credentials, _encode(assertionType),
+                           _encode(assertion))
+
+
+def _chunks(lines, chunkSize):
+    """
+    Parses lines into lists of at most C{chunkSize} assertions.
+    """
+    chunk, number = [], 0
+    for line in lines:
+        number += 1
+        if not line.strip():
+            continue
+        try:
+            chunk.append(parseAssertion(line))
+        except ValueError, e:
+            raise ValueError("line %d: %s" % (number, e))
+        if len(chunk) >= chunkSize:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _addChunk(store, chunk):
+    if IBulkAssertionStore.providedBy(store):
+        return store.addAssertions(chunk)
+    return defer.gatherResults([defer.maybeDeferred(store.addAssertion, a)
+                                for a in chunk])
+
+
+def importAssertions(store, lines, chunkSize=1000, clock=None):
+    """
+    Adds assertions read from newline-delimited JSON to a store.
+
+    Lines are read lazily and added to the store in chunks. The next chunk
+    is only read once the previous one has been added, and only in a later
+    reactor iteration, so importing a huge file takes constant memory and
+    doesn't block the reactor.
+
+    If the store provides L{IBulkAssertionStore}, every chunk is added with
+    a single call to C{addAssertions}.
+
+    @param store: The store to add assertions to.
+    @type store: L{txoauth.interfaces.IAssertionStore}
+    @param lines: The lines to read assertions from, as parsed by
+    L{parseAssertion}; for instance, an open file. Blank lines are skipped.
+    @type lines: iterable of C{str}
+    @param chunkSize: The number of assertions in a chunk.
+    @type chunkSize: C{int}
+    @param clock: The clock used to schedule chunks. Defaults to the global
+    reactor.
+    @type clock: L{twisted.internet.interfaces.IReactorTime}
+    @return: A C{Deferred} firing with the number of imported assertions,
+    or failing with C{ValueError} if a line is malformed. Assertions from
+    earlier lines will have been added by then.
+    """
+    if clock is None:
+        from twisted.internet import reactor as clock
+
+    chunks = _chunks(lines, chunkSize)
+    done = defer.Deferred()
+    imported = [0]
+
+    def addNext():
+        try:
+            chunk = chunks.next()
+        except StopIteration:
+            done.callback(imported[0])
+            return
+        except:
+            done.errback()
+            return
+
+        d = _addChunk(store, chunk)
+
+        @d.addCallback
+        def added(_):
+            imported[0] += len(chunk)
+            clock.callLater(0, addNext)
+
+        d.addErrback(done.errback)
+
+    clock.callLater(0, addNext)
+    return done
@@ -0,0 +1,269 @@
+"""
+A shared assertion store on top of memcached.
+"""
+from txoauth.token import EnforcedInvalidationException, AssertionNotFound
+from txoauth.interfaces import IAssertionStore
+from txoauth._keys import assertionDigest
+
+from twisted.internet import defer, protocol
+from twisted.protocols.memcache import MemCacheProtocol, DEFAULT_PORT
+
+from zope.interface import implements
+
+
+class _PooledMemCacheProtocol(MemCacheProtocol):
+    """
+    A memcache protocol which tells its pool when it's disconnected, and
+    which stops its timeout when that happens.
+    """
+    pool = None
+    outstanding = 0
+
+    def connectionLost(self, reason):
+        MemCacheProtocol.connectionLost(self, reason)
+        self.setTimeout(None)
+        if self.pool is not None:
+            self.pool._connectionLost(self)
+
+
+
+class MemCachePool(object):
+    """
+    A bounded pool of memcache connections.
+
+    Commands are pipelined: every command is sent on the connection with the
+    fewest outstanding commands right away, without waiting for earlier
+    responses. New connections are made as long as the pool isn't full and
+    all existing connections are busy. Connections which are lost are
+    replaced when they are needed again.
+    """
+    def __init__(self, host="localhost", port=DEFAULT_PORT, size=4,
+                 timeOut=60, reactor=None):
+        """
+        Initializes a memcache connection pool.
+
+        @param host: The host the memcache server runs on.
+        @type host: C{str}
+        @param port: The port the memcache server listens on.
+        @type port: C{int}
+        @param size: The maximum number of connections.
+        @type size: C{int}
+        @param timeOut: The time to wait for a response before giving up on a
+        connection, in seconds.
+        @type timeOut: C{int}
+        @param reactor: The reactor. Defaults to the global reactor.
+        """
+        if reactor is None:
+            from twisted.internet import reactor
+
+        self._host, self._port = host, port
+        self._size = size
+        self._creator = protocol.ClientCreator(reactor,
+                                               _PooledMemCacheProtocol,
+                                               timeOut)
+        self._connections = []
+        self._connecting = 0
+        self._waiting = []
+        self._closing = None
+
+
+    def _connect(self):
+        self._connecting += 1
+        d = self._creator.connectTCP(self._host, self._port)
+
+        @d.addCallback
+        def connected(connection):
+            self._connecting -= 1
+            connection.pool = self
+            self._connections.append(connection)
+            if self._closing is not None:
+                connection.transport.loseConnection()
+            waiting, self._waiting = self._waiting, []
+            for d in waiting:
+                d.callback(connection)
+
+        @d.addErrback
+        def failed(failure):
+            self._connecting -= 1
+            if not self._connecting:
+                waiting, self._waiting = self._waiting, []
+                for d in waiting:
+                    d.errback(failure)
+            self._checkClosed()
+
+
+    def _connectionLost(self, connection):
+        self._connections.remove(connection)
+        self._checkClosed()
+
+
+    def _checkClosed(self):
+        """
+        Fires the C{Deferred} returned by L{close} once all connections are
+        gone.
+        """
+        closing = self._closing
+        if closing is None or closing.called:
+            return
+        if not self._connections and not self._connecting:
+            closing.callback(None)
+
+
+    def _getConnection(self):
+        """
+        Gets the connection to send the next command on.
+        """
+        if self._connections:
+            connection = min(self._connections, key=lambda c: c.outstanding)
+            if connection.outstanding and self._canGrow():
+                self._connect()
+            return defer.succeed(connection)
+
+        if self._canGrow():
+            self._connect()
+        elif not self._connecting:
+            return defer.fail(RuntimeError("memcache pool is closed"))
+
+        d = defer.Deferred()
+        self._waiting.append(d)
+        return d
+
+
+    def _canGrow(self):
+        size = len(self._connections) + self._connecting
+        return self._closing is None and size < self._size
+
+
+    def run(self, command, *args, **kwargs):
+        """
+        Runs a memcache command.
+
+        @param command: The name of a L{MemCacheProtocol} method.
+        @type command: C{str}
+        @return: A C{Deferred} firing with the result of that method.
+        """
+        def send(connection):
+            connection.outstanding += 1
+            d = getattr(connection, command)(*args, **kwargs)
+            d.addBoth(done, connection)
+            return d
+
+        def done(result, connection):
+            connection.outstanding -= 1
+            return result
+
+        return self._getConnection().addCallback(send)
+
+
+    def close(self):
+        """
+        Disconnects all connections.
+
+        @return: A C{Deferred} firing when all connections are closed.
+        """
+        self._closing = d = defer.Deferred()
+        for connection in self._connections:
+            connection.transport.loseConnection()
+        self._checkClosed()
+        return d
+
+
+
+def _key(prefix, assertion):
+    """
+    Gets the memcache key for an assertion.
+
+    Memcache keys are limited in length and can't contain whitespace, so
+    the client identifier, assertion type and assertion are hashed.
+    """
+    return prefix + assertionDigest(assertion).encode("hex")
+
+
+# Memcached takes larger expiration times for absolute Unix times.
+_MAX_RELATIVE_EXPIRY = 30 * 24 * 3600
+
+
+class MemCacheAssertionStore(object):
+    """
+    An assertion store which keeps assertions in memcached.
+
+    Assertions are identified by their client identifier, type and value.
+
+    Checking an assertion while invalidating it deletes its key: memcached
+    reports whether the key existed, so only one check can ever succeed, no
+    matter how many nodes share the server.
+    """
+    implements(IAssertionStore)
+
+    def __init__(self, pool, forceInvalidation=True, ttl=600,
+                 prefix="txoauth:assertion:", clock=None):
+        """
+        Initializes the assertion store.
+
+        @param pool: The pool of memcache connections to use.
+        @type pool: L{MemCachePool}
+        @param forceInvalidation: If true, assertions can only be checked
+        while invalidating them.
+        @type forceInvalidation: C{bool}
+        @param ttl: The default time to live for assertions, in seconds.
+        @type ttl: C{int}
+        @param prefix: A prefix for all keys used by this store.
+        @type prefix: C{str}
+        @param clock: The clock used to compute the expiration time of
+        assertions which live longer than 30 days. Defaults to the global
+        reactor.
+        @type clock: L{twisted.internet.interfaces.IReactorTime}
+        """
+        if clock is None:
+            from twisted.internet import reactor as clock
+
+        self._clock = clock
+        self._pool = pool
+        self._forceInvalidation = forceInvalidation
+        self._ttl = ttl
+        self._prefix = prefix
+
+
+    def addAssertion(self, assertion, ttl=None):
+        """
+        Adds an assertion to this assertion store.
+
+        @param ttl: The time to live for this assertion, in seconds. If
+        C{None}, the store's default is used.
+        @type ttl: C{int} or C{None}
+        @return: A C{Deferred} which fires when the assertion has been
+        stored.
+        """
+        if ttl is None:
+            ttl = self._ttl
+        if ttl > _MAX_RELATIVE_EXPIRY:
+            expireTime = int(self._clock.seconds() + ttl)
+        else:
+            expireTime = max(int(ttl), 1) # 0 would never expire
+        key = _key(self._prefix, assertion)
+        d = self._pool.run("set", key, "1", expireTime=expireTime)
+
+        @d.addCallback
+        def stored(success):
+            if not success:
+                raise RuntimeError("memcached didn't store the assertion")
+
+        return d
+
+
+    def checkAssertion(self, assertion, invalidate=True):
+        key = _key(self._prefix, assertion)
+        if invalidate:
+            d = self._pool.run("delete", key)
+        elif self._forceInvalidation:
+            return defer.fail(EnforcedInvalidationException())
+        else:
+            d = self._pool.run("get", key)
+            d.addCallback(lambda result: result[1] is not None)
+
+        @d.addCallback
+        def checked(found):
+            if not found:
+                raise AssertionNotFound()
+
+        return d
@@ -0,0 +1,97 @@
+"""
+Rate limiting of clients.
+"""
+from txoauth.interfaces import IRateLimiter
+from txoauth._cache import LRUCache
+
+from zope.interface import implements
+
+
+class TokenBucketRateLimiter(object):
+    """
+    A rate limiter giving every client a token bucket.
+
+    A client's bucket holds up to C{burst} tokens, and is refilled at
+    C{rate} tokens per second; every request takes a token. Buckets are
+    refilled lazily: instead of a token count and a timestamp, the only
+    thing kept per client is the time at which its bucket will be full
+    again, a single C{float}.
+
+    A client whose bucket is full is the same as a client without a bucket,
+    so when there are more than C{maxClients} buckets, the least recently
+    used one is evicted. Evicting a bucket can only let a client make more
+    requests, never fewer, so memory is bounded without ever rejecting a
+    request which should be allowed.
+    """
+    implements(IRateLimiter)
+
+    def __init__(self, rate=10.0, burst=20, limits=None, maxClients=100000,
+                 clock=None):
+        """
+        Initializes a token bucket rate limiter.
+
+        @param rate: The default number of requests per second a client may
+        make in the long run.
+        @type rate: C{float}
+        @param burst: The default number of requests a client may make at
+        once, after having been idle.
+        @type burst: C{int}
+        @param limits: Limits for specific clients, mapping client
+        identifiers to C{(rate, burst)} tuples.
+        @type limits: C{dict}
+        @param maxClients: The maximum number of clients to keep buckets
+        for.
+        @type maxClients: C{int}
+        @param clock: The clock used to refill buckets. Defaults to the
+        global reactor.
+        @type clock: L{twisted.internet.interfaces.IReactorTime}
+        """
+        if clock is None:
+            from twisted.internet import reactor as clock
+
+        self._default = self._limit(rate, burst)
+        self._limits = {}
+        for clientIdentifier, (rate, burst) in (limits or {}).iteritems():
+            self.setLimit(clientIdentifier, rate, burst)
+
+        self._fullAt = LRUCache(maxClients)
+        self._clock = clock
+
+
+    def _limit(self, rate, burst):
+        """
+        Converts a limit to the time a token takes to refill, and the time
+        an empty bucket takes to fill up to all but one token.
+        """
+        if rate <= 0 or burst < 1:
+            raise ValueError("rate and burst must be positive")
+        interval = 1.0 / rate
+        return interval, (burst - 1) * interval
+
+
+    def setLimit(self, clientIdentifier, rate, burst):
+        """
+        Sets the limit for a client.
+        """
+        self._limits[clientIdentifier] = self._limit(rate, burst)
+
+
+    def removeLimit(self, clientIdentifier):
+        """
+        Makes a client use the default limit again.
+        """
+        self._limits.pop(clientIdentifier, None)
+
+
+    def consume(self, clientIdentifier):
+        interval, tolerance = self._limits.get(clientIdentifier,
+                                               self._default)
+        now = self._clock.seconds()
+        fullAt = max(self._fullAt.get(clientIdentifier, now), now)
+
+        wait = fullAt - now - tolerance
+        if wait > 0:
+            return wait
+
+        self._fullAt.set(clientIdentifier, fullAt + interval)
+        return 0
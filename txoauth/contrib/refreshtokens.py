@@ -0,0 +1,188 @@
+"""
+An in-memory refresh token store which rotates refresh tokens.
+"""
+from txoauth.token import RefreshTokenRotation, RefreshTokenNotFound
+from txoauth.interfaces import IBatchRefreshTokenStore
+from txoauth.contrib.accesstokens import _generateToken
+from txoauth._wheel import HierarchicalTimingWheel
+
+from twisted.internet import defer
+from twisted.python.failure import Failure
+
+from zope.interface import implements
+
+
+_FAMILY_ID_SIZE = 12
+
+
+class _Family(object):
+    """
+    A refresh token family.
+
+    @ivar generation: The generation of the client when this family was
+    issued. Once the client has been revoked, its generation is newer.
+    @ivar refreshToken: The newest token of this family, which is the only
+    one which can be rotated.
+    @ivar deadline: The time at which the newest token expires.
+    """
+    __slots__ = ("clientIdentifier", "avatarId", "generation",
+                 "refreshToken", "deadline")
+
+    def __init__(self, clientIdentifier, avatarId, generation):
+        self.clientIdentifier = clientIdentifier
+        self.avatarId = avatarId
+        self.generation = generation
+        self.refreshToken = None
+        self.deadline = None
+
+
+
+class MemoryRefreshTokenStore(object):
+    """
+    An in-memory refresh token store.
+
+    Refresh tokens start with the random ID of their family, so every token
+    ever issued leads back to its family without being kept: a family only
+    holds its newest token. Presenting any other token of a live family, or
+    presenting a token for the wrong client, revokes the family.
+
+    Every client has a generation, which is stamped on the families issued
+    to it. Revoking all families of a client only moves it to the next
+    generation: families of an older generation are dropped when one of
+    their tokens is presented, or when the timing wheel reaches them.
+
+    Tokens expire C{expiresIn} seconds after they were issued. Expired
+    families are removed by a hierarchical timing wheel, which is driven by
+    a single looping call.
+    """
+    implements(IBatchRefreshTokenStore)
+
+    def __init__(self, expiresIn=14 * 24 * 3600, tokenSize=24,
+                 resolution=1.0, clock=None):
+        """
+        Initializes the refresh token store.
+
+        @param expiresIn: The lifetime of refresh tokens, in seconds.
+        Rotating a token starts the lifetime of the new token afresh.
+        @type expiresIn: C{float}
+        @param tokenSize: The number of random bytes in a refresh token,
+        besides the ID of its family.
+        @type tokenSize: C{int}
+        @param resolution: The granularity of expiry, in seconds.
+        @type resolution: C{float}
+        @param clock: The clock used for expiry. Defaults to the global
+        reactor.
+        @type clock: L{twisted.internet.interfaces.IReactorTime}
+        """
+        if clock is None:
+            from twisted.internet import reactor as clock
+
+        self._expiresIn = expiresIn
+        self._tokenSize = tokenSize
+        self._clock = clock
+        self._families = {}
+        self._generations = {}
+
+        self._wheel = HierarchicalTimingWheel(self._expire, resolution,
+                                              clock=clock)
+        self._wheel.start()
+
+
+    def __len__(self):
+        """
+        Returns the number of refresh tokens in this store, including expired
+        and revoked ones which have not been removed yet.
+        """
+        return len(self._families)
+
+
+    def stop(self):
+        """
+        Stops expiring refresh tokens.
+        """
+        self._wheel.stop()
+
+
+    def _isCurrent(self, family):
+        """
+        Checks whether the client of a family has not been revoked since the
+        family was issued.
+        """
+        return family.generation == self._generations.get(
+            family.clientIdentifier, 0)
+
+
+    def _expire(self, familyId):
+        family = self._families.get(familyId)
+        if family is None:
+            return
+        if (family.deadline <= self._clock.seconds()
+            or not self._isCurrent(family)):
+            del self._families[familyId]
+        else:
+            self._wheel.schedule(familyId, family.deadline)
+
+
+    def _newToken(self, familyId, family):
+        family.refreshToken = "%s.%s" % (familyId,
+                                         _generateToken(self._tokenSize))
+        family.deadline = self._clock.seconds() + self._expiresIn
+        return family.refreshToken
+
+
+    def issueRefreshToken(self, clientIdentifier, avatarId):
+        familyId = _generateToken(_FAMILY_ID_SIZE)
+        while familyId in self._families:
+            familyId = _generateToken(_FAMILY_ID_SIZE)
+
+        generation = self._generations.get(clientIdentifier, 0)
+        family = self._families[familyId] = _Family(clientIdentifier,
+                                                    avatarId, generation)
+        refreshToken = self._newToken(familyId, family)
+        self._wheel.schedule(familyId, family.deadline)
+        return defer.succeed(refreshToken)
+
+
+    def _rotate(self, refreshToken):
+        presented = refreshToken.refreshToken
+        familyId = presented.split(".", 1)[0]
+        family = self._families.get(familyId)
+        if family is None:
+            raise RefreshTokenNotFound()
+
+        identifier = refreshToken.clientCredentials.identifier
+        if (identifier != family.clientIdentifier
+            or presented != family.refreshToken
+            or family.deadline <= self._clock.seconds()
+            or not self._isCurrent(family)):
+            del self._families[familyId]
+            raise RefreshTokenNotFound()
+
+        return RefreshTokenRotation(family.avatarId,
+                                    self._newToken(familyId, family))
+
+
+    def rotateRefreshToken(self, refreshToken):
+        return defer.maybeDeferred(self._rotate, refreshToken)
+
+
+    def rotateRefreshTokens(self, refreshTokens):
+        results = []
+        for refreshToken in refreshTokens:
+            try:
+                results.append(self._rotate(refreshToken))
+            except RefreshTokenNotFound:
+                results.append(Failure())
+        return defer.succeed(results)
+
+
+    def revokeRefreshToken(self, refreshToken):
+        self._families.pop(refreshToken.split(".", 1)[0], None)
+        return defer.succeed(None)
+
+
+    def revokeClient(self, clientIdentifier):
+        generations = self._generations
+        generations[clientIdentifier] = generations.get(clientIdentifier,
+                                                        0) + 1
+        return defer.succeed(None)
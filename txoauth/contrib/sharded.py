@@ -0,0 +1,210 @@
+"""
+A sharded, expiring, in-memory assertion store.
+"""
+from txoauth.token import EnforcedInvalidationException, AssertionNotFound
+from txoauth.interfaces import IExpiringAssertionStore, IBulkAssertionStore
+from txoauth.interfaces import IClientIndexedAssertionStore
+from txoauth.interfaces import IBatchAssertionStore
+from txoauth._wheel import TimingWheel
+
+from twisted.internet import defer
+from twisted.python.failure import Failure
+
+from zope.interface import implements
+
+
+class ShardedAssertionStore(object):
+    """
+    An in-memory assertion store which expires assertions.
+
+    Assertions are identified by their client identifier, type and value.
+
+    Assertions are spread over a number of shards, so that no single
+    dictionary has to be resized when the store holds millions of entries.
+    Every assertion gets a time to live; expired assertions are removed by a
+    timing wheel, which is driven by a single looping call instead of a
+    delayed call per assertion.
+
+    The assertions of every client are also kept in a set of their own, so
+    they can be found without looking through the shards.
+    """
+    implements(IExpiringAssertionStore, IBulkAssertionStore,
+               IClientIndexedAssertionStore, IBatchAssertionStore)
+
+    def __init__(self, forceInvalidation=True, ttl=600, shards=16,
+                 resolution=1.0, clock=None):
+        """
+        Initializes the assertion store.
+
+        @param forceInvalidation: If true, assertions can only be checked
+        while invalidating them.
+        @type forceInvalidation: C{bool}
+        @param ttl: The default time to live for assertions, in seconds.
+        @type ttl: C{float}
+        @param shards: The number of shards to spread assertions over.
+        @type shards: C{int}
+        @param resolution: The granularity of expiry, in seconds.
+        @type resolution: C{float}
+        @param clock: The clock used for expiry. Defaults to the global
+        reactor.
+        @type clock: L{twisted.internet.interfaces.IReactorTime}
+        """
+        if clock is None:
+            from twisted.internet import reactor as clock
+
+        self._forceInvalidation = forceInvalidation
+        self._ttl = ttl
+        self._clock = clock
+        self._shards = [{} for _ in xrange(shards)]
+        self._byClient = {}
+
+        slots = max(int(ttl // resolution) + 1, 1)
+        self._wheel = TimingWheel(self._expire, resolution, slots, clock)
+        self._wheel.start()
+
+
+    def __len__(self):
+        """
+        Returns the number of assertions in this store, including expired
+        ones which have not been removed yet.
+        """
+        return sum(len(shard) for shard in self._shards)
+
+
+    def stop(self):
+        """
+        Stops expiring assertions.
+        """
+        self._wheel.stop()
+
+
+    def _shardFor(self, assertion):
+        return self._shards[hash(assertion) % len(self._shards)]
+
+
+    def _index(self, assertion):
+        identifier = assertion.clientCredentials.identifier
+        clientAssertions = self._byClient.get(identifier)
+        if clientAssertions is None:
+            clientAssertions = self._byClient[identifier] = set()
+        clientAssertions.add(assertion)
+
+
+    def _unindex(self, assertion):
+        identifier = assertion.clientCredentials.identifier
+        clientAssertions = self._byClient.get(identifier)
+        if clientAssertions is not None:
+            clientAssertions.discard(assertion)
+            if not clientAssertions:
+                del self._byClient[identifier]
+
+
+    def _expire(self, assertion):
+        shard = self._shardFor(assertion)
+        deadline = shard.get(assertion)
+        if deadline is None:
+            return
+        if deadline <= self._clock.seconds():
+            del shard[assertion]
+            self._unindex(assertion)
+        else:
+            self._wheel.schedule(assertion, deadline)
+
+
+    def addAssertion(self, assertion, ttl=None):
+        """
+        Adds an assertion to this assertion store.
+
+        @param ttl: The time to live for this assertion, in seconds. If
+        C{None}, the store's default is used.
+        @type ttl: C{float} or C{None}
+        """
+        if ttl is None:
+            ttl = self._ttl
+        deadline = self._clock.seconds() + ttl
+        self._shardFor(assertion)[assertion] = deadline
+        self._index(assertion)
+        self._wheel.schedule(assertion, deadline)
+
+
+    def addAssertions(self, assertions, ttl=None):
+        """
+        Adds assertions to this assertion store.
+
+        @param ttl: The time to live for these assertions, in seconds. If
+        C{None}, the store's default is used.
+        @type ttl: C{float} or C{None}
+        """
+        if ttl is None:
+            ttl = self._ttl
+        deadline = self._clock.seconds() + ttl
+        shards, schedule = self._shards, self._wheel.schedule
+        index = self._index
+        count = len(shards)
+        for assertion in assertions:
+            shards[hash(assertion) % count][assertion] = deadline
+            index(assertion)
+            schedule(assertion, deadline)
+        return defer.succeed(None)
+
+
+    def checkAssertion(self, assertion, invalidate=True):
+        if not invalidate and self._forceInvalidation:
+            return defer.fail(EnforcedInvalidationException())
+
+        shard = self._shardFor(assertion)
+        if invalidate:
+            deadline = shard.pop(assertion, None)
+            if deadline is not None:
+                self._unindex(assertion)
+        else:
+            deadline = shard.get(assertion)
+
+        if deadline is None or deadline <= self._clock.seconds():
+            return defer.fail(AssertionNotFound())
+        return defer.succeed(None)
+
+
+    def checkAssertions(self, assertions):
+        now = self._clock.seconds()
+        results = []
+        for assertion in assertions:
+            deadline = self._shardFor(assertion).pop(assertion, None)
+            if deadline is not None:
+                self._unindex(assertion)
+            if deadline is None or deadline <= now:
+                results.append(Failure(AssertionNotFound()))
+            else:
+                results.append(None)
+        return defer.succeed(results)
+
+
+    def getAssertions(self):
+        now = self._clock.seconds()
+        return defer.succeed([assertion
+                              for shard in self._shards
+                              for assertion, deadline in shard.iteritems()
+                              if deadline > now])
+
+
+    def getAssertionDeadlines(self):
+        now = self._clock.seconds()
+        return defer.succeed([(assertion, deadline)
+                              for shard in self._shards
+                              for assertion, deadline in shard.iteritems()
+                              if deadline > now])
+
+
+    def revokeClient(self, clientIdentifier):
+        for assertion in self._byClient.pop(clientIdentifier, ()):
+            self._shardFor(assertion).pop(assertion, None)
+        return defer.succeed(None)
+
+
+    def countAssertions(self, clientIdentifier):
+        now = self._clock.seconds()
+        count = 0
+        for assertion in self._byClient.get(clientIdentifier, ()):
+            if self._shardFor(assertion)[assertion] > now:
+                count += 1
+        return defer.succeed(count)
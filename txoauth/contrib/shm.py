@@ -0,0 +1,244 @@
+"""
+An assertion store shared by all processes on a host, in a memory-mapped
+file.
+
+This module requires a POSIX platform.
+"""
+import fcntl, mmap, os, struct
+
+from txoauth.token import EnforcedInvalidationException, AssertionNotFound
+from txoauth.interfaces import IAssertionStore
+from txoauth._keys import assertionDigest
+
+from twisted.internet import defer
+
+from zope.interface import implements
+
+
+_MAGIC = "TXOASHM1"
+_HEADER = struct.Struct("<8sII")
+_SLOT = struct.Struct("<B3x20sd")
+
+_EMPTY, _LIVE, _DELETED = 0, 1, 2
+
+
+class TableFull(Exception):
+    """
+    Raised when an assertion can't be added because the part of the table
+    it belongs in is full.
+    """
+
+
+
+class SharedMemoryAssertionStore(object):
+    """
+    An assertion store which keeps assertions in a memory-mapped file, so
+    that every process on a host which opens the same file shares the same
+    assertions.
+
+    The file holds a fixed-size open addressing hash table. Every slot holds
+    a state, a SHA-1 digest of the assertion's client identifier, type and
+    value, and the time at which the assertion expires. The table is split
+    into stripes of consecutive slots: an assertion is always stored in the
+    stripe its digest points to, and all operations on a stripe happen while
+    holding an exclusive C{lockf} lock on its byte range. That makes checking
+    and invalidating an assertion atomic across processes, while operations
+    on different stripes don't contend.
+
+    Expired slots are reused by later additions, so the table never needs
+    pruning. Since the expiry times are shared between processes, the clock
+    should be the wall clock.
+    """
+    implements(IAssertionStore)
+
+    def __init__(self, path, forceInvalidation=True, ttl=600, slots=2 ** 20,
+                 stripeSize=64, clock=None):
+        """
+        Initializes the assertion store, creating the file if necessary.
+
+        @param path: The path to the shared file.
+        @type path: C{str}
+        @param forceInvalidation: If true, assertions can only be checked
+        while invalidating them.
+        @type forceInvalidation: C{bool}
+        @param ttl: The default time to live for assertions, in seconds.
+        @type ttl: C{float}
+        @param slots: The number of slots in the table, if the file is
+        created. Existing files keep their size.
+        @type slots: C{int}
+        @param stripeSize: The number of slots in a stripe, if the file is
+        created. C{slots} must be a multiple of it.
+        @type stripeSize: C{int}
+        @param clock: The clock used for expiry. Defaults to the global
+        reactor.
+        @type clock: L{twisted.internet.interfaces.IReactorTime}
+        """
+        if clock is None:
+            from twisted.internet import reactor as clock
+
+        if slots < 1 or stripeSize < 1 or slots % stripeSize:
+            raise ValueError("slots must be a positive multiple of "
+                             "stripeSize")
+
+        self._forceInvalidation = forceInvalidation
+        self._ttl = ttl
+        self._clock = clock
+
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0600)
+        try:
+            self._slots, self._stripeSize = self._initialize(slots,
+                                                             stripeSize)
+            size = _HEADER.size + self._slots * _SLOT.size
+            self._map = mmap.mmap(self._fd, size)
+        except:
+            os.close(self._fd)
+            raise
+        self._stripes = self._slots // self._stripeSize
+
+
+    def _initialize(self, slots, stripeSize):
+        """
+        Writes the header and sizes the file if it is new, or reads the
+        header if it isn't.
+
+        @return: The number of slots and the stripe size.
+        """
+        fcntl.lockf(self._fd, fcntl.LOCK_EX, _HEADER.size, 0)
+        try:
+            if os.fstat(self._fd).st_size == 0:
+                os.ftruncate(self._fd, _HEADER.size + slots * _SLOT.size)
+                header = _HEADER.pack(_MAGIC, slots, stripeSize)
+                os.write(self._fd, header)
+                return slots, stripeSize
+
+            header = os.read(self._fd, _HEADER.size)
+            magic, slots, stripeSize = _HEADER.unpack(header)
+            if magic != _MAGIC:
+                raise ValueError("not a shared assertion table")
+            return slots, stripeSize
+        finally:
+            fcntl.lockf(self._fd, fcntl.LOCK_UN, _HEADER.size, 0)
+
+
+    def close(self):
+        """
+        Unmaps and closes the shared file.
+        """
+        self._map.close()
+        os.close(self._fd)
+
+
+    def _locate(self, digest):
+        """
+        Finds the stripe for a digest, and the slot in it to start probing
+        at.
+
+        @return: The offset of the stripe in the file, and the index of the
+        first slot to probe.
+        """
+        high, low = struct.unpack_from("<QI", digest)
+        stripe = high % self._stripes
+        start = _HEADER.size + stripe * self._stripeSize * _SLOT.size
+        return start, low % self._stripeSize
+
+
+    def _withStripe(self, digest, f, *args):
+        """
+        Calls C{f} with the offset of a digest's stripe and the first slot
+        to probe, while holding the lock on that stripe.
+        """
+        start, first = self._locate(digest)
+        length = self._stripeSize * _SLOT.size
+        fcntl.lockf(self._fd, fcntl.LOCK_EX, length, start)
+        try:
+            return f(start, first, digest, *args)
+        finally:
+            fcntl.lockf(self._fd, fcntl.LOCK_UN, length, start)
+
+
+    def _probe(self, start, first):
+        """
+        Yields the offsets of the slots in a stripe, in probing order.
+        """
+        stripeSize, slotSize = self._stripeSize, _SLOT.size
+        for i in xrange(stripeSize):
+            yield start + ((first + i) % stripeSize) * slotSize
+
+
+    def _find(self, start, first, digest, now):
+        """
+        Finds the slot holding a live assertion with a given digest.
+
+        @return: The offset of the slot, or C{None}.
+        """
+        m, unpack = self._map, _SLOT.unpack_from
+        for offset in self._probe(start, first):
+            state, slotDigest, expires = unpack(m, offset)
+            if state == _EMPTY:
+                return None
+            if state == _LIVE and slotDigest == digest and expires > now:
+                return offset
+        return None
+
+
+    def _add(self, start, first, digest, expires, now):
+        m, unpack = self._map, _SLOT.unpack_from
+        free = None
+        for offset in self._probe(start, first):
+            state, slotDigest, slotExpires = unpack(m, offset)
+            if state == _EMPTY:
+                if free is None:
+                    free = offset
+                break
+            if state == _LIVE and slotDigest == digest:
+                free = offset
+                break
+            if free is None and (state == _DELETED or slotExpires <= now):
+                free = offset
+
+        if free is None:
+            raise TableFull()
+        _SLOT.pack_into(m, free, _LIVE, digest, expires)
+
+
+    def _check(self, start, first, digest, now, invalidate):
+        offset = self._find(start, first, digest, now)
+        if offset is None:
+            return False
+        if invalidate:
+            _SLOT.pack_into(self._map, offset, _DELETED, digest, 0.0)
+        return True
+
+
+    def addAssertion(self, assertion, ttl=None):
+        """
+        Adds an assertion to this assertion store.
+
+        @param ttl: The time to live for this assertion, in seconds. If
+        C{None}, the store's default is used.
+        @type ttl: C{float} or C{None}
+        @return: A C{Deferred} which fires when the assertion has been
+        added, or fails with L{TableFull}.
+        """
+        if ttl is None:
+            ttl = self._ttl
+        now = self._clock.seconds()
+        return defer.maybeDeferred(self._withStripe,
+                                   assertionDigest(assertion), self._add,
+                                   now + ttl, now)
+
+
+    def checkAssertion(self, assertion, invalidate=True):
+        if not invalidate and self._forceInvalidation:
+            return defer.fail(EnforcedInvalidationException())
+
+        d = defer.maybeDeferred(self._withStripe,
+                                assertionDigest(assertion), self._check,
+                                self._clock.seconds(), invalidate)
+
+        @d.addCallback
+        def checked(found):
+            if not found:
+                raise AssertionNotFound()
+
+        return d
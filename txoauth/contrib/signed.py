@@ -0,0 +1,244 @@
+"""
+Self-contained access tokens, signed with HMAC.
+"""
+import heapq, hmac, os
+from base64 import urlsafe_b64encode, urlsafe_b64decode
+from hashlib import sha256
+
+from txoauth.token import AccessToken, AccessTokenNotFound
+from txoauth.interfaces import IAccessTokenStore
+from txoauth._crypto import compareDigests
+
+from twisted.internet import defer
+
+from zope.interface import implements
+
+
+def _encode(data):
+    return urlsafe_b64encode(data).rstrip("=")
+
+
+def _decode(data):
+    return urlsafe_b64decode(data + "=" * (-len(data) % 4))
+
+
+class KeySet(object):
+    """
+    A set of signing keys, identified by key ids.
+
+    New tokens are signed with the current key. Tokens signed with any key in
+    the set can be verified, so keys can be rotated by adding a new current
+    key, and retiring the previous one once the tokens it signed have
+    expired.
+    """
+    def __init__(self, keys=(), currentKeyId=None):
+        """
+        Initializes a key set.
+
+        @param keys: Pairs of key ids and secret keys.
+        @type keys: iterable of C{(str, str)}
+        @param currentKeyId: The id of the key to sign with. Defaults to the
+        id of the last key.
+        @type currentKeyId: C{str}
+        """
+        self._keys = {}
+        self.currentKeyId = None
+        for keyId, secret in keys:
+            self.addKey(keyId, secret)
+        if currentKeyId is not None:
+            if currentKeyId not in self._keys:
+                raise KeyError(currentKeyId)
+            self.currentKeyId = currentKeyId
+
+
+    def addKey(self, keyId, secret, current=True):
+        """
+        Adds a key to this key set.
+
+        @param keyId: The id of the key. It can't contain C{"|"}.
+        @type keyId: C{str}
+        @param secret: The secret key.
+        @type secret: C{str}
+        @param current: If true, new tokens are signed with this key.
+        @type current: C{bool}
+        """
+        if "|" in keyId:
+            raise ValueError("key ids can't contain '|'")
+        self._keys[keyId] = secret
+        if current:
+            self.currentKeyId = keyId
+
+
+    def retireKey(self, keyId):
+        """
+        Removes a key from this key set. Tokens signed with it are no longer
+        valid.
+
+        The current key can't be retired.
+        """
+        if keyId == self.currentKeyId:
+            raise ValueError("can't retire the current key")
+        del self._keys[keyId]
+
+
+    def getKey(self, keyId):
+        """
+        Gets the secret key with a given id, or C{None} if there is none.
+        """
+        return self._keys.get(keyId)
+
+
+
+class SignedAccessTokenStore(object):
+    """
+    An access token store which issues self-contained, signed tokens.
+
+    A token carries the id of the key it was signed with, its expiry time, a
+    random nonce and the client identifier, followed by an HMAC-SHA256 of
+    all that. Checking a token doesn't need any I/O: anything that has the
+    key set can do it, in process.
+
+    Tokens can still be revoked: revoked tokens are kept on a revocation
+    list until they would have expired anyway, so the list only ever holds
+    tokens that would otherwise still be valid.
+    """
+    implements(IAccessTokenStore)
+
+    def __init__(self, keySet, expiresIn=3600, nonceSize=8, clock=None):
+        """
+        Initializes the access token store.
+
+        @param keySet: The keys to sign and verify tokens with.
+        @type keySet: L{KeySet}
+        @param expiresIn: The default lifetime of access tokens, in seconds.
+        @type expiresIn: C{int}
+        @param nonceSize: The number of random bytes in every token.
+        @type nonceSize: C{int}
+        @param clock: The clock used for expiry. Defaults to the global
+        reactor.
+        @type clock: L{twisted.internet.interfaces.IReactorTime}
+        """
+        if clock is None:
+            from twisted.internet import reactor as clock
+
+        self.keySet = keySet
+        self._expiresIn = expiresIn
+        self._nonceSize = nonceSize
+        self._clock = clock
+
+        self._revoked = {}
+        self._revokedByExpiry = []
+
+
+    def sign(self, clientIdentifier, expiresIn=None):
+        """
+        Creates a signed access token.
+
+        @return: The access token.
+        @rtype: C{str}
+        """
+        if expiresIn is None:
+            expiresIn = self._expiresIn
+        if isinstance(clientIdentifier, unicode):
+            clientIdentifier = clientIdentifier.encode("utf-8")
+
+        keyId = self.keySet.currentKeyId
+        expires = int(self._clock.seconds() + expiresIn)
+        nonce = _encode(os.urandom(self._nonceSize))
+        payload = "|".join([keyId, str(expires), nonce, clientIdentifier])
+        mac = hmac.new(self.keySet.getKey(keyId), payload, sha256).digest()
+        return _encode(payload) + "." + _encode(mac)
+
+
+    def verify(self, accessToken):
+        """
+        Verifies a signed access token.
+
+        @return: The identifier of the client the token was issued to.
+        @rtype: C{str}
+        @raise AccessTokenNotFound: If the token is malformed, has an invalid
+        signature, has expired or has been revoked.
+        """
+        keyId, nonce, expires, clientIdentifier = self._parse(accessToken)
+        now = self._clock.seconds()
+        if expires <= now:
+            raise AccessTokenNotFound()
+
+        if self._revoked:
+            self._pruneRevoked(now)
+            if (keyId, nonce) in self._revoked:
+                raise AccessTokenNotFound()
+
+        return clientIdentifier
+
+
+    def _parse(self, accessToken):
+        """
+        Parses a signed access token and checks its signature.
+
+        @return: The key id, nonce, expiry time and client identifier.
+        @raise AccessTokenNotFound: If the token is malformed or has an
+        invalid signature.
+        """
+        try:
+            encodedPayload, encodedMac = str(accessToken).split(".")
+            payload, mac = _decode(encodedPayload), _decode(encodedMac)
+            keyId, expires, nonce, clientIdentifier = payload.split("|", 3)
+            expires = int(expires)
+        except (ValueError, TypeError):
+            raise AccessTokenNotFound()
+
+        key = self.keySet.getKey(keyId)
+        if key is None:
+            raise AccessTokenNotFound()
+        expected = hmac.new(key, payload, sha256).digest()
+        if not compareDigests(mac, expected):
+            raise AccessTokenNotFound()
+
+        return keyId, nonce, expires, clientIdentifier
+
+
+    def revoke(self, accessToken):
+        """
+        Revokes a signed access token.
+
+        Malformed tokens, tokens with invalid signatures and expired tokens
+        are ignored, since they aren't valid anyway.
+        """
+        try:
+            keyId, nonce, expires, _ = self._parse(accessToken)
+        except AccessTokenNotFound:
+            return
+
+        now = self._clock.seconds()
+        self._pruneRevoked(now)
+        key = keyId, nonce
+        if expires > now and key not in self._revoked:
+            self._revoked[key] = expires
+            heapq.heappush(self._revokedByExpiry, (expires, key))
+
+
+    def _pruneRevoked(self, now):
+        """
+        Forgets revoked tokens which have expired.
+        """
+        heap = self._revokedByExpiry
+        while heap and heap[0][0] <= now:
+            _, key = heapq.heappop(heap)
+            del self._revoked[key]
+
+
+    def issueAccessToken(self, clientIdentifier, expiresIn=None):
+        if expiresIn is None:
+            expiresIn = self._expiresIn
+        accessToken = self.sign(clientIdentifier, expiresIn)
+        return defer.succeed(AccessToken(accessToken, expiresIn))
+
+
+    def checkAccessToken(self, accessToken):
+        return defer.maybeDeferred(self.verify, accessToken)
+
+
+    def revokeAccessToken(self, accessToken):
+        self.revoke(accessToken)
+        return defer.succeed(None)
@@ -2,9 +2,13 @@
 Simple implementations of some txOAuth interfaces.
 """
 from txoauth.token import EnforcedInvalidationException, AssertionNotFound
-from txoauth.interfaces import IRedirectURIFactory, IAssertionStore
+from txoauth.interfaces import IBatchRedirectURIFactory
+from txoauth.interfaces import IEnumerableAssertionStore, IBulkAssertionStore
+from txoauth.interfaces import IClientIndexedAssertionStore
+from txoauth.interfaces import IBatchAssertionStore
 
 from twisted.internet import defer
+from twisted.python.failure import Failure
 
 from zope.interface import implements
 
@@ -15,7 +19,7 @@ class SimpleRedirectURIFactory(object):
 
     This is a wrapper around a dictionary.
     """
-    implements(IRedirectURIFactory)
+    implements(IBatchRedirectURIFactory)
 
     def __init__(self, **redirectURIs):
         """
@@ -31,12 +35,47 @@ class SimpleRedirectURIFactory(object):
         return defer.succeed(uri)
 
 
+    def getRedirectURIs(self, clientIdentifiers):
+        uris = dict((i, self._uris.get(i)) for i in clientIdentifiers)
+        return defer.succeed(uris)
+
+
+    def getAllRedirectURIs(self):
+        """
+        Gets every registered redirect URI.
+
+        @return: A C{Deferred} firing with a copy of the mapping of client
+        identifiers to redirect URIs (or C{None}).
+        """
+        return defer.succeed(dict(self._uris))
+
+
+    def addRedirectURIs(self, redirectURIs):
+        """
+        Registers redirect URIs, replacing any registered for the same
+        clients.
+
+        @param redirectURIs: A mapping of client identifiers to redirect URIs
+        (or C{None}).
+        @type redirectURIs: C{dict}
+        """
+        self._uris.update(redirectURIs)
+        return defer.succeed(None)
+
+
 
 class SimpleAssertionStore(object):
     """
     A simplistic, in-memory assertion store.
+
+    Assertions are identified by their client identifier, type and value.
+
+    Besides the set of assertions, a set of assertions is kept for every
+    client identifier, so the assertions of a client can be found without
+    looking at all others.
     """
-    implements(IAssertionStore)
+    implements(IEnumerableAssertionStore, IBulkAssertionStore,
+               IClientIndexedAssertionStore, IBatchAssertionStore)
 
     def __init__(self, forceInvalidation=True):
         """
@@ -44,16 +83,41 @@ class SimpleAssertionStore(object):
         """
         self._forceInvalidation = forceInvalidation
         self._assertions = set()
+        self._byClient = {}
 
 
     def addAssertion(self, assertion):
         self._assertions.add(assertion)
+        identifier = assertion.clientCredentials.identifier
+        self._byClient.setdefault(identifier, set()).add(assertion)
+
+
+    def addAssertions(self, assertions):
+        assertions = list(assertions)
+        self._assertions.update(assertions)
+        byClient = self._byClient
+        for assertion in assertions:
+            identifier = assertion.clientCredentials.identifier
+            clientAssertions = byClient.get(identifier)
+            if clientAssertions is None:
+                clientAssertions = byClient[identifier] = set()
+            clientAssertions.add(assertion)
+        return defer.succeed(None)
+
+
+    def _remove(self, assertion):
+        self._assertions.remove(assertion)
+        identifier = assertion.clientCredentials.identifier
+        clientAssertions = self._byClient[identifier]
+        clientAssertions.discard(assertion)
+        if not clientAssertions:
+            del self._byClient[identifier]
 
 
     def checkAssertion(self, assertion, invalidate=True):
         if invalidate:
             try:
-                self._assertions.remove(assertion)
+                self._remove(assertion)
                 return defer.succeed(None)
             except KeyError:
                 return defer.fail(AssertionNotFound())
@@ -64,3 +128,28 @@ class SimpleAssertionStore(object):
                 return defer.succeed(None)
             else:
                 return defer.fail(AssertionNotFound())
+
+
+    def checkAssertions(self, assertions):
+        results = []
+        for assertion in assertions:
+            try:
+                self._remove(assertion)
+                results.append(None)
+            except KeyError:
+                results.append(Failure(AssertionNotFound()))
+        return defer.succeed(results)
+
+
+    def getAssertions(self):
+        return defer.succeed(list(self._assertions))
+
+
+    def revokeClient(self, clientIdentifier):
+        clientAssertions = self._byClient.pop(clientIdentifier, ())
+        self._assertions.difference_update(clientAssertions)
+        return defer.succeed(None)
+
+
+    def countAssertions(self, clientIdentifier):
+        return defer.succeed(len(self._byClient.get(clientIdentifier, ())))
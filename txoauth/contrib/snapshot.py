@@ -0,0 +1,452 @@
+"""
+Snapshots of in-memory stores, for fast warm restarts.
+
+Snapshots are compact binary files: a header, followed by length-prefixed
+records. They are written atomically (to a temporary file which is then
+renamed), and read through a memory map.
+"""
+import mmap, os, struct
+from itertools import izip, repeat
+
+from txoauth import clientcred, token
+from txoauth.interfaces import IEnumerableAssertionStore, IBulkAssertionStore
+from txoauth.interfaces import IExpiringAssertionStore
+from txoauth.contrib.simple import SimpleRedirectURIFactory
+
+from twisted.internet import defer, task, threads
+
+
+_MAGIC = "TXOASNP3"
+_HEADER = struct.Struct("<8sBQ")
+_ASSERTIONS, _REDIRECT_URIS = 1, 2
+
+_ASSERTION = struct.Struct("<IIIiid")
+_REDIRECT_URI = struct.Struct("<Ii")
+
+_CHUNK_SIZE = 10000
+
+
+def _encode(value):
+    if isinstance(value, unicode):
+        return value.encode("utf-8")
+    return value
+
+
+def _optionalLength(value):
+    """
+    Gets the length of an optional field, or C{-1} if it's C{None}.
+    """
+    if value is None:
+        return -1
+    return len(value)
+
+
+def _writeAtomically(path, kind, count, chunks):
+    """
+    Writes a snapshot to a temporary file, and renames it to C{path} once
+    it is safely on disk.
+
+    @param chunks: Iterable of strings making up the records.
+    """
+    temporaryPath = path + ".tmp"
+    f = open(temporaryPath, "wb")
+    try:
+        f.write(_HEADER.pack(_MAGIC, kind, count))
+        for chunk in chunks:
+            f.write(chunk)
+        f.flush()
+        os.fsync(f.fileno())
+    finally:
+        f.close()
+    os.rename(temporaryPath, path)
+
+
+def _chunked(records):
+    """
+    Joins records into strings of up to L{_CHUNK_SIZE} records each.
+    """
+    chunk = []
+    for record in records:
+        chunk.append(record)
+        if len(chunk) >= _CHUNK_SIZE:
+            yield "".join(chunk)
+            chunk = []
+    yield "".join(chunk)
+
+
+def _read(path, kind, readRecords):
+    """
+    Reads the records of a snapshot through a memory map.
+
+    @param readRecords: Called with the map, the offset of the first record
+    and the number of records. Returns the records and the offset of the
+    end of the last one.
+    @raise ValueError: If the file isn't a complete snapshot of the right
+    kind.
+    """
+    f = open(path, "rb")
+    try:
+        m = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    finally:
+        f.close()
+
+    try:
+        try:
+            magic, fileKind, count = _HEADER.unpack_from(m)
+            if magic != _MAGIC or fileKind != kind:
+                raise ValueError("%s is not the right kind of snapshot"
+                                 % (path,))
+            records, offset = readRecords(m, _HEADER.size, count)
+        except struct.error:
+            raise ValueError("%s is truncated" % (path,))
+        if offset != len(m):
+            raise ValueError("%s has trailing data" % (path,))
+        return records
+    finally:
+        m.close()
+
+
+def _assertionRecord(assertion, deadline):
+    if deadline is None:
+        deadline = -1.0
+    credentials = assertion.clientCredentials
+    secret = None
+    if clientcred.IClientIdentifierSecret.providedBy(credentials):
+        secret = _encode(credentials.secret)
+    redirectURI = _encode(credentials.redirectURI)
+    fields = [_encode(credentials.identifier),
+              _encode(assertion.assertionType),
+              _encode(assertion.assertion)]
+    header = _ASSERTION.pack(*(map(len, fields)
+                               + [_optionalLength(redirectURI),
+                                  _optionalLength(secret), deadline]))
+    return header + "".join(fields + [redirectURI or "", secret or ""])
+
+
+def writeAssertions(path, assertions, deadlines=None):
+    """
+    Writes a snapshot of assertions.
+
+    The client credentials of every assertion are kept: their identifier,
+    redirect URI and, for L{clientcred.IClientIdentifierSecret}, secret.
+
+    @type assertions: sequence of L{token.IAssertion}
+    @param deadlines: The times at which the assertions expire, in the same
+    order, or C{None} for assertions which don't expire. If C{None}, none
+    of them expire.
+    @type deadlines: sequence of C{float} or C{None}
+    """
+    if deadlines is None:
+        deadlines = repeat(None)
+    records = (_assertionRecord(a, deadline)
+               for a, deadline in izip(assertions, deadlines))
+    _writeAtomically(path, _ASSERTIONS, len(assertions), _chunked(records))
+
+
+def _writeAssertionDeadlines(path, assertionDeadlines):
+    """
+    Writes a snapshot of pairs of assertions and their deadlines.
+    """
+    writeAssertions(path, [a for a, _ in assertionDeadlines],
+                    [deadline for _, deadline in assertionDeadlines])
+
+
+def _clientCredentials(identifier, redirectURI, secret):
+    if secret is None:
+        return clientcred.ClientIdentifier(identifier, redirectURI)
+    return clientcred.ClientIdentifierSecret(identifier, secret, redirectURI)
+
+
+def _readAssertions(m, offset, count):
+    """
+    Reads assertion records, as pairs of an assertion and its deadline.
+    Assertions with the same client credentials share them.
+    """
+    unpack, size, end = _ASSERTION.unpack_from, _ASSERTION.size, len(m)
+    Assertion = token.Assertion
+    clients, assertions = {}, []
+    for _ in xrange(count):
+        (identifierLength, typeLength, valueLength,
+         uriLength, secretLength, deadline) = unpack(m, offset)
+        offset += size
+        typeOffset = offset + identifierLength
+        valueOffset = typeOffset + typeLength
+        uriOffset = valueOffset + valueLength
+        secretOffset = uriOffset + max(uriLength, 0)
+        nextOffset = secretOffset + max(secretLength, 0)
+        if nextOffset > end:
+            raise struct.error("record extends past the end of the file")
+
+        key = (m[offset:typeOffset],
+               None if uriLength < 0 else m[uriOffset:secretOffset],
+               None if secretLength < 0 else m[secretOffset:nextOffset])
+        client = clients.get(key)
+        if client is None:
+            client = clients[key] = _clientCredentials(*key)
+        assertion = Assertion(client, m[typeOffset:valueOffset],
+                              m[valueOffset:uriOffset])
+        assertions.append((assertion, None if deadline < 0 else deadline))
+        offset = nextOffset
+    return assertions, offset
+
+
+def readAssertions(path):
+    """
+    Reads a snapshot of assertions.
+
+    @return: A list of L{token.Assertion}s.
+    @raise ValueError: If the file isn't a complete snapshot of assertions.
+    """
+    return [a for a, _ in readAssertionDeadlines(path)]
+
+
+def readAssertionDeadlines(path):
+    """
+    Reads a snapshot of assertions, along with the times at which they
+    expire.
+
+    @return: A list of pairs of a L{token.Assertion} and its deadline, or
+    C{None} if it doesn't expire.
+    @raise ValueError: If the file isn't a complete snapshot of assertions.
+    """
+    return _read(path, _ASSERTIONS, _readAssertions)
+
+
+def _redirectURIRecord((identifier, uri)):
+    identifier, uri = _encode(identifier), _encode(uri)
+    return (_REDIRECT_URI.pack(len(identifier), _optionalLength(uri))
+            + identifier + (uri or ""))
+
+
+def writeRedirectURIs(path, redirectURIs):
+    """
+    Writes a snapshot of redirect URIs.
+
+    @param redirectURIs: A mapping of client identifiers to redirect URIs
+    (or C{None}).
+    @type redirectURIs: C{dict}
+    """
+    records = (_redirectURIRecord(item) for item in redirectURIs.iteritems())
+    _writeAtomically(path, _REDIRECT_URIS, len(redirectURIs),
+                     _chunked(records))
+
+
+def _readRedirectURIs(m, offset, count):
+    unpack, size, end = _REDIRECT_URI.unpack_from, _REDIRECT_URI.size, len(m)
+    uris = []
+    for _ in xrange(count):
+        identifierLength, uriLength = unpack(m, offset)
+        offset += size
+        uriOffset = offset + identifierLength
+        nextOffset = uriOffset + max(uriLength, 0)
+        if nextOffset > end:
+            raise struct.error("record extends past the end of the file")
+
+        uri = None if uriLength < 0 else m[uriOffset:nextOffset]
+        uris.append((m[offset:uriOffset], uri))
+        offset = nextOffset
+    return uris, offset
+
+
+def readRedirectURIs(path):
+    """
+    Reads a snapshot of redirect URIs.
+
+    @return: A mapping of client identifiers to redirect URIs (or C{None}).
+    @rtype: C{dict}
+    @raise ValueError: If the file isn't a complete snapshot of redirect
+    URIs.
+    """
+    return dict(_read(path, _REDIRECT_URIS, _readRedirectURIs))
+
+
+def _capture(obj):
+    """
+    Copies the contents of a store, so that it can be written while the
+    store keeps changing.
+
+    @return: A C{Deferred} firing with a function writing a snapshot, and
+    the copied contents.
+    """
+    if IExpiringAssertionStore.providedBy(obj):
+        d = obj.getAssertionDeadlines()
+        d.addCallback(lambda assertionDeadlines: (_writeAssertionDeadlines,
+                                                  list(assertionDeadlines)))
+        return d
+    if IEnumerableAssertionStore.providedBy(obj):
+        d = obj.getAssertions()
+        d.addCallback(lambda assertions: (writeAssertions, assertions))
+        return d
+    if isinstance(obj, SimpleRedirectURIFactory):
+        d = obj.getAllRedirectURIs()
+        d.addCallback(lambda uris: (writeRedirectURIs, uris))
+        return d
+    return defer.fail(TypeError("can't snapshot %r" % (obj,)))
+
+
+def snapshot(obj, path):
+    """
+    Writes a snapshot of an L{IEnumerableAssertionStore} or a
+    L{SimpleRedirectURIFactory}.
+
+    @return: A C{Deferred} which fires when the snapshot has been written.
+    For in-memory stores, it has fired already.
+    """
+    d = _capture(obj)
+    d.addCallback(lambda (write, contents): write(path, contents))
+    return d
+
+
+def _groupByTimeToLive(assertionDeadlines, now):
+    """
+    Groups assertions by the time they have left to live, dropping the
+    ones which have expired. Assertions which don't expire are grouped
+    under C{None}.
+    """
+    groups = {}
+    for assertion, deadline in assertionDeadlines:
+        if deadline is None:
+            ttl = None
+        elif deadline > now:
+            ttl = deadline - now
+        else:
+            continue
+        groups.setdefault(ttl, []).append(assertion)
+    return groups
+
+
+def restore(obj, path, clock=None):
+    """
+    Adds the contents of a snapshot to an assertion store or a
+    L{SimpleRedirectURIFactory}.
+
+    Assertions which have expired since the snapshot was taken are dropped.
+    An L{IExpiringAssertionStore} gets the others with the time they have
+    left to live, instead of a fresh lifetime; assertions which didn't
+    expire when the snapshot was taken get the store's default.
+
+    A snapshot brings back the store as it was when it was taken: single-use
+    assertions which were checked (and so invalidated) after the last
+    snapshot was taken become valid again, until they expire.
+
+    @param clock: The clock the deadlines in the snapshot are compared
+    with. This should be the clock of the store. Defaults to the global
+    reactor.
+    @type clock: L{twisted.internet.interfaces.IReactorTime}
+    @return: A C{Deferred} which fires when the contents have been added.
+    @raise ValueError: If the file isn't a complete snapshot of the right
+    kind.
+    """
+    if isinstance(obj, SimpleRedirectURIFactory):
+        return obj.addRedirectURIs(readRedirectURIs(path))
+    bulk = IBulkAssertionStore.providedBy(obj)
+    if not (bulk or IEnumerableAssertionStore.providedBy(obj)):
+        raise TypeError("can't restore %r" % (obj,))
+
+    if clock is None:
+        from twisted.internet import reactor as clock
+    groups = _groupByTimeToLive(readAssertionDeadlines(path),
+                                clock.seconds())
+    expiring = IExpiringAssertionStore.providedBy(obj)
+
+    added = []
+    for ttl, assertions in groups.iteritems():
+        kwargs = {}
+        if expiring and ttl is not None:
+            kwargs["ttl"] = ttl
+        if bulk:
+            added.append(defer.maybeDeferred(obj.addAssertions, assertions,
+                                             **kwargs))
+        else:
+            added.extend(defer.maybeDeferred(obj.addAssertion, assertion,
+                                             **kwargs)
+                         for assertion in assertions)
+
+    d = defer.gatherResults(added)
+    d.addCallback(lambda _: None)
+    return d
+
+
+
+class Snapshotter(object):
+    """
+    Periodically writes snapshots of a store.
+
+    The contents of the store are copied in the reactor thread, and written
+    in a thread, so the reactor is only blocked for as long as the copy
+    takes.
+    """
+    def __init__(self, obj, path, interval=60, reactor=None):
+        """
+        Initializes a snapshotter.
+
+        @param obj: The store to snapshot.
+        @type obj: L{IEnumerableAssertionStore} or
+        L{SimpleRedirectURIFactory}
+        @param path: The path of the snapshot.
+        @type path: C{str}
+        @param interval: The time between snapshots, in seconds.
+        @type interval: C{float}
+        @param reactor: The reactor. Defaults to the global reactor.
+        """
+        if reactor is None:
+            from twisted.internet import reactor
+
+        self._obj = obj
+        self._path = path
+        self._interval = interval
+        self._reactor = reactor
+        self._writing = None
+
+        self._call = task.LoopingCall(self.snapshot)
+        self._call.clock = reactor
+
+
+    def start(self):
+        """
+        Starts writing snapshots periodically.
+        """
+        if not self._call.running:
+            self._call.start(self._interval, now=False)
+
+
+    def stop(self):
+        """
+        Stops writing snapshots periodically.
+
+        @return: A C{Deferred} which fires when the snapshot being written,
+        if any, is done.
+        """
+        if self._call.running:
+            self._call.stop()
+        if self._writing is None:
+            return defer.succeed(None)
+        d = defer.Deferred()
+        self._writing.addBoth(lambda result: d.callback(None) or result)
+        return d
+
+
+    def snapshot(self):
+        """
+        Writes a snapshot now, unless one is being written already.
+
+        @return: A C{Deferred} which fires when the snapshot has been
+        written.
+        """
+        if self._writing is not None:
+            return defer.succeed(None)
+
+        self._writing = d = _capture(self._obj)
+
+        @d.addCallback
+        def writeSnapshot((write, contents)):
+            pool = self._reactor.getThreadPool()
+            return threads.deferToThreadPool(self._reactor, pool, write,
+                                             self._path, contents)
+
+        @d.addBoth
+        def written(result):
+            self._writing = None
+            return result
+
+        return d
@@ -0,0 +1,404 @@
+"""
+A persistent assertion store on top of SQLite.
+"""
+import sqlite3
+
+from txoauth.token import Assertion, EnforcedInvalidationException
+from txoauth.token import AssertionNotFound
+from txoauth.clientcred import ClientIdentifier
+from txoauth.interfaces import IExpiringAssertionStore, IBulkAssertionStore
+from txoauth.interfaces import IClientIndexedAssertionStore
+from txoauth.interfaces import IBatchAssertionStore
+
+from twisted.internet import defer, task, threads
+from twisted.python.failure import Failure
+from twisted.python.threadpool import ThreadPool
+
+from zope.interface import implements
+
+
+_SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS assertions (
+        client_id TEXT NOT NULL,
+        assertion_type TEXT NOT NULL,
+        assertion TEXT NOT NULL,
+        expires REAL NOT NULL,
+        PRIMARY KEY (client_id, assertion_type, assertion)
+    )
+    """,
+    """
+    CREATE INDEX IF NOT EXISTS assertions_expires ON assertions (expires)
+    """,
+]
+
+_ADD = """
+    INSERT OR REPLACE INTO assertions
+        (client_id, assertion_type, assertion, expires)
+    VALUES (?, ?, ?, ?)
+"""
+
+_INVALIDATE = """
+    DELETE FROM assertions
+    WHERE client_id = ? AND assertion_type = ? AND assertion = ?
+    AND expires > ?
+"""
+
+_CHECK = """
+    SELECT 1 FROM assertions
+    WHERE client_id = ? AND assertion_type = ? AND assertion = ?
+    AND expires > ?
+"""
+
+_LIST = """
+    SELECT client_id, assertion_type, assertion, expires FROM assertions
+    WHERE expires > ?
+"""
+
+_REVOKE_CLIENT = """
+    DELETE FROM assertions WHERE client_id = ?
+"""
+
+_COUNT = """
+    SELECT COUNT(*) FROM assertions WHERE client_id = ? AND expires > ?
+"""
+
+_PRUNE = """
+    DELETE FROM assertions WHERE expires <= ?
+"""
+
+
+def _key(assertion):
+    return (assertion.clientCredentials.identifier,
+            assertion.assertionType,
+            assertion.assertion)
+
+
+class SQLiteAssertionStore(object):
+    """
+    An assertion store which keeps assertions in an SQLite database.
+
+    Assertions are identified by their client identifier, type and value.
+
+    All database access happens in a thread pool. Operations requested while
+    a transaction is running, or during the same reactor iteration, are
+    grouped into a single transaction ("group commit"). Checking an
+    assertion while invalidating it is a single C{DELETE} statement, so an
+    assertion can only ever be used once. Expired assertions are pruned
+    periodically.
+
+    The client identifier leads the primary key, so finding the assertions
+    of a client uses that index instead of scanning the table.
+
+    Every operation in a transaction runs in a savepoint of its own, so an
+    operation which fails (for instance because of a value SQLite can't
+    bind) is rolled back and fails on its own, without affecting the other
+    operations in the transaction. Values are stored and returned as byte
+    strings, so they needn't be ASCII.
+    """
+    implements(IExpiringAssertionStore, IBulkAssertionStore,
+               IClientIndexedAssertionStore, IBatchAssertionStore)
+
+    def __init__(self, path, forceInvalidation=True, ttl=600,
+                 pruneInterval=60, threadpool=None, reactor=None):
+        """
+        Initializes the assertion store.
+
+        @param path: The path to the database file.
+        @type path: C{str}
+        @param forceInvalidation: If true, assertions can only be checked
+        while invalidating them.
+        @type forceInvalidation: C{bool}
+        @param ttl: The default time to live for assertions, in seconds.
+        @type ttl: C{float}
+        @param pruneInterval: The time between removals of expired
+        assertions, in seconds.
+        @type pruneInterval: C{float}
+        @param threadpool: The thread pool used for database access. If
+        C{None}, a pool with a single thread is created (and stopped when
+        this store is closed).
+        @type threadpool: L{ThreadPool}
+        @param reactor: The reactor. Defaults to the global reactor.
+        """
+        if reactor is None:
+            from twisted.internet import reactor
+
+        self._path = path
+        self._forceInvalidation = forceInvalidation
+        self._ttl = ttl
+        self._reactor = reactor
+        self._connection = None
+        self._closing = False
+        self._shutdownTrigger = None
+
+        self._ownThreadpool = threadpool is None
+        if self._ownThreadpool:
+            threadpool = ThreadPool(1, 1, "SQLiteAssertionStore")
+            threadpool.start()
+            self._shutdownTrigger = reactor.addSystemEventTrigger(
+                "during", "shutdown", self.close)
+        self._threadpool = threadpool
+
+        self._pending = []
+        self._flushCall = None
+        self._running = None
+
+        self._pruneCall = task.LoopingCall(self.prune)
+        self._pruneCall.clock = reactor
+        self._pruneCall.start(pruneInterval, now=False)
+
+
+    def _enqueue(self, operation, args):
+        """
+        Adds an operation to the next transaction.
+        """
+        d = defer.Deferred()
+        self._pending.append((operation, args, d))
+        if self._running is None and self._flushCall is None:
+            self._flushCall = self._reactor.callLater(0, self._flush)
+        return d
+
+
+    def _flush(self):
+        """
+        Runs all pending operations in a single transaction.
+        """
+        self._flushCall = None
+        batch, self._pending = self._pending, []
+        operations = [(operation, args) for operation, args, _ in batch]
+        now = self._reactor.seconds()
+
+        self._running = d = threads.deferToThreadPool(
+            self._reactor, self._threadpool,
+            self._runTransaction, operations, now)
+
+        @d.addCallback
+        def deliver(results):
+            for (_, _, d), result in zip(batch, results):
+                if isinstance(result, Exception):
+                    d.errback(result)
+                else:
+                    d.callback(result)
+
+        @d.addErrback
+        def fail(failure):
+            for _, _, d in batch:
+                if not d.called:
+                    d.errback(failure)
+
+        @d.addCallback
+        def next(_):
+            self._running = None
+            if self._pending:
+                self._flush()
+
+
+    def _connect(self):
+        if self._connection is None:
+            # Transactions are managed explicitly: the sqlite3 module would
+            # otherwise commit before every SAVEPOINT statement.
+            self._connection = sqlite3.connect(self._path,
+                                               isolation_level=None,
+                                               check_same_thread=False)
+            self._connection.text_factory = str
+            for statement in _SCHEMA:
+                self._connection.execute(statement)
+        return self._connection
+
+
+    def _runTransaction(self, operations, now):
+        """
+        Runs a batch of operations in one transaction, in a thread.
+
+        Each operation runs in a savepoint, which is rolled back if the
+        operation fails.
+
+        @return: A list with a result for every operation: the exception it
+        should fail with, or else the value it should succeed with.
+        """
+        connection = self._connect()
+        results = []
+        connection.execute("BEGIN")
+        try:
+            for operation, args in operations:
+                connection.execute("SAVEPOINT operation")
+                try:
+                    result = operation(connection, now, *args)
+                except Exception, e:
+                    connection.execute("ROLLBACK TO operation")
+                    result = e
+                connection.execute("RELEASE operation")
+                results.append(result)
+            connection.execute("COMMIT")
+        except:
+            connection.execute("ROLLBACK")
+            raise
+
+        if self._closing:
+            self._connection = None
+            connection.close()
+        return results
+
+
+    def _add(self, connection, now, key, ttl):
+        connection.execute(_ADD, key + (now + ttl,))
+
+
+    def _addMany(self, connection, now, keys, ttl):
+        expires = now + ttl
+        connection.executemany(_ADD, (key + (expires,) for key in keys))
+
+
+    def _check(self, connection, now, key, invalidate):
+        if invalidate:
+            found = connection.execute(_INVALIDATE, key + (now,)).rowcount
+        else:
+            found = connection.execute(_CHECK, key + (now,)).fetchone()
+        if not found:
+            return AssertionNotFound()
+
+
+    def _checkMany(self, connection, now, keys):
+        return [connection.execute(_INVALIDATE, key + (now,)).rowcount
+                for key in keys]
+
+
+    def _listDeadlines(self, connection, now):
+        return [(Assertion(ClientIdentifier(identifier), assertionType,
+                           value), expires)
+                for identifier, assertionType, value, expires
+                in connection.execute(_LIST, (now,))]
+
+
+    def _list(self, connection, now):
+        return [assertion for assertion, expires
+                in self._listDeadlines(connection, now)]
+
+
+    def _revokeClient(self, connection, now, clientIdentifier):
+        connection.execute(_REVOKE_CLIENT, (clientIdentifier,))
+
+
+    def _count(self, connection, now, clientIdentifier):
+        row = connection.execute(_COUNT, (clientIdentifier, now)).fetchone()
+        return row[0]
+
+
+    def _prune(self, connection, now):
+        connection.execute(_PRUNE, (now,))
+
+
+    def addAssertion(self, assertion, ttl=None):
+        """
+        Adds an assertion to this assertion store.
+
+        @param ttl: The time to live for this assertion, in seconds. If
+        C{None}, the store's default is used.
+        @type ttl: C{float} or C{None}
+        @return: A C{Deferred} which fires when the assertion has been
+        committed.
+        """
+        if ttl is None:
+            ttl = self._ttl
+        return self._enqueue(self._add, (_key(assertion), ttl))
+
+
+    def addAssertions(self, assertions, ttl=None):
+        """
+        Adds assertions to this assertion store, in a single transaction.
+
+        @param ttl: The time to live for these assertions, in seconds. If
+        C{None}, the store's default is used.
+        @type ttl: C{float} or C{None}
+        @return: A C{Deferred} which fires when the assertions have been
+        committed.
+        """
+        if ttl is None:
+            ttl = self._ttl
+        keys = [_key(assertion) for assertion in assertions]
+        return self._enqueue(self._addMany, (keys, ttl))
+
+
+    def checkAssertion(self, assertion, invalidate=True):
+        if not invalidate and self._forceInvalidation:
+            return defer.fail(EnforcedInvalidationException())
+        return self._enqueue(self._check, (_key(assertion), invalidate))
+
+
+    def checkAssertions(self, assertions):
+        """
+        Checks and invalidates assertions, in a single transaction.
+        """
+        keys = [_key(assertion) for assertion in assertions]
+        d = self._enqueue(self._checkMany, (keys,))
+
+        @d.addCallback
+        def results(found):
+            return [None if f else Failure(AssertionNotFound())
+                    for f in found]
+
+        return d
+
+
+    def getAssertions(self):
+        """
+        Gets all live assertions in this store.
+
+        The assertions are identified by their client identifier, type and
+        value only: their client credentials have no redirect URI.
+        """
+        return self._enqueue(self._list, ())
+
+
+    def getAssertionDeadlines(self):
+        """
+        Gets all live assertions in this store, along with the times at
+        which they expire.
+
+        The assertions are identified as by L{getAssertions}.
+        """
+        return self._enqueue(self._listDeadlines, ())
+
+
+    def revokeClient(self, clientIdentifier):
+        return self._enqueue(self._revokeClient, (clientIdentifier,))
+
+
+    def countAssertions(self, clientIdentifier):
+        return self._enqueue(self._count, (clientIdentifier,))
+
+
+    def prune(self):
+        """
+        Removes expired assertions.
+
+        @return: A C{Deferred} which fires when they have been removed.
+        """
+        return self._enqueue(self._prune, ())
+
+
+    def close(self):
+        """
+        Closes this store, after running all pending operations.
+
+        @return: A C{Deferred} which fires when the store has been closed.
+        """
+        if self._pruneCall.running:
+            self._pruneCall.stop()
+
+        if self._shutdownTrigger is not None:
+            self._reactor.removeSystemEventTrigger(self._shutdownTrigger)
+            self._shutdownTrigger = None
+
+        d = self._enqueue(self._close, ())
+
+        @d.addCallback
+        def stopThreadpool(_):
+            if self._ownThreadpool:
+                self._threadpool.stop()
+
+        return d
+
+
+    def _close(self, connection, now):
+        self._closing = True
@@ -0,0 +1,127 @@
+"""
+Tests for the in-memory access token store.
+"""
+from txoauth import token
+from txoauth.contrib import accesstokens
+from txoauth.interfaces import IAccessTokenStore
+from txoauth.test.test_clientcred import IDENTIFIER
+
+from twisted.internet import task
+from twisted.trial.unittest import TestCase
+
+from zope.interface.verify import verifyObject
+
+
+class MemoryAccessTokenStoreTestCase(TestCase):
+    def setUp(self):
+        self.clock = task.Clock()
+        self.store = accesstokens.MemoryAccessTokenStore(expiresIn=10,
+                                                         clock=self.clock)
+
+
+    def tearDown(self):
+        self.store.stop()
+
+
+    def _issue(self, **kwargs):
+        issued = []
+        self.store.issueAccessToken(IDENTIFIER, **kwargs
+                                    ).addCallback(issued.append)
+        return issued[0]
+
+
+    def _assertMissing(self, accessToken):
+        d = self.store.checkAccessToken(accessToken)
+        return self.assertFailure(d, token.AccessTokenNotFound)
+
+
+    def test_interface(self):
+        verifyObject(IAccessTokenStore, self.store)
+
+
+    def test_issue(self):
+        accessToken = self._issue()
+        self.assertEqual(accessToken.expiresIn, 10)
+        self.assertIdentical(accessToken.refreshToken, None)
+        d = self.store.checkAccessToken(accessToken.accessToken)
+        d.addCallback(self.assertEqual, IDENTIFIER)
+        return d
+
+
+    def test_unique(self):
+        tokens = set(self._issue().accessToken for _ in range(100))
+        self.assertEqual(len(tokens), 100)
+        self.assertEqual(len(self.store), 100)
+
+
+    def test_unknown(self):
+        return self._assertMissing("bogus")
+
+
+    def test_notExpiredYet(self):
+        accessToken = self._issue()
+        self.clock.pump([1] * 9)
+        return self.store.checkAccessToken(accessToken.accessToken)
+
+
+    def test_expired(self):
+        accessToken = self._issue()
+        self.clock.pump([1] * 11)
+        self.assertEqual(len(self.store), 0)
+        return self._assertMissing(accessToken.accessToken)
+
+
+    def test_expiredBeforeWheelRuns(self):
+        self.store.stop()
+        accessToken = self._issue()
+        self.clock.advance(11)
+        self.assertEqual(len(self.store), 1)
+        return self._assertMissing(accessToken.accessToken)
+
+
+    def test_customExpiry(self):
+        accessToken = self._issue(expiresIn=2)
+        self.assertEqual(accessToken.expiresIn, 2)
+        self.clock.pump([1] * 3)
+        return self._assertMissing(accessToken.accessToken)
+
+
+    def test_fractionalClock(self):
+        """
+        Tokens issued part way through a tick are still removed once they
+        expire.
+        """
+        self.store.stop()
+        clock = task.Clock()
+        clock.advance(0.5)
+        store = accesstokens.MemoryAccessTokenStore(expiresIn=10, clock=clock)
+        self.addCleanup(store.stop)
+        clock.advance(0.4)
+        for _ in xrange(100):
+            store.issueAccessToken(IDENTIFIER)
+        clock.pump([0.05] * 2000)
+        self.assertEqual(len(store), 0)
+        self.assertEqual(len(store._wheel), 0)
+
+
+    def test_longExpiry(self):
+        """
+        Tokens with lifetimes much longer than the lowest level of the wheel
+        expire when they are due.
+        """
+        accessToken = self._issue(expiresIn=86400)
+        self.clock.pump([60] * 1439)
+        self.assertEqual(len(self.store), 1)
+        self.clock.pump([60] * 2)
+        return self._assertMissing(accessToken.accessToken)
+
+
+    def test_revoke(self):
+        accessToken = self._issue()
+        self.store.revokeAccessToken(accessToken.accessToken)
+        self.assertEqual(len(self.store), 0)
+        return self._assertMissing(accessToken.accessToken)
+
+
+    def test_revokeUnknown(self):
+        return self.store.revokeAccessToken("bogus")
@@ -0,0 +1,173 @@
+"""
+Tests for the in-memory authorization code store.
+"""
+from txoauth import clientcred, token
+from txoauth.contrib import authcodes
+from txoauth.interfaces import IBatchAuthorizationCodeStore
+from txoauth.test.test_clientcred import IDENTIFIER, BOGUS_IDENTIFIER
+from txoauth.test.test_clientcred import URI, BOGUS_URI
+
+from twisted.internet import task
+from twisted.trial.unittest import TestCase
+
+from zope.interface.verify import verifyObject
+
+
+AVATAR_ID = "brian"
+
+
+def authorizationCode(code, identifier=IDENTIFIER, redirectURI=None):
+    credentials = clientcred.ClientIdentifier(identifier, redirectURI)
+    return token.AuthorizationCode(credentials, code)
+
+
+
+class MemoryAuthorizationCodeStoreTestCase(TestCase):
+    def setUp(self):
+        self.clock = task.Clock()
+        self.clock.advance(1000)
+        self.store = authcodes.MemoryAuthorizationCodeStore(expiresIn=10,
+                                                            clock=self.clock)
+
+
+    def tearDown(self):
+        self.store.stop()
+
+
+    def _issue(self, identifier=IDENTIFIER, redirectURI=None):
+        issued = []
+        d = self.store.issueAuthorizationCode(identifier, AVATAR_ID,
+                                              redirectURI)
+        d.addCallback(issued.append)
+        return issued[0]
+
+
+    def _redeem(self, code, *args, **kwargs):
+        return self.store.redeemAuthorizationCode(
+            authorizationCode(code, *args, **kwargs))
+
+
+    def _assertRedeemed(self, code, *args, **kwargs):
+        d = self._redeem(code, *args, **kwargs)
+        d.addCallback(self.assertEqual, AVATAR_ID)
+        return d
+
+
+    def _assertMissing(self, code, *args, **kwargs):
+        d = self._redeem(code, *args, **kwargs)
+        return self.assertFailure(d, token.AuthorizationCodeNotFound)
+
+
+    def test_interface(self):
+        verifyObject(IBatchAuthorizationCodeStore, self.store)
+
+
+    def test_redeem(self):
+        return self._assertRedeemed(self._issue())
+
+
+    def test_unique(self):
+        codes = set(self._issue() for _ in range(100))
+        self.assertEqual(len(codes), 100)
+        self.assertEqual(len(self.store), 100)
+
+
+    def test_oneTimeUse(self):
+        code = self._issue()
+        self._assertRedeemed(code)
+        return self._assertMissing(code)
+
+
+    def test_unknown(self):
+        self._issue()
+        for code in ["bogus", "", "7f.bogus", "-1.x"]:
+            self._assertMissing(code)
+
+
+    def test_wrongClient(self):
+        """
+        Codes presented by the wrong client are rejected, and used up.
+        """
+        code = self._issue()
+        self._assertMissing(code, BOGUS_IDENTIFIER)
+        return self._assertMissing(code)
+
+
+    def test_redirectURI(self):
+        code = self._issue(redirectURI=URI)
+        return self._assertRedeemed(code, redirectURI=URI)
+
+
+    def test_wrongRedirectURI(self):
+        for redirectURI in [None, BOGUS_URI]:
+            code = self._issue(redirectURI=URI)
+            self._assertMissing(code, redirectURI=redirectURI)
+
+
+    def test_noRedirectURI(self):
+        """
+        Codes issued without a redirect URI can be redeemed with any.
+        """
+        return self._assertRedeemed(self._issue(), redirectURI=URI)
+
+
+    def test_expiry(self):
+        code = self._issue()
+        self.clock.advance(9.5)
+        self._assertRedeemed(code)
+
+        code = self._issue()
+        self.clock.advance(10)
+        return self._assertMissing(code)
+
+
+    def test_sweep(self):
+        """
+        Expired codes are dropped once the tick they expired in has passed.
+        """
+        self._issue()
+        self.clock.advance(1)
+        self._issue()
+        self.assertEqual(len(self.store), 2)
+
+        self.clock.advance(10)
+        self.assertEqual(len(self.store), 1)
+        self.clock.advance(1)
+        self.assertEqual(len(self.store), 0)
+
+
+    def test_sweepAfterJump(self):
+        """
+        If the clock jumps forward further than the ring buffer reaches,
+        every code is dropped.
+        """
+        self._issue()
+        self.store.stop()
+        self.clock.advance(1000)
+        self.store.sweep()
+        self.assertEqual(len(self.store), 0)
+
+
+    def test_reuseSlot(self):
+        """
+        Issuing a code in a slot whose tick has passed without being swept
+        replaces the old codes in that slot.
+        """
+        old = self._issue()
+        self.store.stop()
+        self.clock.advance(len(self.store._buckets))
+        new = self._issue()
+        self._assertMissing(old)
+        return self._assertRedeemed(new)
+
+
+    def test_redeemAuthorizationCodes(self):
+        code = self._issue()
+        credentials = [authorizationCode(c) for c in [code, "bogus", code]]
+        results = []
+        self.store.redeemAuthorizationCodes(credentials
+                                            ).addCallback(results.append)
+        [(first, second, third)] = results
+        self.assertEqual(first, AVATAR_ID)
+        second.trap(token.AuthorizationCodeNotFound)
+        third.trap(token.AuthorizationCodeNotFound)
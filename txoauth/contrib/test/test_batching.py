@@ -0,0 +1,113 @@
+"""
+Tests for batching wrappers.
+"""
+from txoauth import interfaces
+from txoauth.contrib import batching, simple
+from txoauth.test.test_clientcred import IDENTIFIER, BOGUS_IDENTIFIER, URI
+
+from twisted.internet import defer, task
+from twisted.trial.unittest import TestCase
+
+from zope.interface import implements
+
+
+class CountingBatchRedirectURIFactory(simple.SimpleRedirectURIFactory):
+    def __init__(self, **redirectURIs):
+        simple.SimpleRedirectURIFactory.__init__(self, **redirectURIs)
+        self.batches = []
+
+
+    def getRedirectURIs(self, clientIdentifiers):
+        self.batches.append(sorted(clientIdentifiers))
+        return simple.SimpleRedirectURIFactory.getRedirectURIs(
+            self, clientIdentifiers)
+
+
+
+class BatchingRedirectURIFactoryTestCase(TestCase):
+    def setUp(self):
+        self.clock = task.Clock()
+        self.backend = CountingBatchRedirectURIFactory(**{IDENTIFIER: URI})
+        self.factory = batching.BatchingRedirectURIFactory(self.backend,
+                                                           self.clock)
+
+
+    def test_interface(self):
+        self.assertTrue(interfaces.IBatchRedirectURIFactory
+                        .implementedBy(batching.BatchingRedirectURIFactory))
+
+
+    def test_notBatchFactory(self):
+        self.assertRaises(TypeError, batching.BatchingRedirectURIFactory,
+                          object(), self.clock)
+
+
+    def test_batched(self):
+        identifiers = [IDENTIFIER, BOGUS_IDENTIFIER, IDENTIFIER]
+        ds = [self.factory.getRedirectURI(i) for i in identifiers]
+        self.assertEqual(self.backend.batches, [])
+
+        self.clock.advance(0)
+        self.assertEqual(self.backend.batches,
+                         [sorted([IDENTIFIER, BOGUS_IDENTIFIER])])
+
+        d = defer.gatherResults(ds)
+        d.addCallback(self.assertEqual, [URI, None, URI])
+        return d
+
+
+    def test_getRedirectURIs(self):
+        d = self.factory.getRedirectURIs([IDENTIFIER])
+        d.addCallback(self.assertEqual, {IDENTIFIER: URI})
+        return d
+
+
+
+class CountingRedirectURIFactory(object):
+    """
+    A redirect URI factory which can only look up one client at a time.
+    """
+    implements(interfaces.IRedirectURIFactory)
+
+    def __init__(self, **redirectURIs):
+        self._uris = redirectURIs
+        self.lookups = []
+
+
+    def getRedirectURI(self, clientIdentifier):
+        self.lookups.append(clientIdentifier)
+        if clientIdentifier not in self._uris:
+            raise KeyError(clientIdentifier)
+        return defer.succeed(self._uris[clientIdentifier])
+
+
+
+class BatchingPlainRedirectURIFactoryTestCase(TestCase):
+    def setUp(self):
+        self.clock = task.Clock()
+        self.backend = CountingRedirectURIFactory(**{IDENTIFIER: URI})
+        self.factory = batching.BatchingRedirectURIFactory(self.backend,
+                                                           self.clock)
+
+
+    def test_oneByOne(self):
+        """
+        Factories without a batch method are asked once per client in a
+        batch, and a failed lookup only fails its own callers.
+        """
+        identifiers = [IDENTIFIER, BOGUS_IDENTIFIER, IDENTIFIER]
+        ds = [self.factory.getRedirectURI(i) for i in identifiers]
+        self.clock.advance(0)
+        self.assertEqual(sorted(self.backend.lookups),
+                         sorted([IDENTIFIER, BOGUS_IDENTIFIER]))
+
+        d = self.assertFailure(ds[1], KeyError)
+        d.addCallback(lambda _: defer.gatherResults([ds[0], ds[2]]))
+        d.addCallback(self.assertEqual, [URI, URI])
+        return d
+
+
+    def test_getRedirectURIs(self):
+        d = self.factory.getRedirectURIs([IDENTIFIER])
+        d.addCallback(self.assertEqual, {IDENTIFIER: URI})
+        return d
@@ -0,0 +1,235 @@
+"""
+Tests for the Bloom filtered assertion store.
+"""
+from txoauth import token, clientcred
+from txoauth.contrib import bloom, simple
+from txoauth.contrib.test.test_simple import _AssertionStoreTests
+from txoauth.test.test_clientcred import IDENTIFIER, URI
+from txoauth.test.test_token import TYPE, ASSERTION, BOGUS_ASSERTION
+
+from twisted.internet import defer, task
+from twisted.trial.unittest import TestCase
+
+
+class BloomFilteredAssertionStoreTestCase(_AssertionStoreTests, TestCase):
+    implementer = bloom.BloomFilteredAssertionStore
+
+    def _buildStore(self, **kwargs):
+        store = simple.SimpleAssertionStore(**kwargs)
+        return self.implementer(store, capacity=1000, clock=task.Clock())
+
+
+
+class RecordingAssertionStore(simple.SimpleAssertionStore):
+    """
+    An assertion store which records checks, and which can hold on to
+    listings until they are released.
+    """
+    def __init__(self, *args, **kwargs):
+        simple.SimpleAssertionStore.__init__(self, *args, **kwargs)
+        self.checked = []
+        self.listings = None
+
+
+    def checkAssertion(self, assertion, invalidate=True):
+        self.checked.append(assertion)
+        return simple.SimpleAssertionStore.checkAssertion(self, assertion,
+                                                          invalidate)
+
+
+    def getAssertions(self):
+        if self.listings is None:
+            return simple.SimpleAssertionStore.getAssertions(self)
+        d = defer.Deferred()
+        self.listings.append(d)
+        return d
+
+
+    def release(self):
+        listings, self.listings = self.listings, None
+        for d in listings:
+            d.callback(list(self._assertions))
+
+
+
+class FailingAssertionStore(simple.SimpleAssertionStore):
+    def addAssertion(self, assertion):
+        raise RuntimeError("can't add assertions")
+
+
+
+class BloomFilteredAssertionStoreBehaviorTestCase(TestCase):
+    def setUp(self):
+        c = clientcred.ClientIdentifier(IDENTIFIER, URI)
+        self.assertion = token.Assertion(c, TYPE, ASSERTION)
+        self.other = token.Assertion(c, TYPE, BOGUS_ASSERTION)
+        self.backend = RecordingAssertionStore(forceInvalidation=False)
+        self.clock = task.Clock()
+
+
+    def _buildStore(self, **kwargs):
+        kwargs.setdefault("clock", self.clock)
+        return bloom.BloomFilteredAssertionStore(self.backend, capacity=100,
+                                                 **kwargs)
+
+
+    def _assertMissing(self, store, assertion, invalidate=True):
+        d = store.checkAssertion(assertion, invalidate)
+        return self.assertFailure(d, token.AssertionNotFound)
+
+
+    def test_definiteMiss(self):
+        """
+        Assertions which were never added are rejected without asking the
+        wrapped store.
+        """
+        store = self._buildStore()
+        d = self._assertMissing(store, self.assertion)
+
+        @d.addCallback
+        def notChecked(_):
+            self.assertEqual(self.backend.checked, [])
+            self.assertEqual(store.rejected, 1)
+
+        return d
+
+
+    def test_found(self):
+        store = self._buildStore()
+        store.addAssertion(self.assertion)
+        d = store.checkAssertion(self.assertion)
+
+        @d.addCallback
+        def checked(_):
+            self.assertEqual(self.backend.checked, [self.assertion])
+
+        return d
+
+
+    def test_removedWhenInvalidated(self):
+        store = self._buildStore()
+        store.addAssertion(self.assertion)
+        d = store.checkAssertion(self.assertion)
+        d.addCallback(lambda _: self._assertMissing(store, self.assertion))
+
+        @d.addCallback
+        def checkedOnce(_):
+            self.assertEqual(self.backend.checked, [self.assertion])
+
+        return d
+
+
+    def test_keptWhenNotInvalidated(self):
+        store = self._buildStore()
+        store.addAssertion(self.assertion)
+        d = store.checkAssertion(self.assertion, invalidate=False)
+        d.addCallback(lambda _: store.checkAssertion(self.assertion))
+        return d
+
+
+    def test_failedAdd(self):
+        """
+        A failed add leaves its key in the filter, so the assertion is
+        looked up in the wrapped store.
+        """
+        self.backend = FailingAssertionStore()
+        store = self._buildStore()
+        d = self.assertFailure(store.addAssertion(self.assertion),
+                               RuntimeError)
+        d.addCallback(lambda _: self._assertMissing(store, self.assertion))
+
+        @d.addCallback
+        def passedOn(_):
+            self.assertEqual(store.rejected, 0)
+
+        return d
+
+
+    def test_failedAddOfLiveAssertion(self):
+        """
+        A failed add doesn't remove an equal assertion which was added
+        successfully, even if the filter was rebuilt in the meantime.
+        """
+        store = self._buildStore()
+        store.addAssertion(self.assertion)
+        pending = defer.Deferred()
+        self.backend.addAssertion = lambda assertion: pending
+        failed = store.addAssertion(self.assertion)
+        store.rebuild()
+        pending.errback(RuntimeError())
+
+        d = self.assertFailure(failed, RuntimeError)
+        d.addCallback(lambda _: store.checkAssertion(self.assertion))
+        return d
+
+
+    def test_rebuiltAtStartup(self):
+        self.backend.addAssertion(self.assertion)
+        store = self._buildStore()
+        d = store.checkAssertion(self.assertion)
+        d.addCallback(lambda _: self._assertMissing(store, self.other))
+        return d
+
+
+    def test_passThroughUntilRebuilt(self):
+        """
+        Until the filter has been built, every check is passed on to the
+        wrapped store.
+        """
+        self.backend.listings = []
+        self.backend.addAssertion(self.assertion)
+        store = self._buildStore()
+        d = store.checkAssertion(self.assertion, invalidate=False)
+
+        @d.addCallback
+        def checked(_):
+            self.assertEqual(self.backend.checked, [self.assertion])
+
+        return d
+
+
+    def test_addedWhileRebuilding(self):
+        self.backend.listings = []
+        store = self._buildStore()
+        store.addAssertion(self.other)
+        self.backend.release()
+        return store.checkAssertion(self.other)
+
+
+    def test_periodicRebuild(self):
+        """
+        Periodic rebuilds forget assertions which have left the wrapped
+        store, for instance because they expired.
+        """
+        store = self._buildStore(rebuildInterval=60)
+        store.addAssertion(self.assertion)
+        self.backend._assertions.clear()
+
+        self.clock.advance(60)
+        return self._assertMissing(store, self.assertion)
+
+
+    def test_defaultRebuild(self):
+        """
+        The filter is rebuilt periodically by default.
+        """
+        store = self._buildStore()
+        store.addAssertion(self.assertion)
+        self.backend._assertions.clear()
+
+        self.clock.advance(600)
+        return self._assertMissing(store, self.assertion)
+
+
+    def test_notEnumerable(self):
+        """
+        Stores which can't be enumerated are refused, since a filter which
+        started out empty would reject assertions added elsewhere.
+        """
+        self.assertRaises(TypeError, bloom.BloomFilteredAssertionStore,
+                          object())
+
+
+    def test_rebuildNotEnumerable(self):
+        self.assertRaises(TypeError, bloom.BloomFilteredAssertionStore,
+                          object(), rebuildInterval=60)
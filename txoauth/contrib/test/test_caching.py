@@ -0,0 +1,133 @@
+"""
+Tests for caching wrappers.
+"""
+from txoauth import interfaces
+from txoauth.contrib import caching, simple
+from txoauth.test.test_clientcred import IDENTIFIER, BOGUS_IDENTIFIER, URI
+
+from twisted.internet import defer, task
+from twisted.trial.unittest import TestCase
+
+
+class CountingRedirectURIFactory(simple.SimpleRedirectURIFactory):
+    """
+    A redirect URI factory which counts lookups, and which can be told to
+    keep lookups pending.
+    """
+    def __init__(self, **redirectURIs):
+        simple.SimpleRedirectURIFactory.__init__(self, **redirectURIs)
+        self.lookups = []
+        self.pending = None
+
+
+    def getRedirectURI(self, clientIdentifier):
+        self.lookups.append(clientIdentifier)
+        if self.pending is not None:
+            d = defer.Deferred()
+            self.pending.append((d, self._uris.get(clientIdentifier)))
+            return d
+        return simple.SimpleRedirectURIFactory.getRedirectURI(
+            self, clientIdentifier)
+
+
+
+class CachingRedirectURIFactoryTestCase(TestCase):
+    def setUp(self):
+        self.clock = task.Clock()
+        self.backend = CountingRedirectURIFactory(**{IDENTIFIER: URI})
+        self.factory = caching.CachingRedirectURIFactory(
+            self.backend, maxSize=2, ttl=10, negativeTTL=1, clock=self.clock)
+
+
+    def _lookup(self, identifier, expected):
+        d = self.factory.getRedirectURI(identifier)
+        d.addCallback(self.assertEqual, expected)
+        return d
+
+
+    def test_interface(self):
+        self.assertTrue(interfaces.IRedirectURIFactory
+                        .implementedBy(caching.CachingRedirectURIFactory))
+
+
+    def test_cached(self):
+        self._lookup(IDENTIFIER, URI)
+        self._lookup(IDENTIFIER, URI)
+        self.assertEqual(self.backend.lookups, [IDENTIFIER])
+        self.assertEqual((self.factory.hits, self.factory.misses), (1, 1))
+
+
+    def test_expired(self):
+        self._lookup(IDENTIFIER, URI)
+        self.clock.advance(10)
+        self._lookup(IDENTIFIER, URI)
+        self.assertEqual(self.backend.lookups, [IDENTIFIER] * 2)
+
+
+    def test_negative(self):
+        self._lookup(BOGUS_IDENTIFIER, None)
+        self._lookup(BOGUS_IDENTIFIER, None)
+        self.assertEqual(self.backend.lookups, [BOGUS_IDENTIFIER])
+        self.clock.advance(1)
+        self._lookup(BOGUS_IDENTIFIER, None)
+        self.assertEqual(self.backend.lookups, [BOGUS_IDENTIFIER] * 2)
+
+
+    def test_bounded(self):
+        for identifier in [IDENTIFIER, BOGUS_IDENTIFIER, "x", IDENTIFIER]:
+            self._lookup(identifier, self.backend._uris.get(identifier))
+        self.assertEqual(self.backend.lookups.count(IDENTIFIER), 2)
+
+
+    def test_invalidate(self):
+        self._lookup(IDENTIFIER, URI)
+        self.factory.invalidate(IDENTIFIER)
+        self._lookup(IDENTIFIER, URI)
+        self.assertEqual(self.backend.lookups, [IDENTIFIER] * 2)
+
+
+    def test_invalidateDuringLookup(self):
+        """
+        A lookup which was in progress while the client was invalidated is
+        not cached.
+        """
+        self.backend.pending = []
+        d = self._lookup(IDENTIFIER, URI)
+        self.factory.invalidate(IDENTIFIER)
+        pending, uri = self.backend.pending.pop()
+        pending.callback(uri)
+
+        self.backend.pending = None
+        self._lookup(IDENTIFIER, URI)
+        self.assertEqual(self.backend.lookups, [IDENTIFIER] * 2)
+        return d
+
+
+    def test_failureNotCached(self):
+        self.backend.pending = []
+        d = self.factory.getRedirectURI(IDENTIFIER)
+        self.backend.pending.pop()[0].errback(RuntimeError())
+        self.assertFailure(d, RuntimeError)
+
+        self.backend.pending = None
+        self._lookup(IDENTIFIER, URI)
+        self.assertEqual(self.factory.misses, 2)
+        return d
+
+
+    def test_synchronousFailure(self):
+        """
+        A wrapped factory which raises right away gives a failed
+        C{Deferred}, and doesn't leave the lookup pending.
+        """
+        def raiseError(clientIdentifier):
+            raise RuntimeError()
+        self.backend.getRedirectURI = raiseError
+        d = self.assertFailure(self.factory.getRedirectURI(IDENTIFIER),
+                               RuntimeError)
+
+        @d.addCallback
+        def notPending(_):
+            self.assertEqual(self.factory._pending, {})
+
+        return d
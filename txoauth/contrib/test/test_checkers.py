@@ -0,0 +1,499 @@
+"""
+Tests for the credentials checkers.
+"""
+from txoauth import clientcred, token
+from txoauth.contrib import authcodes, checkers, refreshtokens, simple
+from txoauth.contrib.test.test_authcodes import AVATAR_ID, authorizationCode
+from txoauth.contrib.test.test_refreshtokens import refreshToken
+from txoauth.contrib.test.test_sqlite import ClockReactor
+from txoauth.interfaces import IClientSecretStore
+from txoauth.test.test_clientcred import IDENTIFIER, BOGUS_IDENTIFIER
+from txoauth.test.test_clientcred import SECRET, BOGUS_SECRET
+from txoauth.test.test_token import TYPE
+
+from twisted.cred.checkers import ICredentialsChecker
+from twisted.cred.error import UnauthorizedLogin
+from twisted.internet import defer, task
+from twisted.python.failure import Failure
+from twisted.trial.unittest import TestCase
+
+from zope.interface.verify import verifyObject
+
+
+class HashSecretTestCase(TestCase):
+    def test_verify(self):
+        secretHash = checkers.hashSecret(SECRET, iterations=10)
+        self.assertTrue(checkers.verifySecret(SECRET, secretHash))
+        self.assertFalse(checkers.verifySecret(BOGUS_SECRET, secretHash))
+
+
+    def test_format(self):
+        secretHash = checkers.hashSecret(SECRET, salt="salt", iterations=10)
+        algorithm, iterations, salt, derived = secretHash.split("$")
+        self.assertEqual(algorithm, "pbkdf2_sha256")
+        self.assertEqual(iterations, "10")
+        self.assertEqual(salt, "c2FsdA==")
+
+
+    def test_randomSalt(self):
+        self.assertNotEqual(checkers.hashSecret(SECRET, iterations=10),
+                            checkers.hashSecret(SECRET, iterations=10))
+
+
+    def test_malformed(self):
+        for secretHash in ["", "a$b$c$d", "md5$10$c2FsdA==$c2FsdA==",
+                           "pbkdf2_sha256$x$c2FsdA==$c2FsdA=="]:
+            self.assertFalse(checkers.verifySecret(SECRET, secretHash))
+
+
+
+class CountingClientSecretStore(checkers.SimpleClientSecretStore):
+    def __init__(self, **secretHashes):
+        checkers.SimpleClientSecretStore.__init__(self, **secretHashes)
+        self.lookups = []
+
+
+    def getSecretHash(self, clientIdentifier):
+        self.lookups.append(clientIdentifier)
+        return checkers.SimpleClientSecretStore.getSecretHash(
+            self, clientIdentifier)
+
+
+
+class RecordingThreadPool(object):
+    """
+    A thread pool which runs functions right away, and remembers them.
+    """
+    def __init__(self):
+        self.calls = []
+
+
+    def callInThreadWithCallback(self, onResult, f, *args, **kwargs):
+        self.calls.append(f)
+        onResult(True, f(*args, **kwargs))
+
+
+
+class ClientSecretCheckerTestCase(TestCase):
+    def setUp(self):
+        self.reactor = ClockReactor()
+        self.reactor.callFromThread = lambda f, *a, **kw: f(*a, **kw)
+        self.threadpool = RecordingThreadPool()
+        secretHash = checkers.hashSecret(SECRET, iterations=10)
+        self.store = CountingClientSecretStore(**{IDENTIFIER: secretHash})
+        self.checker = checkers.ClientSecretChecker(self.store,
+                                                    self.threadpool,
+                                                    cacheTTL=10,
+                                                    reactor=self.reactor)
+
+
+    def _check(self, identifier=IDENTIFIER, secret=SECRET):
+        credentials = clientcred.ClientIdentifierSecret(identifier, secret)
+        return self.checker.requestAvatarId(credentials)
+
+
+    def test_interface(self):
+        verifyObject(ICredentialsChecker, self.checker)
+        verifyObject(IClientSecretStore, self.store)
+
+
+    def test_valid(self):
+        d = self._check()
+        d.addCallback(self.assertEqual, IDENTIFIER)
+
+        @d.addCallback
+        def hashedInThreadPool(_):
+            self.assertEqual(self.threadpool.calls, [checkers.verifySecret])
+
+        return d
+
+
+    def test_wrongSecret(self):
+        return self.assertFailure(self._check(secret=BOGUS_SECRET),
+                                  UnauthorizedLogin)
+
+
+    def test_unknownClient(self):
+        d = self._check(identifier=BOGUS_IDENTIFIER)
+        d = self.assertFailure(d, UnauthorizedLogin)
+
+        @d.addCallback
+        def notHashed(_):
+            self.assertEqual(self.threadpool.calls, [])
+
+        return d
+
+
+    def test_unicodeSecret(self):
+        secretHash = checkers.hashSecret(u"\N{SNOWMAN}".encode("utf-8"),
+                                         iterations=10)
+        self.store._secretHashes[BOGUS_IDENTIFIER] = secretHash
+        d = self._check(BOGUS_IDENTIFIER, u"\N{SNOWMAN}")
+        d.addCallback(self.assertEqual, BOGUS_IDENTIFIER)
+        return d
+
+
+    def test_cached(self):
+        """
+        A successful verification is remembered, so checking the same
+        credentials again needs neither a lookup nor hashing.
+        """
+        d = self._check()
+        d.addCallback(lambda _: self._check())
+        d.addCallback(self.assertEqual, IDENTIFIER)
+
+        @d.addCallback
+        def checkedOnce(_):
+            self.assertEqual(self.store.lookups, [IDENTIFIER])
+            self.assertEqual(len(self.threadpool.calls), 1)
+
+        return d
+
+
+    def test_cacheDoesNotAcceptOtherSecrets(self):
+        d = self._check()
+        d.addCallback(lambda _: self._check(secret=BOGUS_SECRET))
+        return self.assertFailure(d, UnauthorizedLogin)
+
+
+    def test_failuresNotCached(self):
+        d = self.assertFailure(self._check(secret=BOGUS_SECRET),
+                               UnauthorizedLogin)
+        d.addCallback(lambda _: self._check(secret=BOGUS_SECRET))
+        d = self.assertFailure(d, UnauthorizedLogin)
+
+        @d.addCallback
+        def checkedTwice(_):
+            self.assertEqual(len(self.threadpool.calls), 2)
+
+        return d
+
+
+    def test_cacheExpires(self):
+        d = self._check()
+
+        @d.addCallback
+        def expire(_):
+            self.reactor.now += 10
+            return self._check()
+
+        @d.addCallback
+        def checkedTwice(_):
+            self.assertEqual(len(self.threadpool.calls), 2)
+
+        return d
+
+
+    def test_noCache(self):
+        self.checker = checkers.ClientSecretChecker(self.store,
+                                                    self.threadpool,
+                                                    cacheSize=0,
+                                                    reactor=self.reactor)
+        d = defer.gatherResults([self._check(), self._check()])
+
+        @d.addCallback
+        def checkedTwice(_):
+            self.assertEqual(len(self.threadpool.calls), 2)
+
+        return d
+
+
+    def test_cacheKeyedBySecret(self):
+        """
+        The cache key depends on both the identifier and secret, and doesn't
+        contain either of them.
+        """
+        a = clientcred.ClientIdentifierSecret("a", "bc")
+        b = clientcred.ClientIdentifierSecret("ab", "c")
+        keyA = self.checker._cacheKeyFor(a)
+        self.assertNotEqual(keyA, self.checker._cacheKeyFor(b))
+        self.assertNotIn("bc", keyA)
+
+
+
+class ClientSecretCheckerDefaultThreadPoolTestCase(TestCase):
+    def test_reactorThreadPool(self):
+        secretHash = checkers.hashSecret(SECRET, iterations=10)
+        store = checkers.SimpleClientSecretStore(**{IDENTIFIER: secretHash})
+        checker = checkers.ClientSecretChecker(store)
+        credentials = clientcred.ClientIdentifierSecret(IDENTIFIER, SECRET)
+        d = checker.requestAvatarId(credentials)
+        d.addCallback(self.assertEqual, IDENTIFIER)
+        return d
+
+
+
+class AuthorizationCodeCheckerTestCase(TestCase):
+    def setUp(self):
+        self.store = authcodes.MemoryAuthorizationCodeStore(
+            clock=task.Clock())
+        self.checker = checkers.AuthorizationCodeChecker(self.store)
+        issued = []
+        self.store.issueAuthorizationCode(IDENTIFIER, AVATAR_ID
+                                          ).addCallback(issued.append)
+        self.code = issued[0]
+
+
+    def tearDown(self):
+        self.store.stop()
+
+
+    def test_interface(self):
+        verifyObject(ICredentialsChecker, self.checker)
+
+
+    def test_valid(self):
+        d = self.checker.requestAvatarId(authorizationCode(self.code))
+        d.addCallback(self.assertEqual, AVATAR_ID)
+        return d
+
+
+    def test_invalid(self):
+        d = self.checker.requestAvatarId(authorizationCode("bogus"))
+        return self.assertFailure(d, UnauthorizedLogin)
+
+
+    def test_oneTimeUse(self):
+        self.checker.requestAvatarId(authorizationCode(self.code))
+        d = self.checker.requestAvatarId(authorizationCode(self.code))
+        return self.assertFailure(d, UnauthorizedLogin)
+
+
+
+class RefreshTokenCheckerTestCase(TestCase):
+    def setUp(self):
+        self.clock = task.Clock()
+        self.store = refreshtokens.MemoryRefreshTokenStore(clock=self.clock)
+        self.addCleanup(self.store.stop)
+        self.checker = checkers.RefreshTokenChecker(self.store)
+        issued = []
+        self.store.issueRefreshToken(IDENTIFIER, AVATAR_ID
+                                     ).addCallback(issued.append)
+        self.value = issued[0]
+
+
+    def test_interface(self):
+        verifyObject(ICredentialsChecker, self.checker)
+
+
+    def test_valid(self):
+        d = self.checker.requestAvatarId(refreshToken(self.value))
+
+        @d.addCallback
+        def rotated(rotation):
+            self.assertIsInstance(rotation, token.RefreshTokenRotation)
+            self.assertEqual(rotation.avatarId, AVATAR_ID)
+            self.assertNotEqual(rotation.refreshToken, self.value)
+
+        return d
+
+
+    def test_invalid(self):
+        d = self.checker.requestAvatarId(refreshToken("bogus"))
+        return self.assertFailure(d, UnauthorizedLogin)
+
+
+    def test_reuse(self):
+        self.checker.requestAvatarId(refreshToken(self.value))
+        d = self.checker.requestAvatarId(refreshToken(self.value))
+        return self.assertFailure(d, UnauthorizedLogin)
+
+
+
+def _assertion(value, identifier=IDENTIFIER):
+    return token.Assertion(clientcred.ClientIdentifier(identifier),
+                           TYPE, value)
+
+
+
+class CountingAssertionStore(simple.SimpleAssertionStore):
+    """
+    An assertion store which remembers the batches it was asked to check.
+    """
+    def __init__(self):
+        simple.SimpleAssertionStore.__init__(self)
+        self.batches = []
+
+
+    def checkAssertions(self, assertions):
+        self.batches.append(list(assertions))
+        return simple.SimpleAssertionStore.checkAssertions(self, assertions)
+
+
+
+class UnbatchedStore(object):
+    """
+    A store which can only check credentials one at a time.
+    """
+    def __init__(self, store):
+        self.store = store
+        self.checked = []
+
+
+    def checkAssertion(self, assertion, invalidate=True):
+        self.checked.append(assertion)
+        return self.store.checkAssertion(assertion, invalidate)
+
+
+    def redeemAuthorizationCode(self, authorizationCode):
+        self.checked.append(authorizationCode)
+        return self.store.redeemAuthorizationCode(authorizationCode)
+
+
+    def rotateRefreshToken(self, refreshToken):
+        self.checked.append(refreshToken)
+        return self.store.rotateRefreshToken(refreshToken)
+
+
+
+class _BatchingCheckerTests(object):
+    """
+    Helpers for tests of batching credentials checkers.
+    """
+    def _requestAll(self, checker, credentials):
+        """
+        Requests avatar IDs for credentials, and runs the batch.
+
+        @return: A list with, for every credential, the avatar ID or the
+        failure.
+        """
+        results = [None] * len(credentials)
+        for i, c in enumerate(credentials):
+            d = checker.requestAvatarId(c)
+            d.addBoth(lambda result, i=i: results.__setitem__(i, result))
+        self.assertEqual(results, [None] * len(credentials))
+        self.clock.advance(0)
+        return results
+
+
+    def _assertUnauthorized(self, result):
+        self.assertIsInstance(result, Failure)
+        result.trap(UnauthorizedLogin)
+
+
+
+class BatchingAssertionCheckerTestCase(_BatchingCheckerTests, TestCase):
+    def setUp(self):
+        self.clock = task.Clock()
+        self.store = CountingAssertionStore()
+        self.store.addAssertions([_assertion("a"), _assertion("b")])
+        self.checker = checkers.BatchingAssertionChecker(self.store,
+                                                         self.clock)
+
+
+    def test_interface(self):
+        verifyObject(ICredentialsChecker, self.checker)
+
+
+    def test_batched(self):
+        """
+        Checks made in the same reactor iteration make a single call to the
+        store, and every caller gets its own result.
+        """
+        credentials = [_assertion("a"), _assertion("bogus"), _assertion("b")]
+        a, bogus, b = self._requestAll(self.checker, credentials)
+        self.assertEqual(self.store.batches, [credentials])
+        self.assertEqual([a, b], [IDENTIFIER, IDENTIFIER])
+        self._assertUnauthorized(bogus)
+
+
+    def test_separateIterations(self):
+        self._requestAll(self.checker, [_assertion("a")])
+        self._requestAll(self.checker, [_assertion("b")])
+        self.assertEqual(self.store.batches,
+                         [[_assertion("a")], [_assertion("b")]])
+
+
+    def test_duplicate(self):
+        first, second = self._requestAll(self.checker,
+                                         [_assertion("a"), _assertion("a")])
+        self.assertEqual(first, IDENTIFIER)
+        self._assertUnauthorized(second)
+
+
+    def test_unbatchedStore(self):
+        store = UnbatchedStore(self.store)
+        checker = checkers.BatchingAssertionChecker(store, self.clock)
+        credentials = [_assertion("a"), _assertion("bogus")]
+        a, bogus = self._requestAll(checker, credentials)
+        self.assertEqual(store.checked, credentials)
+        self.assertEqual(a, IDENTIFIER)
+        self._assertUnauthorized(bogus)
+
+
+
+class BatchingAuthorizationCodeCheckerTestCase(_BatchingCheckerTests,
+                                               TestCase):
+    def setUp(self):
+        self.clock = task.Clock()
+        self.store = authcodes.MemoryAuthorizationCodeStore(clock=self.clock)
+        self.checker = checkers.BatchingAuthorizationCodeChecker(self.store,
+                                                                 self.clock)
+        issued = []
+        self.store.issueAuthorizationCode(IDENTIFIER, AVATAR_ID
+                                          ).addCallback(issued.append)
+        self.code = issued[0]
+
+
+    def tearDown(self):
+        self.store.stop()
+
+
+    def test_interface(self):
+        verifyObject(ICredentialsChecker, self.checker)
+
+
+    def test_batched(self):
+        credentials = [authorizationCode(self.code),
+                       authorizationCode("bogus"),
+                       authorizationCode(self.code)]
+        valid, bogus, reused = self._requestAll(self.checker, credentials)
+        self.assertEqual(valid, AVATAR_ID)
+        self._assertUnauthorized(bogus)
+        self._assertUnauthorized(reused)
+
+
+    def test_unbatchedStore(self):
+        store = UnbatchedStore(self.store)
+        checker = checkers.BatchingAuthorizationCodeChecker(store, self.clock)
+        credentials = [authorizationCode(self.code),
+                       authorizationCode("bogus")]
+        valid, bogus = self._requestAll(checker, credentials)
+        self.assertEqual(store.checked, credentials)
+        self.assertEqual(valid, AVATAR_ID)
+        self._assertUnauthorized(bogus)
+
+
+
+class BatchingRefreshTokenCheckerTestCase(_BatchingCheckerTests, TestCase):
+    def setUp(self):
+        self.clock = task.Clock()
+        self.store = refreshtokens.MemoryRefreshTokenStore(clock=self.clock)
+        self.addCleanup(self.store.stop)
+        self.checker = checkers.BatchingRefreshTokenChecker(self.store,
+                                                            self.clock)
+        issued = []
+        self.store.issueRefreshToken(IDENTIFIER, AVATAR_ID
+                                     ).addCallback(issued.append)
+        self.value = issued[0]
+
+
+    def test_interface(self):
+        verifyObject(ICredentialsChecker, self.checker)
+
+
+    def test_batched(self):
+        valid, bogus = self._requestAll(self.checker,
+                                        [refreshToken(self.value),
+                                         refreshToken("bogus")])
+        self.assertIsInstance(valid, token.RefreshTokenRotation)
+        self.assertEqual(valid.avatarId, AVATAR_ID)
+        self._assertUnauthorized(bogus)
+
+
+    def test_unbatchedStore(self):
+        store = UnbatchedStore(self.store)
+        checker = checkers.BatchingRefreshTokenChecker(store, self.clock)
+        [rotation] = self._requestAll(checker, [refreshToken(self.value)])
+        self.assertEqual(store.checked, [refreshToken(self.value)])
+        self.assertEqual(rotation.avatarId, AVATAR_ID)
@@ -0,0 +1,83 @@
+"""
+Tests for request coalescing.
+"""
+from txoauth import interfaces
+from txoauth.contrib import coalescing
+from txoauth.contrib.test.test_caching import CountingRedirectURIFactory
+from txoauth.test.test_clientcred import IDENTIFIER, BOGUS_IDENTIFIER, URI
+
+from twisted.internet import defer
+from twisted.trial.unittest import TestCase
+
+
+class CoalescingRedirectURIFactoryTestCase(TestCase):
+    def setUp(self):
+        self.backend = CountingRedirectURIFactory(**{IDENTIFIER: URI})
+        self.backend.pending = []
+        self.factory = coalescing.CoalescingRedirectURIFactory(self.backend)
+
+
+    def test_interface(self):
+        self.assertTrue(interfaces.IRedirectURIFactory
+                        .implementedBy(coalescing
+                                       .CoalescingRedirectURIFactory))
+
+
+    def test_coalesced(self):
+        ds = [self.factory.getRedirectURI(IDENTIFIER) for _ in range(3)]
+        self.assertEqual(self.backend.lookups, [IDENTIFIER])
+
+        d, uri = self.backend.pending.pop()
+        d.callback(uri)
+
+        d = defer.gatherResults(ds)
+        d.addCallback(self.assertEqual, [URI] * 3)
+        return d
+
+
+    def test_separateClients(self):
+        self.factory.getRedirectURI(IDENTIFIER)
+        self.factory.getRedirectURI(BOGUS_IDENTIFIER)
+        self.assertEqual(self.backend.lookups, [IDENTIFIER, BOGUS_IDENTIFIER])
+
+
+    def test_separateDeferreds(self):
+        """
+        Callbacks added by one caller do not affect the results other callers
+        get.
+        """
+        d1 = self.factory.getRedirectURI(IDENTIFIER)
+        d2 = self.factory.getRedirectURI(IDENTIFIER)
+        d1.addCallback(lambda _: "mangled")
+
+        pending, uri = self.backend.pending.pop()
+        pending.callback(uri)
+        d2.addCallback(self.assertEqual, URI)
+        return d2
+
+
+    def test_nextLookupAfterCompletion(self):
+        self.factory.getRedirectURI(IDENTIFIER)
+        pending, uri = self.backend.pending.pop()
+        pending.callback(uri)
+
+        self.factory.getRedirectURI(IDENTIFIER)
+        self.assertEqual(self.backend.lookups, [IDENTIFIER] * 2)
+
+
+    def test_failure(self):
+        ds = [self.factory.getRedirectURI(IDENTIFIER) for _ in range(2)]
+        self.backend.pending.pop()[0].errback(RuntimeError())
+        for d in ds:
+            self.assertFailure(d, RuntimeError)
+        self.assertEqual(self.factory._waiting, {})
+        return defer.gatherResults(ds)
+
+
+    def test_synchronousFailure(self):
+        def getRedirectURI(clientIdentifier):
+            raise RuntimeError()
+        self.backend.getRedirectURI = getRedirectURI
+
+        d = self.factory.getRedirectURI(IDENTIFIER)
+        return self.assertFailure(d, RuntimeError)
@@ -0,0 +1,176 @@
+"""
+Tests for importing assertions.
+"""
+try:
+    import json
+except ImportError:
+    import simplejson as json
+from StringIO import StringIO
+
+from txoauth.contrib import importer, simple
+from txoauth.test.test_clientcred import IDENTIFIER
+from txoauth.test.test_token import TYPE
+
+from twisted.internet import defer, task
+from twisted.trial.unittest import TestCase
+
+
+def record(assertion, identifier=IDENTIFIER, assertionType=TYPE):
+    return json.dumps({"client_id": identifier,
+                       "assertion_type": assertionType,
+                       "assertion": assertion})
+
+
+class ParseAssertionTestCase(TestCase):
+    def test_parse(self):
+        assertion = importer.parseAssertion(record("value"))
+        self.assertEqual(assertion.clientCredentials.identifier, IDENTIFIER)
+        self.assertEqual(assertion.assertionType, TYPE)
+        self.assertEqual(assertion.assertion, "value")
+        self.assertIsInstance(assertion.assertion, str)
+
+
+    def test_unicode(self):
+        assertion = importer.parseAssertion(record(u"\N{SNOWMAN}"))
+        self.assertEqual(assertion.assertion, u"\N{SNOWMAN}".encode("utf-8"))
+
+
+    def test_malformed(self):
+        for line in ["not json", "[]", json.dumps({"client_id": "x"})]:
+            self.assertRaises(ValueError, importer.parseAssertion, line)
+
+
+
+class RecordingStore(simple.SimpleAssertionStore):
+    """
+    An assertion store which records how assertions were added, and which
+    can hold on to bulk additions.
+    """
+    def __init__(self):
+        simple.SimpleAssertionStore.__init__(self)
+        self.chunks = []
+        self.pending = None
+
+
+    def addAssertions(self, assertions):
+        self.chunks.append(len(assertions))
+        simple.SimpleAssertionStore.addAssertions(self, assertions)
+        if self.pending is not None:
+            d = defer.Deferred()
+            self.pending.append(d)
+            return d
+        return defer.succeed(None)
+
+
+
+class SingleStore(object):
+    """
+    An assertion store which can only add one assertion at a time.
+    """
+    def __init__(self):
+        self.added = []
+
+
+    def addAssertion(self, assertion):
+        self.added.append(assertion)
+
+
+
+class ImportAssertionsTestCase(TestCase):
+    def setUp(self):
+        self.clock = task.Clock()
+        self.store = RecordingStore()
+
+
+    def _import(self, lines, store=None, chunkSize=2):
+        if store is None:
+            store = self.store
+        d = importer.importAssertions(store, lines, chunkSize,
+                                      self.clock)
+        results = []
+        d.addBoth(results.append)
+        return results
+
+
+    def _spin(self):
+        for _ in xrange(100):
+            self.clock.advance(0)
+
+
+    def test_import(self):
+        lines = StringIO("\n".join(record(str(i)) for i in range(5)) + "\n")
+        results = self._import(lines)
+        self._spin()
+        self.assertEqual(results, [5])
+        self.assertEqual(self.store.chunks, [2, 2, 1])
+        self.assertEqual(sorted(a.assertion for a in self.store._assertions),
+                         ["0", "1", "2", "3", "4"])
+
+
+    def test_blankLines(self):
+        results = self._import(["\n", record("a") + "\n", "  \n"])
+        self._spin()
+        self.assertEqual(results, [1])
+
+
+    def test_lazy(self):
+        """
+        Lines are only read once the previous chunk has been added.
+        """
+        read = []
+        def lines():
+            for i in range(6):
+                read.append(i)
+                yield record(str(i))
+
+        self.store.pending = []
+        results = self._import(lines())
+        self._spin()
+        self.assertEqual(self.store.chunks, [2])
+        self.assertEqual(len(read), 2)
+
+        self.store.pending.pop().callback(None)
+        self._spin()
+        self.assertEqual(self.store.chunks, [2, 2])
+        self.assertEqual(len(read), 4)
+        self.assertEqual(results, [])
+
+
+    def test_yieldsToReactor(self):
+        """
+        Chunks are added in separate reactor iterations.
+        """
+        calls = []
+        self.clock.callLater = lambda delay, f: calls.append(f)
+        self._import([record(str(i)) for i in range(6)])
+        for expected in [[], [2], [2, 2]]:
+            self.assertEqual(self.store.chunks, expected)
+            calls.pop()()
+
+
+    def test_malformed(self):
+        results = self._import([record("a"), record("b"), "bogus"])
+        self._spin()
+        failure, = results
+        failure.trap(ValueError)
+        self.assertIn("line 3", str(failure.value))
+        self.assertEqual(self.store.chunks, [2])
+
+
+    def test_notBulk(self):
+        store = SingleStore()
+        results = self._import([record(str(i)) for i in range(3)], store)
+        self._spin()
+        self.assertEqual(results, [3])
+        self.assertEqual([a.assertion for a in store.added], ["0", "1", "2"])
+
+
+    def test_failedChunk(self):
+        self.store.pending = []
+        results = self._import([record(str(i)) for i in range(6)])
+        self._spin()
+        self.store.pending.pop().errback(RuntimeError())
+        self._spin()
+        failure, = results
+        failure.trap(RuntimeError)
+        self.assertEqual(self.store.chunks, [2])
@@ -0,0 +1,248 @@
+"""
+Tests for the memcached assertion store.
+"""
+from txoauth.contrib import memcached
+from txoauth.contrib.test.test_simple import _AssertionStoreTests
+
+from twisted.internet import defer, protocol, reactor, task
+from twisted.protocols import basic
+from twisted.trial.unittest import TestCase
+
+
+class FakeMemCacheServerProtocol(basic.LineReceiver):
+    """
+    An in-process server for the subset of the memcache protocol used by the
+    memcached assertion store.
+    """
+    def connectionMade(self):
+        self._storing = None
+        self.factory.connections.append(self)
+
+
+    def connectionLost(self, reason):
+        self.factory.connections.remove(self)
+        if not self.factory.connections:
+            lost, self.factory.lost = self.factory.lost, []
+            for d in lost:
+                d.callback(None)
+
+
+    def lineReceived(self, line):
+        data = self.factory.data
+        if self._storing is not None:
+            key, flags, expireTime = self._storing
+            self._storing = None
+            data[key] = flags, line, expireTime
+            self.sendLine("STORED")
+            return
+
+        parts = line.split()
+        self.factory.commands.append(parts[0])
+        if parts[0] == "set":
+            self._storing = parts[1], parts[2], int(parts[3])
+        elif parts[0] == "get":
+            for key in parts[1:]:
+                if key in data:
+                    flags, value, _ = data[key]
+                    self.sendLine("VALUE %s %s %d" % (key, flags, len(value)))
+                    self.sendLine(value)
+            self.sendLine("END")
+        elif parts[0] == "delete":
+            if data.pop(parts[1], None) is None:
+                self.sendLine("NOT_FOUND")
+            else:
+                self.sendLine("DELETED")
+        else:
+            self.sendLine("ERROR")
+
+
+
+class FakeMemCacheServerFactory(protocol.ServerFactory):
+    protocol = FakeMemCacheServerProtocol
+
+    def __init__(self):
+        self.data = {}
+        self.commands = []
+        self.connections = []
+        self.lost = []
+
+
+    def disconnected(self):
+        """
+        Returns a C{Deferred} which fires when there are no connections.
+        """
+        if not self.connections:
+            return defer.succeed(None)
+        d = defer.Deferred()
+        self.lost.append(d)
+        return d
+
+
+
+class _FakeServerMixin(object):
+    def startServer(self):
+        self.server = FakeMemCacheServerFactory()
+        self.port = reactor.listenTCP(0, self.server, interface="127.0.0.1")
+        self.pools = []
+
+
+    def buildPool(self, size=2):
+        pool = memcached.MemCachePool("127.0.0.1", self.port.getHost().port,
+                                      size=size)
+        self.pools.append(pool)
+        return pool
+
+
+    def stopServer(self):
+        ds = [pool.close() for pool in self.pools]
+        ds.append(self.server.disconnected())
+        ds.append(defer.maybeDeferred(self.port.stopListening))
+        return defer.gatherResults(ds)
+
+
+
+class MemCacheAssertionStoreTestCase(_FakeServerMixin, _AssertionStoreTests,
+                                     TestCase):
+    implementer = memcached.MemCacheAssertionStore
+
+    def setUp(self):
+        self.startServer()
+        return _AssertionStoreTests.setUp(self)
+
+
+    def tearDown(self):
+        return self.stopServer()
+
+
+    def _buildStore(self, **kwargs):
+        prefix = "store%d:" % (len(self.pools),)
+        return self.implementer(self.buildPool(), prefix=prefix, **kwargs)
+
+
+    def _expireTimes(self, prefix):
+        return [expireTime for key, (flags, value, expireTime)
+                in self.server.data.iteritems()
+                if key.startswith(prefix)]
+
+
+    def test_ttl(self):
+        store = memcached.MemCacheAssertionStore(self.buildPool(), ttl=7,
+                                                 prefix="ttl:")
+        d = store.addAssertion(self.assertion)
+
+        @d.addCallback
+        def check(_):
+            self.assertEqual(self._expireTimes("ttl:"), [7])
+
+        return d
+
+
+    def test_longTTL(self):
+        """
+        Times to live over 30 days are sent as absolute Unix times, since
+        memcached would take them for one.
+        """
+        clock = task.Clock()
+        clock.advance(1000000000)
+        store = memcached.MemCacheAssertionStore(self.buildPool(),
+                                                 prefix="long:", clock=clock)
+        d = store.addAssertion(self.assertion, ttl=31 * 24 * 3600)
+
+        @d.addCallback
+        def check(_):
+            self.assertEqual(self._expireTimes("long:"),
+                             [1000000000 + 31 * 24 * 3600])
+
+        return d
+
+
+    def test_shortTTL(self):
+        """
+        Times to live under a second don't turn into 0, which memcached
+        takes for "never expire".
+        """
+        store = memcached.MemCacheAssertionStore(self.buildPool(),
+                                                 prefix="short:")
+        d = store.addAssertion(self.assertion, ttl=0.5)
+
+        @d.addCallback
+        def check(_):
+            self.assertEqual(self._expireTimes("short:"), [1])
+
+        return d
+
+
+
+class MemCachePoolTestCase(_FakeServerMixin, TestCase):
+    def setUp(self):
+        self.startServer()
+        self.pool = self.buildPool(size=2)
+
+
+    def tearDown(self):
+        return self.stopServer()
+
+
+    def _poolDisconnected(self):
+        """
+        Waits until the pool has noticed that all of its connections are
+        gone.
+        """
+        if not self.pool._connections:
+            return defer.succeed(None)
+        d = task.deferLater(reactor, 0.001, lambda: None)
+        return d.addCallback(lambda _: self._poolDisconnected())
+
+
+    def test_pipelining(self):
+        """
+        Commands don't wait for each other, and the pool doesn't grow beyond
+        its size.
+        """
+        ds = [self.pool.run("delete", "key%d" % i) for i in range(10)]
+        d = defer.gatherResults(ds)
+
+        @d.addCallback
+        def check(results):
+            self.assertEqual(results, [False] * 10)
+            self.assertEqual(len(self.server.connections), 2)
+
+        return d
+
+
+    def test_reconnect(self):
+        d = self.pool.run("set", "key", "value")
+
+        @d.addCallback
+        def disconnect(_):
+            for connection in self.server.connections:
+                connection.transport.loseConnection()
+            return self.server.disconnected().addCallback(
+                lambda _: self._poolDisconnected())
+
+        @d.addCallback
+        def retry(_):
+            return self.pool.run("get", "key")
+
+        @d.addCallback
+        def check(result):
+            self.assertEqual(result, (0, "value"))
+
+        return d
+
+
+    def test_connectionFailure(self):
+        d = self.port.stopListening()
+
+        @d.addCallback
+        def connect(_):
+            d = self.pool.run("get", "key")
+            return self.assertFailure(d, Exception)
+
+        return d
+
+
+    def test_closed(self):
+        d = self.pool.close()
+        d.addCallback(lambda _: self.pool.run("get", "key"))
+        return self.assertFailure(d, RuntimeError)
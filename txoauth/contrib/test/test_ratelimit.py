@@ -0,0 +1,105 @@
+"""
+Tests for rate limiting clients.
+"""
+from txoauth.interfaces import IRateLimiter
+from txoauth.contrib import ratelimit
+from txoauth.test.test_clientcred import IDENTIFIER, BOGUS_IDENTIFIER
+
+from twisted.internet import task
+from twisted.trial.unittest import TestCase
+
+from zope.interface.verify import verifyObject
+
+
+class TokenBucketRateLimiterTestCase(TestCase):
+    def setUp(self):
+        self.clock = task.Clock()
+        self.limiter = ratelimit.TokenBucketRateLimiter(rate=2, burst=3,
+                                                        clock=self.clock)
+
+
+    def _consume(self, count, identifier=IDENTIFIER):
+        return [self.limiter.consume(identifier) for _ in xrange(count)]
+
+
+    def test_interface(self):
+        verifyObject(IRateLimiter, self.limiter)
+
+
+    def test_burst(self):
+        self.assertEqual(self._consume(3), [0, 0, 0])
+        self.assertEqual(self._consume(1), [0.5])
+
+
+    def test_refill(self):
+        self._consume(3)
+        self.clock.advance(0.25)
+        self.assertEqual(self._consume(1), [0.25])
+        self.clock.advance(0.25)
+        self.assertEqual(self._consume(2), [0, 0.5])
+
+
+    def test_refillUpToBurst(self):
+        """
+        An idle client's bucket doesn't hold more than C{burst} tokens.
+        """
+        self.clock.advance(100)
+        self.assertEqual(self._consume(4), [0, 0, 0, 0.5])
+
+
+    def test_rejectedRequestsAreFree(self):
+        """
+        Rejected requests don't take tokens.
+        """
+        self._consume(3)
+        self._consume(10)
+        self.clock.advance(0.5)
+        self.assertEqual(self._consume(1), [0])
+
+
+    def test_perClient(self):
+        self._consume(3)
+        self.assertEqual(self._consume(3, BOGUS_IDENTIFIER), [0, 0, 0])
+
+
+    def test_clientLimits(self):
+        limiter = ratelimit.TokenBucketRateLimiter(
+            rate=2, burst=3, limits={IDENTIFIER: (1, 1)}, clock=self.clock)
+        self.assertEqual([limiter.consume(IDENTIFIER) for _ in xrange(2)],
+                         [0, 1])
+        self.assertEqual(
+            [limiter.consume(BOGUS_IDENTIFIER) for _ in xrange(4)],
+            [0, 0, 0, 0.5])
+
+
+    def test_setLimit(self):
+        self.limiter.setLimit(IDENTIFIER, 1, 1)
+        self.assertEqual(self._consume(2), [0, 1])
+
+        self.limiter.removeLimit(IDENTIFIER)
+        self.clock.advance(1)
+        self.assertEqual(self._consume(4), [0, 0, 0, 0.5])
+
+
+    def test_badLimits(self):
+        self.assertRaises(ValueError, ratelimit.TokenBucketRateLimiter,
+                          rate=0, clock=self.clock)
+        self.assertRaises(ValueError, ratelimit.TokenBucketRateLimiter,
+                          burst=0, clock=self.clock)
+        self.assertRaises(ValueError, self.limiter.setLimit,
+                          IDENTIFIER, 1, 0)
+
+
+    def test_eviction(self):
+        """
+        Only the buckets of the most recently seen clients are kept.
+        Evicted clients start again with a full bucket.
+        """
+        limiter = ratelimit.TokenBucketRateLimiter(rate=1, burst=1,
+                                                   maxClients=1,
+                                                   clock=self.clock)
+        limiter.consume(IDENTIFIER)
+        limiter.consume(BOGUS_IDENTIFIER)
+        self.assertEqual(len(limiter._fullAt), 1)
+        self.assertEqual(limiter.consume(IDENTIFIER), 0)
+        self.assertEqual(limiter.consume(IDENTIFIER), 1)
@@ -0,0 +1,233 @@
+"""
+Tests for the in-memory refresh token store.
+"""
+from txoauth import clientcred, token
+from txoauth.contrib import refreshtokens
+from txoauth.contrib.test.test_authcodes import AVATAR_ID
+from txoauth.interfaces import IBatchRefreshTokenStore
+from txoauth.test.test_clientcred import IDENTIFIER, BOGUS_IDENTIFIER
+
+from twisted.internet import task
+from twisted.trial.unittest import TestCase
+
+from zope.interface.verify import verifyObject
+
+
+def refreshToken(value, identifier=IDENTIFIER):
+    credentials = clientcred.ClientIdentifier(identifier)
+    return token.RefreshToken(credentials, value)
+
+
+
+class MemoryRefreshTokenStoreTestCase(TestCase):
+    def setUp(self):
+        self.clock = task.Clock()
+        self.store = refreshtokens.MemoryRefreshTokenStore(expiresIn=10,
+                                                           clock=self.clock)
+
+
+    def tearDown(self):
+        self.store.stop()
+
+
+    def _issue(self, identifier=IDENTIFIER):
+        issued = []
+        self.store.issueRefreshToken(identifier, AVATAR_ID
+                                     ).addCallback(issued.append)
+        return issued[0]
+
+
+    def _rotate(self, value, identifier=IDENTIFIER):
+        """
+        Rotates a refresh token, and returns the new one.
+        """
+        rotations = []
+        d = self.store.rotateRefreshToken(refreshToken(value, identifier))
+        d.addCallback(rotations.append)
+        rotation, = rotations
+        self.assertEqual(rotation.avatarId, AVATAR_ID)
+        return rotation.refreshToken
+
+
+    def _assertMissing(self, value, identifier=IDENTIFIER):
+        d = self.store.rotateRefreshToken(refreshToken(value, identifier))
+        return self.assertFailure(d, token.RefreshTokenNotFound)
+
+
+    def test_interface(self):
+        verifyObject(IBatchRefreshTokenStore, self.store)
+
+
+    def test_rotate(self):
+        first = self._issue()
+        second = self._rotate(first)
+        third = self._rotate(second)
+        self.assertEqual(len(set([first, second, third])), 3)
+
+
+    def test_unknown(self):
+        return self._assertMissing("bogus")
+
+
+    def test_reuse(self):
+        """
+        Presenting a token which has been rotated already revokes the whole
+        family, including the newest token.
+        """
+        first = self._issue()
+        second = self._rotate(first)
+        self._assertMissing(first)
+        self._assertMissing(second)
+        self.assertEqual(len(self.store), 0)
+
+
+    def test_reuseOtherFamilies(self):
+        first, other = self._issue(), self._issue()
+        self._rotate(first)
+        self._assertMissing(first)
+        self._rotate(other)
+
+
+    def test_wrongClient(self):
+        value = self._issue()
+        self._assertMissing(value, BOGUS_IDENTIFIER)
+        return self._assertMissing(value)
+
+
+    def test_revokeRefreshToken(self):
+        first = self._issue()
+        second = self._rotate(first)
+        self.store.revokeRefreshToken(first)
+        self._assertMissing(second)
+        self.assertEqual(len(self.store), 0)
+
+
+    def test_revokeUnknown(self):
+        return self.store.revokeRefreshToken("bogus")
+
+
+    def test_revokeClient(self):
+        first = self._rotate(self._issue())
+        second = self._issue()
+        other = self._issue(BOGUS_IDENTIFIER)
+
+        self.store.revokeClient(IDENTIFIER)
+        self._assertMissing(first)
+        self._assertMissing(second)
+        self._rotate(other, BOGUS_IDENTIFIER)
+
+
+    def test_revokeClientFreesMemory(self):
+        """
+        Revoking a client doesn't look at its families. They are dropped
+        when one of their tokens is presented, or when they would have
+        expired, and other families are kept.
+        """
+        revoked = [self._rotate(self._issue()) for _ in xrange(10)]
+        self.clock.pump([1] * 5)
+        self._issue(BOGUS_IDENTIFIER)
+        self.store.revokeClient(IDENTIFIER)
+        self.assertEqual(len(self.store), 11)
+
+        self._assertMissing(revoked[0])
+        self.assertEqual(len(self.store), 10)
+        self.clock.pump([1] * 6)
+        self.assertEqual(len(self.store), 1)
+
+
+    def test_revokeClientTwice(self):
+        first = self._issue()
+        self.store.revokeClient(IDENTIFIER)
+        second = self._issue()
+        self.store.revokeClient(IDENTIFIER)
+        self._assertMissing(first)
+        self._assertMissing(second)
+        self._rotate(self._issue())
+
+
+    def test_revokeClientUnknown(self):
+        return self.store.revokeClient(BOGUS_IDENTIFIER)
+
+
+    def test_issueAfterRevokeClient(self):
+        self.store.revokeClient(IDENTIFIER)
+        self._rotate(self._issue())
+
+
+    def test_rotateRefreshTokens(self):
+        """
+        Tokens in a batch are rotated in order, so presenting the same token
+        twice revokes its family.
+        """
+        value, other = self._issue(), self._issue()
+        credentials = [refreshToken(v) for v in [other, value, value]]
+        results = []
+        self.store.rotateRefreshTokens(credentials).addCallback(results.append)
+        [(first, second, third)] = results
+        self.assertEqual(first.avatarId, AVATAR_ID)
+        self.assertEqual(second.avatarId, AVATAR_ID)
+        third.trap(token.RefreshTokenNotFound)
+        self._assertMissing(second.refreshToken)
+        self._rotate(first.refreshToken)
+
+
+    def test_rotationKeepsOneToken(self):
+        """
+        Only the newest token of a family is kept, however often it has been
+        rotated, yet older tokens are still recognized as reuse.
+        """
+        first = value = self._issue()
+        for _ in xrange(1000):
+            value = self._rotate(value)
+        self.assertEqual(len(self.store), 1)
+        self._assertMissing(first)
+        self._assertMissing(value)
+        self.assertEqual(len(self.store), 0)
+
+
+    def test_unknownFamily(self):
+        """
+        Tokens which don't belong to a live family don't affect others.
+        """
+        value = self._issue()
+        for bogus in ["", ".", "x.y", value.split(".")[0] + "x." + "y"]:
+            self._assertMissing(bogus)
+        self._rotate(value)
+
+
+    def test_expiry(self):
+        value = self._issue()
+        self.clock.advance(9)
+        value = self._rotate(value)
+        self.clock.advance(9)
+        value = self._rotate(value)
+        self.clock.advance(10)
+        return self._assertMissing(value)
+
+
+    def test_sweep(self):
+        """
+        Expired families are dropped, even if their tokens are never
+        presented again.
+        """
+        self.clock.advance(0.5)
+        for _ in xrange(100):
+            self._issue()
+        self._rotate(self._issue())
+        self.clock.pump([0.05] * 400)
+        self.assertEqual(len(self.store), 0)
+        self.assertEqual(len(self.store._wheel), 0)
+
+
+    def test_sweepAfterRotation(self):
+        """
+        A family which was rotated before it expired is kept until its
+        newest token expires.
+        """
+        value = self._issue()
+        self.clock.pump([1] * 5)
+        value = self._rotate(value)
+        self.clock.pump([1] * 9)
+        self.assertEqual(len(self.store), 1)
+        self.clock.pump([1] * 2)
+        self.assertEqual(len(self.store), 0)
@@ -0,0 +1,142 @@
+"""
+Tests for the sharded assertion store.
+"""
+from txoauth import token, clientcred
+from txoauth.contrib import sharded
+from txoauth.contrib.test.test_simple import _EnumerableAssertionStoreTests
+from txoauth.contrib.test.test_simple import _BulkAssertionStoreTests
+from txoauth.contrib.test.test_simple import _ClientIndexedAssertionStoreTests
+from txoauth.contrib.test.test_simple import _BatchAssertionStoreTests
+from txoauth.test.test_clientcred import IDENTIFIER, URI
+from txoauth.test.test_token import TYPE, ASSERTION
+
+from twisted.internet import task
+from twisted.trial.unittest import TestCase
+
+
+class ShardedAssertionStoreTestCase(_EnumerableAssertionStoreTests,
+                                    _BulkAssertionStoreTests,
+                                    _ClientIndexedAssertionStoreTests,
+                                    _BatchAssertionStoreTests,
+                                    TestCase):
+    implementer = sharded.ShardedAssertionStore
+
+    def _buildStore(self, **kwargs):
+        self.clock = task.Clock()
+        kwargs.setdefault("clock", self.clock)
+        return self.implementer(ttl=10, shards=4, **kwargs)
+
+
+
+class ShardedAssertionStoreExpiryTestCase(TestCase):
+    def setUp(self):
+        self.clock = task.Clock()
+        self.store = sharded.ShardedAssertionStore(forceInvalidation=False,
+                                                   ttl=10, shards=4,
+                                                   clock=self.clock)
+        c = clientcred.ClientIdentifier(IDENTIFIER, URI)
+        self.assertion = token.Assertion(c, TYPE, ASSERTION)
+
+
+    def tearDown(self):
+        self.store.stop()
+
+
+    def _assertMissing(self, assertion, invalidate=True):
+        d = self.store.checkAssertion(assertion, invalidate)
+        return self.assertFailure(d, token.AssertionNotFound)
+
+
+    def test_notExpiredYet(self):
+        self.store.addAssertion(self.assertion)
+        self.clock.advance(9)
+        return self.store.checkAssertion(self.assertion)
+
+
+    def test_expired(self):
+        self.store.addAssertion(self.assertion)
+        self.clock.pump([1] * 11)
+        self.assertEqual(len(self.store), 0)
+        return self._assertMissing(self.assertion, invalidate=False)
+
+
+    def test_expiredBeforeWheelRuns(self):
+        """
+        An assertion that has expired is not found, even if the wheel has
+        not removed it yet.
+        """
+        self.store.stop()
+        self.store.addAssertion(self.assertion)
+        self.clock.advance(11)
+        self.assertEqual(len(self.store), 1)
+        return self._assertMissing(self.assertion)
+
+
+    def test_expiredClientIndex(self):
+        """
+        Expired assertions are not counted, and are removed from the client
+        index along with the shards.
+        """
+        self.store.addAssertion(self.assertion)
+        self.clock.advance(10)
+        counts = []
+        self.store.countAssertions(IDENTIFIER).addCallback(counts.append)
+        self.assertEqual(counts, [0])
+
+        self.clock.pump([1] * 2)
+        self.assertEqual(self.store._byClient, {})
+
+
+    def test_customTTL(self):
+        self.store.addAssertion(self.assertion, ttl=2)
+        self.clock.pump([1] * 3)
+        return self._assertMissing(self.assertion)
+
+
+    def test_readdedAfterInvalidation(self):
+        """
+        Re-adding an assertion that was invalidated is not undone by the
+        expiry of its earlier incarnation.
+        """
+        self.store.addAssertion(self.assertion)
+        self.clock.advance(5)
+        self.store.checkAssertion(self.assertion)
+        self.store.addAssertion(self.assertion)
+        self.clock.pump([1] * 6)
+        return self.store.checkAssertion(self.assertion)
+
+
+    def test_getAssertions_expired(self):
+        self.store.stop()
+        self.store.addAssertion(self.assertion)
+        self.clock.advance(11)
+        d = self.store.getAssertions()
+        d.addCallback(self.assertEqual, [])
+        return d
+
+
+    def test_addAssertions_ttl(self):
+        self.store.addAssertions([self.assertion], ttl=2)
+        self.clock.pump([1] * 3)
+        self.assertEqual(len(self.store), 0)
+        return self._assertMissing(self.assertion)
+
+
+    def test_fractionalClock(self):
+        """
+        Assertions added part way through a tick are still removed, along
+        with their client index entries, once they expire.
+        """
+        self.store.stop()
+        clock = task.Clock()
+        clock.advance(0.5)
+        store = sharded.ShardedAssertionStore(ttl=10, shards=4, clock=clock)
+        self.addCleanup(store.stop)
+        clock.advance(0.4)
+        c = clientcred.ClientIdentifier(IDENTIFIER)
+        store.addAssertions([token.Assertion(c, TYPE, str(i))
+                             for i in xrange(100)])
+        clock.pump([0.05] * 2000)
+        self.assertEqual(len(store), 0)
+        self.assertEqual(len(store._wheel), 0)
+        self.assertEqual(store._byClient, {})
@@ -0,0 +1,209 @@
+"""
+Tests for the shared memory assertion store.
+"""
+import os
+
+from txoauth import token, clientcred
+from txoauth.contrib import shm
+from txoauth.contrib.test.test_simple import _AssertionStoreTests
+from txoauth.test.test_clientcred import IDENTIFIER, URI
+from txoauth.test.test_token import TYPE, ASSERTION
+
+from twisted.internet import task
+from twisted.trial.unittest import TestCase
+
+
+class SharedMemoryAssertionStoreTestCase(_AssertionStoreTests, TestCase):
+    implementer = shm.SharedMemoryAssertionStore
+
+    def setUp(self):
+        self.stores = []
+        return _AssertionStoreTests.setUp(self)
+
+
+    def tearDown(self):
+        for store in self.stores:
+            store.close()
+
+
+    def _buildStore(self, **kwargs):
+        store = self.implementer(self.mktemp(), slots=64, stripeSize=8,
+                                 **kwargs)
+        self.stores.append(store)
+        return store
+
+
+
+class SharedMemoryAssertionStoreBehaviorTestCase(TestCase):
+    def setUp(self):
+        self.clock = task.Clock()
+        self.clock.advance(1000)
+        self.path = self.mktemp()
+        self.stores = []
+        self.store = self._buildStore()
+
+        self.credentials = clientcred.ClientIdentifier(IDENTIFIER, URI)
+        self.assertion = token.Assertion(self.credentials, TYPE, ASSERTION)
+
+
+    def tearDown(self):
+        for store in self.stores:
+            store.close()
+
+
+    def _buildStore(self, **kwargs):
+        kwargs.setdefault("slots", 16)
+        kwargs.setdefault("stripeSize", 4)
+        store = shm.SharedMemoryAssertionStore(self.path, ttl=10,
+                                               clock=self.clock, **kwargs)
+        self.stores.append(store)
+        return store
+
+
+    def _assertMissing(self, store, assertion, invalidate=True):
+        d = store.checkAssertion(assertion, invalidate)
+        return self.assertFailure(d, token.AssertionNotFound)
+
+
+    def test_badSize(self):
+        self.assertRaises(ValueError, shm.SharedMemoryAssertionStore,
+                          self.mktemp(), slots=10, stripeSize=4)
+
+
+    def test_notATable(self):
+        path = self.mktemp()
+        open(path, "w").write("x" * 100)
+        self.assertRaises(ValueError, shm.SharedMemoryAssertionStore, path)
+
+
+    def test_shared(self):
+        """
+        Stores opened on the same file share their assertions, and an
+        assertion can only be used once through any of them.
+        """
+        other = self._buildStore()
+        self.store.addAssertion(self.assertion)
+        d = other.checkAssertion(self.assertion)
+        d.addCallback(lambda _: self._assertMissing(self.store,
+                                                    self.assertion))
+        return d
+
+
+    def test_existingSizeKept(self):
+        self._buildStore(slots=32, stripeSize=8)
+        self.assertEqual(self.stores[-1]._slots, 16)
+        self.assertEqual(self.stores[-1]._stripeSize, 4)
+
+
+    def test_expired(self):
+        self.store.addAssertion(self.assertion)
+        self.clock.advance(9)
+        d = self.store.checkAssertion(self.assertion, invalidate=True)
+        d.addCallback(lambda _: self.store.addAssertion(self.assertion))
+
+        @d.addCallback
+        def expire(_):
+            self.clock.advance(10)
+            return self._assertMissing(self.store, self.assertion)
+
+        return d
+
+
+    def test_equalAssertion(self):
+        self.store.addAssertion(self.assertion)
+        c = clientcred.ClientIdentifierSecret(IDENTIFIER, "secret")
+        return self.store.checkAssertion(token.Assertion(c, TYPE, ASSERTION))
+
+
+    def _buildSmallStore(self):
+        """
+        Builds a store with a single stripe of four slots.
+        """
+        self.path = self.mktemp()
+        self.store = self._buildStore(slots=4, stripeSize=4)
+        return self.store
+
+
+    def _add(self, store, *values, **kwargs):
+        added = []
+        for value in values:
+            assertion = token.Assertion(self.credentials, TYPE, value)
+            d = store.addAssertion(assertion, kwargs.get("ttl"))
+            d.addBoth(added.append)
+        return added
+
+
+    def test_full(self):
+        """
+        When a stripe is full of live assertions, adding another fails.
+        """
+        store = self._buildSmallStore()
+        self._add(store, "a", "b", "c", "d")
+        d = store.addAssertion(token.Assertion(self.credentials, TYPE, "x"))
+        return self.assertFailure(d, shm.TableFull)
+
+
+    def test_checkError(self):
+        """
+        Errors while checking an assertion fail the returned C{Deferred}
+        instead of being raised.
+        """
+        def brokenCheck(*args):
+            raise IOError()
+        self.store._check = brokenCheck
+        d = self.store.checkAssertion(self.assertion)
+        return self.assertFailure(d, IOError)
+
+
+    def test_reuseExpiredAndDeleted(self):
+        store = self._buildSmallStore()
+        self._add(store, "a", "b", ttl=1)
+        self._add(store, "c", "d")
+        store.checkAssertion(token.Assertion(self.credentials, TYPE, "d"))
+        self.clock.advance(1)
+
+        self.assertEqual(self._add(store, "x", "y", "z"), [None] * 3)
+        failed, = self._add(store, "w")
+        failed.trap(shm.TableFull)
+
+
+    def test_readdReplaces(self):
+        """
+        Adding an assertion again extends its lifetime instead of taking
+        another slot.
+        """
+        store = self._buildSmallStore()
+        self.assertEqual(self._add(store, *["a"] * 5), [None] * 5)
+        self.clock.advance(9)
+        self._add(store, "a")
+        self.clock.advance(9)
+        return store.checkAssertion(token.Assertion(self.credentials, TYPE,
+                                                    "a"))
+
+
+    def test_processes(self):
+        """
+        When several processes check the same assertion at the same time,
+        only one of them succeeds.
+        """
+        self.store.addAssertion(self.assertion)
+        pids = []
+        for _ in xrange(8):
+            pid = os.fork()
+            if pid == 0:
+                os._exit(self._checkInChild())
+            pids.append(pid)
+
+        codes = [os.WEXITSTATUS(os.waitpid(child, 0)[1]) for child in pids]
+        self.assertEqual(sorted(codes), [0] + [1] * 7)
+
+
+    def _checkInChild(self):
+        try:
+            store = shm.SharedMemoryAssertionStore(self.path,
+                                                   clock=self.clock)
+            results = []
+            store.checkAssertion(self.assertion).addBoth(results.append)
+            return 0 if results == [None] else 1
+        except:
+            return 2
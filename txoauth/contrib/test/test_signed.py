@@ -0,0 +1,210 @@
+"""
+Tests for signed access tokens.
+"""
+from txoauth import token
+from txoauth.contrib import signed
+from txoauth.interfaces import IAccessTokenStore
+from txoauth.test.test_clientcred import IDENTIFIER
+
+from twisted.internet import task
+from twisted.trial.unittest import TestCase
+
+from zope.interface.verify import verifyObject
+
+
+class KeySetTestCase(TestCase):
+    def setUp(self):
+        self.keySet = signed.KeySet([("a", "secret a"), ("b", "secret b")])
+
+
+    def test_lastKeyIsCurrent(self):
+        self.assertEqual(self.keySet.currentKeyId, "b")
+
+
+    def test_explicitCurrentKey(self):
+        keySet = signed.KeySet([("a", "secret a"), ("b", "secret b")], "a")
+        self.assertEqual(keySet.currentKeyId, "a")
+
+
+    def test_unknownCurrentKey(self):
+        self.assertRaises(KeyError, signed.KeySet, [("a", "secret a")], "b")
+
+
+    def test_getKey(self):
+        self.assertEqual(self.keySet.getKey("a"), "secret a")
+        self.assertIdentical(self.keySet.getKey("c"), None)
+
+
+    def test_addKeyNotCurrent(self):
+        self.keySet.addKey("c", "secret c", current=False)
+        self.assertEqual(self.keySet.getKey("c"), "secret c")
+        self.assertEqual(self.keySet.currentKeyId, "b")
+
+
+    def test_badKeyId(self):
+        self.assertRaises(ValueError, self.keySet.addKey, "c|d", "secret")
+
+
+    def test_retireKey(self):
+        self.keySet.retireKey("a")
+        self.assertIdentical(self.keySet.getKey("a"), None)
+
+
+    def test_retireCurrentKey(self):
+        self.assertRaises(ValueError, self.keySet.retireKey, "b")
+
+
+
+class SignedAccessTokenStoreTestCase(TestCase):
+    def setUp(self):
+        self.clock = task.Clock()
+        self.keySet = signed.KeySet([("a", "secret a")])
+        self.store = signed.SignedAccessTokenStore(self.keySet, expiresIn=10,
+                                                   clock=self.clock)
+
+
+    def _assertInvalid(self, accessToken):
+        self.assertRaises(token.AccessTokenNotFound,
+                          self.store.verify, accessToken)
+
+
+    def test_interface(self):
+        verifyObject(IAccessTokenStore, self.store)
+
+
+    def test_issue(self):
+        d = self.store.issueAccessToken(IDENTIFIER)
+
+        @d.addCallback
+        def issued(accessToken):
+            self.assertEqual(accessToken.expiresIn, 10)
+            return self.store.checkAccessToken(accessToken.accessToken)
+
+        d.addCallback(self.assertEqual, IDENTIFIER)
+        return d
+
+
+    def test_unknown(self):
+        d = self.store.checkAccessToken("bogus")
+        return self.assertFailure(d, token.AccessTokenNotFound)
+
+
+    def test_verify(self):
+        accessToken = self.store.sign(IDENTIFIER)
+        self.assertEqual(self.store.verify(accessToken), IDENTIFIER)
+
+
+    def test_unique(self):
+        tokens = set(self.store.sign(IDENTIFIER) for _ in range(100))
+        self.assertEqual(len(tokens), 100)
+
+
+    def test_clientIdentifierWithSeparators(self):
+        clientIdentifier = "a|b.c"
+        accessToken = self.store.sign(clientIdentifier)
+        self.assertEqual(self.store.verify(accessToken), clientIdentifier)
+
+
+    def test_unicodeClientIdentifier(self):
+        accessToken = self.store.sign(u"\N{SNOWMAN}")
+        self.assertEqual(self.store.verify(accessToken),
+                         u"\N{SNOWMAN}".encode("utf-8"))
+
+
+    def test_expired(self):
+        accessToken = self.store.sign(IDENTIFIER)
+        self.clock.advance(9)
+        self.store.verify(accessToken)
+        self.clock.advance(1)
+        self._assertInvalid(accessToken)
+
+
+    def test_customExpiry(self):
+        accessToken = self.store.sign(IDENTIFIER, expiresIn=100)
+        self.clock.advance(99)
+        self.store.verify(accessToken)
+
+
+    def test_tamperedPayload(self):
+        accessToken = self.store.sign(IDENTIFIER)
+        payload, mac = accessToken.split(".")
+        forged = signed._decode(payload).replace(IDENTIFIER, "forged")
+        self._assertInvalid(signed._encode(forged) + "." + mac)
+
+
+    def test_tamperedSignature(self):
+        accessToken = self.store.sign(IDENTIFIER)
+        payload, mac = accessToken.split(".")
+        self._assertInvalid(payload + "." + signed._encode("x" * 32))
+
+
+    def test_malformed(self):
+        for accessToken in ["", "a", "a.b.c", "!!.!!", u"\N{SNOWMAN}", None]:
+            self._assertInvalid(accessToken)
+
+
+    def test_rotation(self):
+        """
+        Tokens signed with an earlier key stay valid until that key is
+        retired.
+        """
+        old = self.store.sign(IDENTIFIER)
+        self.keySet.addKey("b", "secret b")
+        new = self.store.sign(IDENTIFIER)
+        self.assertEqual(self.store.verify(old), IDENTIFIER)
+        self.assertEqual(self.store.verify(new), IDENTIFIER)
+
+        self.keySet.retireKey("a")
+        self._assertInvalid(old)
+        self.assertEqual(self.store.verify(new), IDENTIFIER)
+
+
+    def test_otherKeySet(self):
+        accessToken = self.store.sign(IDENTIFIER)
+        other = signed.SignedAccessTokenStore(signed.KeySet([("a", "other")]),
+                                              clock=self.clock)
+        self.assertRaises(token.AccessTokenNotFound, other.verify, accessToken)
+
+
+    def test_revoke(self):
+        accessToken = self.store.sign(IDENTIFIER)
+        other = self.store.sign(IDENTIFIER)
+        d = self.store.revokeAccessToken(accessToken)
+
+        @d.addCallback
+        def revoked(_):
+            self._assertInvalid(accessToken)
+            self.assertEqual(self.store.verify(other), IDENTIFIER)
+
+        return d
+
+
+    def test_revokeInvalid(self):
+        self.store.revoke("bogus")
+        self.assertEqual(self.store._revoked, {})
+
+
+    def test_revocationListPruned(self):
+        """
+        Revoked tokens are forgotten once they have expired.
+        """
+        first = self.store.sign(IDENTIFIER, expiresIn=5)
+        second = self.store.sign(IDENTIFIER)
+        self.store.revoke(first)
+        self.store.revoke(second)
+        self.assertEqual(len(self.store._revoked), 2)
+
+        self.clock.advance(5)
+        self._assertInvalid(second)
+        self.assertEqual(len(self.store._revoked), 1)
+
+        self.clock.advance(5)
+        self.store.revoke(self.store.sign(IDENTIFIER))
+        self.assertEqual(len(self.store._revoked), 1)
+
+
+    def test_revokeExpired(self):
+        accessToken = self.store.sign(IDENTIFIER)
+        self.clock.advance(10)
+        self.store.revoke(accessToken)
+        self.assertEqual(self.store._revoked, {})
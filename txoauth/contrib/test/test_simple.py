@@ -3,10 +3,13 @@ Tests for simple txOAuth implementations.
 """
 from txoauth import interfaces, token, clientcred
 from txoauth.contrib import simple
+from txoauth._keys import assertionDigest
 from txoauth.test.test_clientcred import IDENTIFIER, BOGUS_IDENTIFIER, URI
+from txoauth.test.test_clientcred import SECRET, BOGUS_URI
 from txoauth.test.test_token import TYPE, ASSERTION
 from txoauth.test.test_token import BOGUS_TYPE, BOGUS_ASSERTION
 
+from twisted.internet import defer
 from twisted.trial.unittest import TestCase
 
 
@@ -41,23 +44,48 @@ class SimpleRedirectURIFactoryTestCase(TestCase):
         self._genericFactoryTest(self.withURLs, BOGUS_IDENTIFIER, None)
 
 
+    def test_batchInterface(self):
+        self.assertTrue(interfaces.IBatchRedirectURIFactory
+                        .implementedBy(simple.SimpleRedirectURIFactory))
+
+
+    def test_getRedirectURIs(self):
+        d = self.withURLs.getRedirectURIs([IDENTIFIER, BOGUS_IDENTIFIER])
+        @d.addCallback
+        def cb(urls):
+            self.assertEquals(urls, {IDENTIFIER: URI, BOGUS_IDENTIFIER: None})
+        return d
+
+
+
+class _AssertionStoreTests(object):
+    """
+    Tests for L{interfaces.IAssertionStore} implementations.
+
+    Subclasses set C{implementer} and may override C{_buildStore}. Stores
+    may add assertions asynchronously, by returning a C{Deferred}.
+    """
+    implementer = None
 
-class SimpleAssertionStoreTestCase(TestCase):
     def setUp(self):
         c = clientcred.ClientIdentifier(IDENTIFIER, URI)
         self.assertion = token.Assertion(c, TYPE, ASSERTION)
         self.bogusAssertion = token.Assertion(c, BOGUS_TYPE, BOGUS_ASSERTION)
 
-        self.store = simple.SimpleAssertionStore()
-        self.store.addAssertion(self.assertion)
+        self.store = self._buildStore()
+        self.store2 = self._buildStore(forceInvalidation=False)
+        return defer.gatherResults(
+            [defer.maybeDeferred(store.addAssertion, self.assertion)
+             for store in [self.store, self.store2]])
 
-        self.store2 = simple.SimpleAssertionStore(forceInvalidation=False)
-        self.store2.addAssertion(self.assertion)
+
+    def _buildStore(self, **kwargs):
+        return self.implementer(**kwargs)
 
 
     def test_interface(self):
         self.assertTrue(interfaces.IAssertionStore
-                        .implementedBy(simple.SimpleAssertionStore))
+                        .implementedBy(self.implementer))
 
 
     def _test_simple(self, store):
@@ -132,3 +160,216 @@ class SimpleAssertionStoreTestCase(TestCase):
 
     def test_enforcedValidation_missingAssertion(self):
         return self._test_enforcedInvalidation(self.bogusAssertion)
+
+
+    def test_otherCredentials(self):
+        """
+        Assertions are matched by client identifier, whatever redirect URI
+        or secret the client presents them with.
+        """
+        c = clientcred.ClientIdentifierSecret(IDENTIFIER, SECRET, BOGUS_URI)
+        return self.store.checkAssertion(
+            token.Assertion(c, TYPE, ASSERTION))
+
+
+    def test_otherClient(self):
+        c = clientcred.ClientIdentifier(BOGUS_IDENTIFIER, URI)
+        d = self.store.checkAssertion(token.Assertion(c, TYPE, ASSERTION))
+        return self.assertFailure(d, token.AssertionNotFound)
+
+
+
+class _EnumerableAssertionStoreTests(_AssertionStoreTests):
+    """
+    Tests for L{interfaces.IEnumerableAssertionStore} implementations.
+    """
+    def _getDigests(self, store):
+        d = store.getAssertions()
+        d.addCallback(lambda assertions: [assertionDigest(assertion)
+                                          for assertion in assertions])
+        return d
+
+
+    def test_enumerableInterface(self):
+        self.assertTrue(interfaces.IEnumerableAssertionStore
+                        .implementedBy(self.implementer))
+
+
+    def test_getAssertions(self):
+        d = self._getDigests(self.store)
+        d.addCallback(self.assertEqual, [assertionDigest(self.assertion)])
+        return d
+
+
+    def test_getAssertions_invalidated(self):
+        d = self.store.checkAssertion(self.assertion)
+        d.addCallback(lambda _: self._getDigests(self.store))
+        d.addCallback(self.assertEqual, [])
+        return d
+
+
+
+class _BulkAssertionStoreTests(_AssertionStoreTests):
+    """
+    Tests for L{interfaces.IBulkAssertionStore} implementations.
+    """
+    def test_bulkInterface(self):
+        self.assertTrue(interfaces.IBulkAssertionStore
+                        .implementedBy(self.implementer))
+
+
+    def test_addAssertions(self):
+        c = self.assertion.clientCredentials
+        assertions = [token.Assertion(c, TYPE, str(i)) for i in range(10)]
+        d = self.store.addAssertions(iter(assertions))
+
+        @d.addCallback
+        def check(_):
+            return defer.gatherResults([self.store.checkAssertion(a)
+                                        for a in assertions])
+
+        return d
+
+
+    def test_addAssertions_empty(self):
+        return self.store.addAssertions([])
+
+
+
+class _ClientIndexedAssertionStoreTests(_AssertionStoreTests):
+    """
+    Tests for L{interfaces.IClientIndexedAssertionStore} implementations.
+    """
+    def _addOtherClient(self):
+        """
+        Adds an assertion of another client, and returns it.
+        """
+        c = clientcred.ClientIdentifier(BOGUS_IDENTIFIER)
+        other = token.Assertion(c, TYPE, ASSERTION)
+        d = defer.maybeDeferred(self.store.addAssertion, other)
+        d.addCallback(lambda _: other)
+        return d
+
+
+    def test_clientIndexedInterface(self):
+        self.assertTrue(interfaces.IClientIndexedAssertionStore
+                        .implementedBy(self.implementer))
+
+
+    def test_countAssertions(self):
+        c = self.assertion.clientCredentials
+        more = [token.Assertion(c, TYPE, str(i)) for i in range(3)]
+        d = defer.gatherResults([defer.maybeDeferred(self.store.addAssertion,
+                                                     assertion)
+                                 for assertion in more])
+        d.addCallback(lambda _: self._addOtherClient())
+        d.addCallback(lambda _: defer.gatherResults([
+                    self.store.countAssertions(IDENTIFIER),
+                    self.store.countAssertions(BOGUS_IDENTIFIER),
+                    self.store.countAssertions("nobody")]))
+        d.addCallback(self.assertEqual, [4, 1, 0])
+        return d
+
+
+    def test_countAssertions_invalidated(self):
+        d = self.store.checkAssertion(self.assertion)
+        d.addCallback(lambda _: self.store.countAssertions(IDENTIFIER))
+        d.addCallback(self.assertEqual, 0)
+        return d
+
+
+    def test_revokeClient(self):
+        d = self._addOtherClient()
+
+        @d.addCallback
+        def revoke(other):
+            self.other = other
+            return self.store.revokeClient(IDENTIFIER)
+
+        @d.addCallback
+        def revoked(_):
+            d = self.store.checkAssertion(self.assertion)
+            return self.assertFailure(d, token.AssertionNotFound)
+
+        d.addCallback(lambda _: self.store.countAssertions(IDENTIFIER))
+        d.addCallback(self.assertEqual, 0)
+        d.addCallback(lambda _: self.store.checkAssertion(self.other))
+        return d
+
+
+    def test_revokeClient_unknown(self):
+        d = self.store.revokeClient("nobody")
+        d.addCallback(lambda _: self.store.checkAssertion(self.assertion))
+        return d
+
+
+    def test_revokeClient_readd(self):
+        """
+        Assertions of a revoked client can be added again.
+        """
+        d = self.store.revokeClient(IDENTIFIER)
+        d.addCallback(lambda _: self.store.addAssertion(self.assertion))
+        d.addCallback(lambda _: self.store.countAssertions(IDENTIFIER))
+        d.addCallback(self.assertEqual, 1)
+        return d
+
+
+
+class _BatchAssertionStoreTests(_AssertionStoreTests):
+    """
+    Tests for L{interfaces.IBatchAssertionStore} implementations.
+    """
+    def test_batchInterface(self):
+        self.assertTrue(interfaces.IBatchAssertionStore
+                        .implementedBy(self.implementer))
+
+
+    def _checkAssertions(self, assertions):
+        d = self.store.checkAssertions(assertions)
+
+        @d.addCallback
+        def found(results):
+            self.assertEqual(len(results), len(assertions))
+            for result in results:
+                if result is not None:
+                    result.trap(token.AssertionNotFound)
+            return [result is None for result in results]
+
+        return d
+
+
+    def test_checkAssertions(self):
+        d = self._checkAssertions([self.bogusAssertion, self.assertion])
+        d.addCallback(self.assertEqual, [False, True])
+        return d
+
+
+    def test_checkAssertions_invalidates(self):
+        d = self._checkAssertions([self.assertion])
+        d.addCallback(lambda _: self._checkAssertions([self.assertion]))
+        d.addCallback(self.assertEqual, [False])
+        return d
+
+
+    def test_checkAssertions_duplicate(self):
+        """
+        Only the first check of an assertion appearing twice succeeds.
+        """
+        d = self._checkAssertions([self.assertion, self.assertion])
+        d.addCallback(self.assertEqual, [True, False])
+        return d
+
+
+    def test_checkAssertions_empty(self):
+        d = self._checkAssertions([])
+        d.addCallback(self.assertEqual, [])
+        return d
+
+
+
+class SimpleAssertionStoreTestCase(_EnumerableAssertionStoreTests,
+                                   _BulkAssertionStoreTests,
+                                   _ClientIndexedAssertionStoreTests,
+                                   _BatchAssertionStoreTests,
+                                   TestCase):
+    implementer = simple.SimpleAssertionStore
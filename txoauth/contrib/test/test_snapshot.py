@@ -0,0 +1,344 @@
+"""
+Tests for snapshots of in-memory stores.
+"""
+import os
+
+from txoauth import clientcred, token
+from txoauth.contrib import sharded, simple, snapshot
+from txoauth.test.test_clientcred import IDENTIFIER, BOGUS_IDENTIFIER
+from txoauth.test.test_clientcred import SECRET, URI
+from txoauth.test.test_token import TYPE
+
+from twisted.internet import task
+from twisted.trial.unittest import TestCase
+
+
+def _assertion(value, identifier=IDENTIFIER, redirectURI=None, secret=None):
+    if secret is None:
+        credentials = clientcred.ClientIdentifier(identifier, redirectURI)
+    else:
+        credentials = clientcred.ClientIdentifierSecret(identifier, secret,
+                                                        redirectURI)
+    return token.Assertion(credentials, TYPE, value)
+
+
+def _credentials(assertion):
+    """
+    Gets everything identifying an assertion and its client credentials.
+    """
+    credentials = assertion.clientCredentials
+    return (credentials.__class__, credentials.identifier,
+            credentials.redirectURI, getattr(credentials, "secret", None),
+            assertion.assertionType, assertion.assertion)
+
+
+class AssertionSnapshotTestCase(TestCase):
+    def setUp(self):
+        self.path = self.mktemp()
+        self.store = simple.SimpleAssertionStore()
+        self.assertions = [_assertion("a"), _assertion(""),
+                           _assertion("b", BOGUS_IDENTIFIER),
+                           _assertion("c", redirectURI=URI),
+                           _assertion("d", secret=SECRET),
+                           _assertion("e", redirectURI="", secret=SECRET)]
+        self.store.addAssertions(self.assertions)
+
+
+    def _assertRestored(self, store, expected):
+        d = store.getAssertions()
+
+        @d.addCallback
+        def restored(assertions):
+            self.assertEqual(sorted(map(_credentials, assertions)),
+                             sorted(map(_credentials, expected)))
+
+        return d
+
+
+    def test_roundTrip(self):
+        """
+        Restored assertions keep the redirect URIs and secrets of their
+        client credentials.
+        """
+        snapshot.snapshot(self.store, self.path)
+        restored = simple.SimpleAssertionStore()
+        snapshot.restore(restored, self.path)
+        return self._assertRestored(restored, self.assertions)
+
+
+    def test_redeemAfterRestore(self):
+        snapshot.snapshot(self.store, self.path)
+        restored = simple.SimpleAssertionStore()
+        snapshot.restore(restored, self.path)
+        return restored.checkAssertion(_assertion("d", secret=SECRET))
+
+
+    def test_enumerableStore(self):
+        """
+        Any enumerable assertion store can be snapshotted and restored.
+        """
+        clock = task.Clock()
+        store = sharded.ShardedAssertionStore(clock=clock)
+        self.addCleanup(store.stop)
+        store.addAssertions(self.assertions)
+        snapshot.snapshot(store, self.path)
+
+        restored = sharded.ShardedAssertionStore(clock=clock)
+        self.addCleanup(restored.stop)
+        snapshot.restore(restored, self.path, clock)
+        return self._assertRestored(restored, self.assertions)
+
+
+    def test_deadlines(self):
+        """
+        Assertions restored to an expiring store keep their deadlines, and
+        assertions which have expired since the snapshot was taken are
+        dropped.
+        """
+        clock = task.Clock()
+        store = sharded.ShardedAssertionStore(clock=clock)
+        self.addCleanup(store.stop)
+        store.addAssertion(_assertion("a"), ttl=10)
+        store.addAssertion(_assertion("b"), ttl=50)
+        snapshot.snapshot(store, self.path)
+
+        clock.advance(20)
+        restored = sharded.ShardedAssertionStore(ttl=600, clock=clock)
+        self.addCleanup(restored.stop)
+        snapshot.restore(restored, self.path, clock)
+        d = restored.getAssertionDeadlines()
+        d.addCallback(self.assertEqual, [(_assertion("b"), 50)])
+        return d
+
+
+    def test_noDeadlines(self):
+        """
+        Assertions from a store which doesn't expire them get the default
+        time to live of the store they are restored to.
+        """
+        clock = task.Clock()
+        clock.advance(1000)
+        snapshot.snapshot(self.store, self.path)
+        restored = sharded.ShardedAssertionStore(ttl=10, clock=clock)
+        self.addCleanup(restored.stop)
+        snapshot.restore(restored, self.path, clock)
+
+        d = restored.getAssertionDeadlines()
+
+        @d.addCallback
+        def check(assertionDeadlines):
+            self.assertEqual(set([deadline for _, deadline
+                                  in assertionDeadlines]), set([1010]))
+
+        return d
+
+
+    def test_expiredNotRestored(self):
+        """
+        Expired assertions aren't restored, even to stores which don't
+        expire assertions themselves.
+        """
+        snapshot.writeAssertions(self.path, self.assertions[:2], [5, 15])
+        clock = task.Clock()
+        clock.advance(10)
+        restored = simple.SimpleAssertionStore()
+        snapshot.restore(restored, self.path, clock)
+        return self._assertRestored(restored, self.assertions[1:2])
+
+
+    def test_readDeadlines(self):
+        snapshot.writeAssertions(self.path, self.assertions[:2], [5.5, None])
+        self.assertEqual(snapshot.readAssertionDeadlines(self.path),
+                         [(self.assertions[0], 5.5),
+                          (self.assertions[1], None)])
+
+
+    def test_unicode(self):
+        snapshot.writeAssertions(self.path, [_assertion(u"\N{SNOWMAN}")])
+        [assertion] = snapshot.readAssertions(self.path)
+        self.assertEqual(assertion.assertion, u"\N{SNOWMAN}".encode("utf-8"))
+
+
+    def test_sharedClients(self):
+        snapshot.snapshot(self.store, self.path)
+        plain = clientcred.ClientIdentifier(IDENTIFIER)
+        first, second = [a for a in snapshot.readAssertions(self.path)
+                         if a.clientCredentials == plain]
+        self.assertIdentical(first.clientCredentials,
+                             second.clientCredentials)
+
+
+    def test_empty(self):
+        snapshot.writeAssertions(self.path, [])
+        self.assertEqual(snapshot.readAssertions(self.path), [])
+
+
+    def test_restoreAdds(self):
+        """
+        Restoring a snapshot keeps the assertions already in the store.
+        """
+        snapshot.snapshot(self.store, self.path)
+        restored = simple.SimpleAssertionStore()
+        restored.addAssertion(_assertion("f"))
+        snapshot.restore(restored, self.path)
+        return self._assertRestored(restored,
+                                    self.assertions + [_assertion("f")])
+
+
+    def test_noTemporaryFile(self):
+        snapshot.snapshot(self.store, self.path)
+        self.assertFalse(os.path.exists(self.path + ".tmp"))
+
+
+    def test_truncated(self):
+        snapshot.snapshot(self.store, self.path)
+        data = open(self.path, "rb").read()
+        for length in [0, 5, len(data) - 1]:
+            open(self.path, "wb").write(data[:length])
+            self.assertRaises(ValueError, snapshot.readAssertions, self.path)
+
+
+    def test_trailingData(self):
+        snapshot.snapshot(self.store, self.path)
+        open(self.path, "ab").write("x")
+        self.assertRaises(ValueError, snapshot.readAssertions, self.path)
+
+
+    def test_wrongKind(self):
+        snapshot.writeRedirectURIs(self.path, {IDENTIFIER: URI})
+        self.assertRaises(ValueError, snapshot.readAssertions, self.path)
+
+
+    def test_unsupported(self):
+        self.assertRaises(TypeError, snapshot.restore, object(), self.path)
+        d = snapshot.snapshot(object(), self.path)
+        return self.assertFailure(d, TypeError)
+
+
+
+class RedirectURISnapshotTestCase(TestCase):
+    def setUp(self):
+        self.path = self.mktemp()
+        self.uris = {IDENTIFIER: URI, BOGUS_IDENTIFIER: None}
+        self.factory = simple.SimpleRedirectURIFactory(**self.uris)
+
+
+    def test_roundTrip(self):
+        snapshot.snapshot(self.factory, self.path)
+        restored = simple.SimpleRedirectURIFactory()
+        snapshot.restore(restored, self.path)
+
+        d = restored.getRedirectURIs(self.uris.keys())
+        d.addCallback(self.assertEqual, self.uris)
+        return d
+
+
+    def test_emptyURI(self):
+        """
+        An empty redirect URI is not confused with a missing one.
+        """
+        snapshot.writeRedirectURIs(self.path, {IDENTIFIER: ""})
+        self.assertEqual(snapshot.readRedirectURIs(self.path),
+                         {IDENTIFIER: ""})
+
+
+    def test_truncated(self):
+        snapshot.snapshot(self.factory, self.path)
+        data = open(self.path, "rb").read()
+        open(self.path, "wb").write(data[:-1])
+        self.assertRaises(ValueError, snapshot.readRedirectURIs, self.path)
+
+
+    def test_wrongKind(self):
+        snapshot.writeAssertions(self.path, [_assertion("a")])
+        self.assertRaises(ValueError, snapshot.readRedirectURIs, self.path)
+
+
+
+class DeferringThreadPool(object):
+    """
+    A thread pool which runs functions when told to.
+    """
+    def __init__(self):
+        self.pending = []
+
+
+    def callInThreadWithCallback(self, onResult, f, *args, **kwargs):
+        self.pending.append((onResult, f, args, kwargs))
+
+
+    def runPending(self):
+        pending, self.pending = self.pending, []
+        for onResult, f, args, kwargs in pending:
+            onResult(True, f(*args, **kwargs))
+
+
+
+class SnapshotterTestCase(TestCase):
+    def setUp(self):
+        self.path = self.mktemp()
+        self.pool = DeferringThreadPool()
+        self.clock = task.Clock()
+        self.clock.getThreadPool = lambda: self.pool
+        self.clock.callFromThread = lambda f, *a, **kw: f(*a, **kw)
+
+        self.store = simple.SimpleAssertionStore()
+        self.store.addAssertion(_assertion("a"))
+        self.snapshotter = snapshot.Snapshotter(self.store, self.path,
+                                                interval=10,
+                                                reactor=self.clock)
+        self.addCleanup(self.snapshotter.stop)
+
+
+    def test_periodic(self):
+        self.snapshotter.start()
+        self.clock.advance(9)
+        self.assertEqual(self.pool.pending, [])
+
+        self.clock.advance(1)
+        self.pool.runPending()
+        self.assertEqual(snapshot.readAssertions(self.path),
+                         [_assertion("a")])
+
+        self.store.addAssertion(_assertion("b"))
+        self.clock.advance(10)
+        self.pool.runPending()
+        self.assertEqual(set(snapshot.readAssertions(self.path)),
+                         set([_assertion("a"), _assertion("b")]))
+
+
+    def test_capturedInReactorThread(self):
+        """
+        The snapshot holds the contents of the store when it was taken, not
+        when it was written.
+        """
+        d = self.snapshotter.snapshot()
+        self.store.addAssertion(_assertion("b"))
+        self.pool.runPending()
+        self.assertEqual(snapshot.readAssertions(self.path),
+                         [_assertion("a")])
+        return d
+
+
+    def test_oneAtATime(self):
+        self.snapshotter.snapshot()
+        self.snapshotter.snapshot()
+        self.assertEqual(len(self.pool.pending), 1)
+
+        self.pool.runPending()
+        self.snapshotter.snapshot()
+        self.assertEqual(len(self.pool.pending), 1)
+        self.pool.runPending()
+
+
+    def test_stopWaitsForWrite(self):
+        self.snapshotter.start()
+        self.clock.advance(10)
+
+        stopped = []
+        self.snapshotter.stop().addCallback(stopped.append)
+        self.assertEqual(stopped, [])
+
+        self.pool.runPending()
+        self.assertEqual(stopped, [None])
+        self.assertTrue(os.path.exists(self.path))
@@ -0,0 +1,248 @@
+"""
+Tests for the SQLite assertion store.
+"""
+from txoauth import token, clientcred
+from txoauth.contrib import sqlite
+from txoauth.contrib.test.test_simple import _EnumerableAssertionStoreTests
+from txoauth.contrib.test.test_simple import _BulkAssertionStoreTests
+from txoauth.contrib.test.test_simple import _ClientIndexedAssertionStoreTests
+from txoauth.contrib.test.test_simple import _BatchAssertionStoreTests
+from txoauth.test.test_clientcred import IDENTIFIER, URI
+from txoauth.test.test_token import TYPE, ASSERTION
+
+from twisted.internet import defer, reactor
+from twisted.trial.unittest import TestCase
+
+
+class SQLiteAssertionStoreTestCase(_EnumerableAssertionStoreTests,
+                                   _BulkAssertionStoreTests,
+                                   _ClientIndexedAssertionStoreTests,
+                                   _BatchAssertionStoreTests,
+                                   TestCase):
+    implementer = sqlite.SQLiteAssertionStore
+
+    def setUp(self):
+        self.stores = []
+        return _EnumerableAssertionStoreTests.setUp(self)
+
+
+    def tearDown(self):
+        return defer.gatherResults([s.close() for s in self.stores])
+
+
+    def _buildStore(self, **kwargs):
+        path = self.mktemp()
+        store = self.implementer(path, **kwargs)
+        self.stores.append(store)
+        return store
+
+
+
+class ClockReactor(object):
+    """
+    A reactor which delegates to the global reactor, except for the time.
+    """
+    def __init__(self):
+        self.now = 1000.0
+
+
+    def seconds(self):
+        return self.now
+
+
+    def __getattr__(self, name):
+        return getattr(reactor, name)
+
+
+
+class SQLiteAssertionStoreBehaviorTestCase(TestCase):
+    def setUp(self):
+        self.reactor = ClockReactor()
+        self.path = self.mktemp()
+        self.store = self._buildStore()
+
+        c = clientcred.ClientIdentifier(IDENTIFIER, URI)
+        self.assertion = token.Assertion(c, TYPE, ASSERTION)
+
+
+    def tearDown(self):
+        return self.store.close()
+
+
+    def _buildStore(self):
+        return sqlite.SQLiteAssertionStore(self.path, ttl=10,
+                                           reactor=self.reactor)
+
+
+    def _count(self):
+        connection = sqlite.sqlite3.connect(self.path)
+        try:
+            return connection.execute(
+                "SELECT COUNT(*) FROM assertions").fetchone()[0]
+        finally:
+            connection.close()
+
+
+    def test_persistent(self):
+        d = self.store.addAssertion(self.assertion)
+
+        @d.addCallback
+        def reopen(_):
+            return self.store.close()
+
+        @d.addCallback
+        def check(_):
+            self.store = self._buildStore()
+            return self.store.checkAssertion(self.assertion)
+
+        return d
+
+
+    def test_equalAssertion(self):
+        """
+        Assertions are identified by their client, type and value.
+        """
+        self.store.addAssertion(self.assertion)
+        c = clientcred.ClientIdentifierSecret(IDENTIFIER, "secret")
+        return self.store.checkAssertion(token.Assertion(c, TYPE, ASSERTION))
+
+
+    def test_groupCommit(self):
+        """
+        Operations requested in the same reactor iteration share a
+        transaction, and each gets its own result.
+        """
+        transactions = []
+        runTransaction = self.store._runTransaction
+        def countingRunTransaction(operations, now):
+            transactions.append(len(operations))
+            return runTransaction(operations, now)
+        self.store._runTransaction = countingRunTransaction
+
+        self.store.addAssertion(self.assertion)
+        first = self.store.checkAssertion(self.assertion)
+        second = self.store.checkAssertion(self.assertion)
+        self.assertFailure(second, token.AssertionNotFound)
+
+        d = defer.gatherResults([first, second])
+        d.addCallback(lambda _: self.assertEqual(transactions, [3]))
+        return d
+
+
+    def test_expired(self):
+        d = self.store.addAssertion(self.assertion)
+
+        @d.addCallback
+        def check(_):
+            self.reactor.now += 10
+            d = self.store.checkAssertion(self.assertion)
+            return self.assertFailure(d, token.AssertionNotFound)
+
+        return d
+
+
+    def test_prune(self):
+        self.store.addAssertion(self.assertion, ttl=5)
+        other = token.Assertion(self.assertion.clientCredentials, TYPE, "x")
+        d = self.store.addAssertion(other, ttl=20)
+
+        @d.addCallback
+        def prune(_):
+            self.assertEqual(self._count(), 2)
+            self.reactor.now += 10
+            return self.store.prune()
+
+        @d.addCallback
+        def check(_):
+            self.assertEqual(self._count(), 1)
+
+        return d
+
+
+    def test_getAssertions_expired(self):
+        self.store.addAssertion(self.assertion, ttl=5)
+        other = token.Assertion(self.assertion.clientCredentials, TYPE, "x")
+        d = self.store.addAssertion(other, ttl=20)
+
+        @d.addCallback
+        def getAssertions(_):
+            self.reactor.now += 10
+            return self.store.getAssertions()
+
+        @d.addCallback
+        def check(assertions):
+            self.assertEqual([a.assertion for a in assertions], ["x"])
+            self.assertEqual([a.clientCredentials.identifier
+                              for a in assertions], [IDENTIFIER])
+
+        return d
+
+
+    def test_getAssertionDeadlines(self):
+        d = self.store.addAssertion(self.assertion, ttl=5)
+        d.addCallback(lambda _: self.store.getAssertionDeadlines())
+        d.addCallback(self.assertEqual, [(self.assertion, 1005.0)])
+        return d
+
+
+    def test_failedOperation(self):
+        """
+        A failing operation is rolled back and fails on its own, without
+        affecting the other operations in its transaction.
+        """
+        def brokenOperation(connection, now):
+            other = token.Assertion(self.assertion.clientCredentials,
+                                    TYPE, "x")
+            self.store._add(connection, now, sqlite._key(other), 10)
+            raise sqlite.sqlite3.OperationalError()
+
+        d = self.store.addAssertion(self.assertion)
+        broken = self.store._enqueue(brokenOperation, ())
+        self.assertFailure(broken, sqlite.sqlite3.OperationalError)
+
+        d = defer.gatherResults([d, broken])
+
+        @d.addCallback
+        def rolledBack(_):
+            self.assertEqual(self._count(), 1)
+            return self.store.checkAssertion(self.assertion)
+
+        return d
+
+
+    def test_unbindableValue(self):
+        """
+        An assertion SQLite can't store only fails its own operation.
+        """
+        unbindable = token.Assertion(self.assertion.clientCredentials,
+                                     TYPE, object())
+        self.store.addAssertion(self.assertion)
+        bad = self.store.addAssertion(unbindable)
+        self.assertFailure(bad, sqlite.sqlite3.InterfaceError)
+        checked = self.store.checkAssertion(self.assertion)
+        return defer.gatherResults([bad, checked])
+
+
+    def test_bytes(self):
+        """
+        Values which aren't ASCII are stored and returned as byte strings.
+        """
+        value = "caf\xc3\xa9"
+        c = self.assertion.clientCredentials
+        d = self.store.addAssertion(token.Assertion(c, TYPE, value))
+        checked = self.store.checkAssertion(self.assertion)
+        self.assertFailure(checked, token.AssertionNotFound)
+
+        @d.addCallback
+        def getAssertions(_):
+            return self.store.getAssertions()
+
+        @d.addCallback
+        def check(assertions):
+            [assertion] = assertions
+            self.assertEqual(assertion.assertion, value)
+            self.assertEqual(type(assertion.assertion), str)
+            self.assertEqual(type(assertion.clientIdentifier), str)
+            return checked
+
+        return d
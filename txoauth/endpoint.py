@@ -0,0 +1,422 @@
+"""
+A token endpoint.
+"""
+import math
+from collections import deque
+
+try:
+    import json
+except ImportError:
+    import simplejson as json
+
+from txoauth import clientcred, token
+from txoauth.interfaces import IClient, IAccessToken
+from txoauth.request import MAX_BODY_SIZE, RequestTooLarge, parseRequest
+from txoauth.request import _TOO_LARGE
+
+from twisted.cred.credentials import UsernamePassword
+from twisted.cred.error import UnauthorizedLogin, UnhandledCredentials
+from twisted.internet import defer
+from twisted.python import log
+from twisted.web.resource import Resource
+from twisted.web.server import NOT_DONE_YET, Request
+
+
+class _TokenEndpointError(Exception):
+    """
+    An error to be reported to the client, as described in the OAuth
+    specification.
+    """
+    def __init__(self, error, code=400):
+        Exception.__init__(self, error)
+        self.error = error
+        self.code = code
+
+
+
+def _getArgument(request, name):
+    """
+    Gets the value of a request argument, or C{None} if it is missing.
+    """
+    return parseRequest(request).args.get(name)
+
+
+def _getRequiredArgument(request, name):
+    value = _getArgument(request, name)
+    if value is None:
+        raise _TokenEndpointError("invalid_request")
+    return value
+
+
+def _withRedirectURI(credentials, redirectURI):
+    """
+    Returns a copy of some client credentials with a different redirect URI.
+    """
+    if clientcred.IClientIdentifierSecret.providedBy(credentials):
+        return clientcred.ClientIdentifierSecret(credentials.identifier,
+                                                 credentials.secret,
+                                                 redirectURI)
+    return clientcred.ClientIdentifier(credentials.identifier, redirectURI)
+
+
+def _parseAuthorizationCode(request, credentials):
+    redirectURI = _getArgument(request, "redirect_uri")
+    if redirectURI is not None:
+        credentials = _withRedirectURI(credentials, redirectURI)
+    code = _getRequiredArgument(request, "code")
+    return token.AuthorizationCode(credentials, code)
+
+
+def _parseEndUserCredentials(request, credentials):
+    username = _getRequiredArgument(request, "username")
+    password = _getRequiredArgument(request, "password")
+    endUser = UsernamePassword(username, password)
+    return token.EndUserCredentials(credentials, endUser)
+
+
+def _parseRefreshToken(request, credentials):
+    refreshToken = _getRequiredArgument(request, "refresh_token")
+    return token.RefreshToken(credentials, refreshToken)
+
+
+def _parseAssertion(request, credentials):
+    assertionType = _getRequiredArgument(request, "assertion_type")
+    assertion = _getRequiredArgument(request, "assertion")
+    return token.Assertion(credentials, assertionType, assertion)
+
+
+_grantParsers = {
+    "authorization_code": _parseAuthorizationCode,
+    "password": _parseEndUserCredentials,
+    "refresh_token": _parseRefreshToken,
+    "assertion": _parseAssertion,
+}
+
+
+class LimitedRequest(Request):
+    """
+    A request which stops buffering its body once it's larger than
+    C{maxBodySize}.
+
+    A body which is announced as too large is not buffered at all, and one
+    which turns out to be too large is thrown away, so a client can't make
+    the server hold on to more than C{maxBodySize} bytes. Parsing such a
+    request raises L{RequestTooLarge}. Use this as the C{requestFactory} of
+    the L{twisted.web.server.Site} serving the token endpoint.
+
+    @cvar maxBodySize: The maximum size of the request body, in bytes, or
+    C{None} for no limit.
+    """
+    maxBodySize = MAX_BODY_SIZE
+
+    def _tooLarge(self):
+        setattr(self, _TOO_LARGE, True)
+        self.content.seek(0)
+        self.content.truncate()
+
+
+    def gotLength(self, length):
+        Request.gotLength(self, length)
+        if (length is not None and self.maxBodySize is not None
+            and length > self.maxBodySize):
+            self._tooLarge()
+
+
+    def handleContentChunk(self, data):
+        if getattr(self, _TOO_LARGE, False):
+            return
+        Request.handleContentChunk(self, data)
+        if (self.maxBodySize is not None
+            and self.content.tell() > self.maxBodySize):
+            self._tooLarge()
+
+
+
+class TokenEndpoint(Resource):
+    """
+    A token endpoint.
+
+    Requests are handled in three steps:
+
+        1. The client is authenticated with the client portal, which
+           produces an L{IClient}.
+        2. The access grant is parsed into an L{token.IAuthorizationCode},
+           L{token.IEndUserCredentials}, L{token.IRefreshToken} or
+           L{token.IAssertion}.
+        3. The grant is passed to the token portal, with the client as the
+           mind. Its realm produces an L{IAccessToken}, which is returned to
+           the client.
+
+    Only a limited number of requests are processed at the same time. Excess
+    requests wait in a bounded queue; requests which can't be queued, or
+    which have been waiting for too long, are rejected with a 503 response.
+    That way, a slow checker or store can't cause an unbounded number of
+    pending requests to pile up.
+
+    If there is a rate limiter, requests from clients over their limit are
+    rejected with a 429 response before they are queued, so they never
+    reach a checker or a store.
+    """
+    isLeaf = True
+
+    def __init__(self, clientPortal, tokenPortal, maxConcurrent=100,
+                 maxQueued=1000, queueTimeout=5.0, maxBodySize=MAX_BODY_SIZE,
+                 metrics=None, rateLimiter=None, clock=None):
+        """
+        Initializes a token endpoint.
+
+        @param clientPortal: The portal used to authenticate clients.
+        @type clientPortal: L{twisted.cred.portal.Portal}
+        @param tokenPortal: The portal used to exchange access grants for
+        access tokens.
+        @type tokenPortal: L{twisted.cred.portal.Portal}
+        @param maxConcurrent: The maximum number of requests being processed
+        at the same time.
+        @type maxConcurrent: C{int}
+        @param maxQueued: The maximum number of requests waiting to be
+        processed.
+        @type maxQueued: C{int}
+        @param queueTimeout: The maximum time a request waits to be
+        processed, in seconds.
+        @type queueTimeout: C{float}
+        @param maxBodySize: The maximum size of request bodies, in bytes.
+        Larger requests are rejected with a 413 response, but only after
+        Twisted has buffered them; serve the endpoint with
+        L{LimitedRequest} to stop buffering early.
+        @type maxBodySize: C{int}
+        @param metrics: If not C{None}, the latencies of handling requests
+        (the C{endpoint.handle} operation) and of extracting client
+        credentials (C{endpoint.extractClientCredentials}) are recorded
+        here, as are queued, rejected and rate limited requests.
+        @type metrics: L{txoauth.metrics.Metrics}
+        @param rateLimiter: If not C{None}, decides which clients may make
+        another request, by the client identifier in the request.
+        @type rateLimiter: L{txoauth.interfaces.IRateLimiter}
+        @param clock: The clock used for queue timeouts. Defaults to the
+        global reactor.
+        @type clock: L{twisted.internet.interfaces.IReactorTime}
+        """
+        Resource.__init__(self)
+
+        if clock is None:
+            from twisted.internet import reactor as clock
+
+        self._clientPortal = clientPortal
+        self._tokenPortal = tokenPortal
+        self._clock = clock
+        self._metrics = metrics
+        self._maxBodySize = maxBodySize
+        self._rateLimiter = rateLimiter
+
+        self.maxConcurrent = maxConcurrent
+        self.maxQueued = maxQueued
+        self.queueTimeout = queueTimeout
+
+        self.inFlight = 0
+        self._queue = deque()
+
+
+    def render_POST(self, request):
+        if self._rateLimited(request):
+            return NOT_DONE_YET
+
+        if self.inFlight < self.maxConcurrent:
+            self._process(request)
+        elif len(self._queue) < self.maxQueued:
+            self._enqueue(request)
+        else:
+            self._reject(request)
+        return NOT_DONE_YET
+
+
+    def _timed(self, operation, f, *args):
+        """
+        Calls a function, recording it as an operation if there are metrics.
+        """
+        if self._metrics is None:
+            return f(*args)
+        return self._metrics.timed(operation, f, *args)
+
+
+    def _enqueue(self, request):
+        """
+        Puts a request in the queue until it can be processed, or until it
+        has waited for too long.
+        """
+        if self._metrics is not None:
+            self._metrics.increment("endpoint.queued")
+        entry = [request, None]
+
+        def timeout():
+            self._queue.remove(entry)
+            self._reject(request)
+
+        def disconnected(failure):
+            if entry[1].active():
+                entry[1].cancel()
+                self._queue.remove(entry)
+
+        entry[1] = self._clock.callLater(self.queueTimeout, timeout)
+        self._queue.append(entry)
+        request.notifyFinish().addErrback(disconnected)
+
+
+    def _rateLimited(self, request):
+        """
+        Checks whether the client making a request is over its limit, and if
+        so, rejects the request.
+
+        Requests which can't be parsed, or which don't identify a client,
+        aren't limited: they fail later, without touching a checker.
+        """
+        if self._rateLimiter is None:
+            return False
+
+        try:
+            identifier = parseRequest(request, self._maxBodySize).identifier
+        except RequestTooLarge:
+            return False
+        if identifier is None:
+            return False
+
+        wait = self._rateLimiter.consume(identifier)
+        if not wait:
+            return False
+
+        if self._metrics is not None:
+            self._metrics.increment("endpoint.rateLimited")
+        request.setHeader("Retry-After", "%d" % (math.ceil(wait),))
+        self._respond(request, 429, {"error": "temporarily_unavailable"})
+        return True
+
+
+    def _reject(self, request):
+        if self._metrics is not None:
+            self._metrics.increment("endpoint.rejected")
+        request.setHeader("Retry-After", "%d" % (self.queueTimeout,))
+        self._respond(request, 503, {"error": "temporarily_unavailable"})
+
+
+    def _process(self, request):
+        """
+        Processes a request, and the next queued request when done.
+        """
+        self.inFlight += 1
+        finished = []
+        request.notifyFinish().addBoth(finished.append)
+
+        d = defer.maybeDeferred(self._timed, "endpoint.handle",
+                                self._handle, request)
+
+        @d.addCallback
+        def respond(accessToken):
+            response = {"access_token": accessToken.accessToken}
+            if accessToken.expiresIn is not None:
+                response["expires_in"] = accessToken.expiresIn
+            if accessToken.refreshToken is not None:
+                response["refresh_token"] = accessToken.refreshToken
+            return 200, response
+
+        @d.addErrback
+        def error(failure):
+            if failure.check(_TokenEndpointError):
+                e = failure.value
+                return e.code, {"error": e.error}
+            log.err(failure, "Unhandled error in token endpoint")
+            return 500, {"error": "server_error"}
+
+        @d.addCallback
+        def finish(result):
+            code, response = result
+            if not finished:
+                self._respond(request, code, response)
+
+        @d.addBoth
+        def next(result):
+            self.inFlight -= 1
+            if self._queue and self.inFlight < self.maxConcurrent:
+                queuedRequest, call = self._queue.popleft()
+                call.cancel()
+                self._process(queuedRequest)
+            return result
+
+
+    def _respond(self, request, code, response):
+        request.setResponseCode(code)
+        request.setHeader("Content-Type", "application/json")
+        request.setHeader("Cache-Control", "no-store")
+        request.write(json.dumps(response))
+        request.finish()
+
+
+    def _handle(self, request):
+        """
+        Runs the token endpoint pipeline for a request.
+
+        @return: A C{Deferred} firing with an L{IAccessToken}.
+        """
+        credentials = self._timed("endpoint.extractClientCredentials",
+                                  self._extractClientCredentials, request)
+
+        d = self._clientPortal.login(credentials, None, IClient)
+
+        @d.addErrback
+        def clientFailed(failure):
+            failure.trap(UnauthorizedLogin)
+            raise _TokenEndpointError("invalid_client", 401)
+
+        @d.addCallback
+        def clientAuthenticated(avatar):
+            interface, client, logout = avatar
+            grant = self._parseGrant(request, credentials)
+            d = self._tokenPortal.login(grant, client, IAccessToken)
+            d.addBoth(_logout, logout)
+            return d
+
+        @d.addErrback
+        def grantFailed(failure):
+            if failure.check(UnhandledCredentials):
+                raise _TokenEndpointError("unsupported_grant_type")
+            failure.trap(UnauthorizedLogin,
+                         token.AssertionNotFound,
+                         token.EnforcedInvalidationException)
+            raise _TokenEndpointError("invalid_grant")
+
+        @d.addCallback
+        def grantAccepted(avatar):
+            interface, accessToken, logout = avatar
+            logout()
+            return accessToken
+
+        return d
+
+
+    def _extractClientCredentials(self, request):
+        """
+        Extracts client credentials from a request, parsing it (once) with
+        this endpoint's body size limit.
+        """
+        try:
+            parseRequest(request, self._maxBodySize)
+            return clientcred._extractClientCredentials(request)
+        except RequestTooLarge:
+            raise _TokenEndpointError("invalid_request", 413)
+        except TypeError:
+            raise _TokenEndpointError("invalid_client", 401)
+
+
+    def _parseGrant(self, request, credentials):
+        """
+        Parses the access grant in a request.
+        """
+        grantType = _getRequiredArgument(request, "grant_type")
+        parser = _grantParsers.get(grantType)
+        if parser is None:
+            raise _TokenEndpointError("unsupported_grant_type")
+        return parser(request, credentials)
+
+
+
+def _logout(result, logout):
+    logout()
+    return result
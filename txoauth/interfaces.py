@@ -45,6 +45,27 @@ class IRedirectURIFactory(Interface):
 
 
 
+class IBatchRedirectURIFactory(IRedirectURIFactory):
+    """
+    A redirect URI factory which can look up many clients at once.
+
+    Factories backed by a remote store should implement this, so that many
+    lookups can share a single round trip.
+    """
+    def getRedirectURIs(clientIdentifiers):
+        """
+        Gets the redirect URIs for a number of clients.
+
+        @param clientIdentifiers: The identifiers of the clients.
+        @type clientIdentifiers: iterable of C{str}
+
+        @return: A C{Deferred} that will fire with a C{dict} mapping every
+        given client identifier to its redirect URI (C{str}) or C{None}, if no
+        URI has been registered.
+        """
+
+
+
 class IRequest(Interface):
     """
     An OAuth request.
@@ -68,6 +89,10 @@ class IAssertionStore(Interface):
     Assertions can be exchanged at a token endpoint for an access token. They
     are predominantly intended for interfacing OAuth with existing auth
     systems.
+
+    Assertions are identified by their client identifier, type and value:
+    the redirect URI and secret of the client credentials they are added or
+    checked with are ignored.
     """
     def addAssertion(assertion):
         """
@@ -87,3 +112,355 @@ class IAssertionStore(Interface):
         @param invalidate: If true, the assertion will be invalidated.
         @type invalidate: C{bool}
         """
+
+
+
+class IEnumerableAssertionStore(IAssertionStore):
+    """
+    An assertion store which can list the assertions it holds.
+    """
+    def getAssertions():
+        """
+        Gets all live assertions in this store.
+
+        @return: A C{Deferred} firing with an iterable of
+        L{txoauth.token.IAssertion} providers.
+        """
+
+
+
+class IExpiringAssertionStore(IEnumerableAssertionStore):
+    """
+    An enumerable assertion store whose assertions expire.
+    """
+    def addAssertion(assertion, ttl=None):
+        """
+        Adds an assertion to this assertion store.
+
+        @param assertion: The assertion to be added to the store.
+        @type assertion: L{txoauth.token.IAssertion}
+        @param ttl: The time to live for this assertion, in seconds. If
+        C{None}, the store's default is used.
+        @type ttl: C{float} or C{None}
+        """
+
+
+    def getAssertionDeadlines():
+        """
+        Gets all live assertions in this store, along with the times at
+        which they expire.
+
+        @return: A C{Deferred} firing with an iterable of pairs of an
+        L{txoauth.token.IAssertion} provider and its deadline, in seconds
+        according to the clock of the store.
+        """
+
+
+
+class IBulkAssertionStore(IAssertionStore):
+    """
+    An assertion store which can add many assertions at once.
+    """
+    def addAssertions(assertions):
+        """
+        Adds assertions to this assertion store.
+
+        @param assertions: The assertions to be added to the store.
+        @type assertions: iterable of L{txoauth.token.IAssertion}
+        @return: A C{Deferred} which fires when all assertions have been
+        added.
+        """
+
+
+
+class IBatchAssertionStore(IAssertionStore):
+    """
+    An assertion store which can check many assertions at once.
+    """
+    def checkAssertions(assertions):
+        """
+        Checks and invalidates assertions in this assertion store.
+
+        The assertions are checked in order, so if the same assertion
+        appears twice, only the first check succeeds.
+
+        @param assertions: The assertions to be checked.
+        @type assertions: sequence of L{txoauth.token.IAssertion}
+        @return: A C{Deferred} firing with a list holding, for every
+        assertion, C{None} if it was found, or a
+        L{twisted.python.failure.Failure} if it wasn't.
+        """
+
+
+
+class IClientIndexedAssertionStore(IAssertionStore):
+    """
+    An assertion store which indexes assertions by client identifier.
+    """
+    def revokeClient(clientIdentifier):
+        """
+        Removes every assertion of a client, in time proportional to the
+        number of assertions of that client.
+
+        @param clientIdentifier: The identifier of the client.
+        @type clientIdentifier: C{str}
+        @return: A C{Deferred} which fires when the assertions have been
+        removed.
+        """
+
+
+    def countAssertions(clientIdentifier):
+        """
+        Counts the live assertions of a client.
+
+        @param clientIdentifier: The identifier of the client.
+        @type clientIdentifier: C{str}
+        @return: A C{Deferred} firing with the number of assertions.
+        """
+
+
+
+class IAccessToken(Interface):
+    """
+    An access token, as produced by the realm of a token portal.
+    """
+    accessToken = Attribute(
+        """
+        The access token.
+
+        @type: C{str}
+        """)
+
+    expiresIn = Attribute(
+        """
+        The lifetime of the access token in seconds, or C{None} if it does
+        not expire (or if its lifetime should not be disclosed).
+
+        @type: C{int} or C{None}
+        """)
+
+    refreshToken = Attribute(
+        """
+        A refresh token which can be used to obtain new access tokens, or
+        C{None}.
+
+        @type: C{str} or C{None}
+        """)
+
+
+
+class IAccessTokenStore(Interface):
+    """
+    A place to issue, check and expire access tokens.
+    """
+    def issueAccessToken(clientIdentifier, expiresIn=None):
+        """
+        Issues a new access token to a client.
+
+        @param clientIdentifier: The identifier of the client.
+        @type clientIdentifier: C{str}
+        @param expiresIn: The lifetime of the access token in seconds. If
+        C{None}, the store's default is used.
+        @type expiresIn: C{int} or C{None}
+        @return: A C{Deferred} firing with an L{IAccessToken}.
+        """
+
+
+    def checkAccessToken(accessToken):
+        """
+        Checks an access token.
+
+        @param accessToken: The access token to check.
+        @type accessToken: C{str}
+        @return: A C{Deferred} firing with the identifier of the client the
+        token was issued to, or failing with
+        L{txoauth.token.AccessTokenNotFound} if the token is unknown, has
+        expired or has been revoked.
+        """
+
+
+    def revokeAccessToken(accessToken):
+        """
+        Revokes an access token before it expires.
+
+        Revoking an unknown access token is not an error.
+
+        @param accessToken: The access token to revoke.
+        @type accessToken: C{str}
+        @return: A C{Deferred} which fires when the token has been revoked.
+        """
+
+
+
+class IAuthorizationCodeStore(Interface):
+    """
+    A place to issue and redeem authorization codes.
+    """
+    def issueAuthorizationCode(clientIdentifier, avatarId, redirectURI=None):
+        """
+        Issues a new authorization code to a client.
+
+        @param clientIdentifier: The identifier of the client.
+        @type clientIdentifier: C{str}
+        @param avatarId: What the code stands for, for example the end user
+        who authorized the client. This is what redeeming the code produces.
+        @param redirectURI: The redirect URI the authorization request was
+        made with, if any. If given, the code can only be redeemed with the
+        same redirect URI.
+        @type redirectURI: C{str} or C{None}
+        @return: A C{Deferred} firing with the authorization code, a
+        C{str}.
+        """
+
+
+    def redeemAuthorizationCode(authorizationCode):
+        """
+        Redeems an authorization code.
+
+        Redeeming is atomic, and a code can only be presented once: the code
+        is used up even if it was presented by the wrong client or with the
+        wrong redirect URI.
+
+        @param authorizationCode: The authorization code, with the
+        credentials of the client presenting it.
+        @type authorizationCode: L{txoauth.token.IAuthorizationCode}
+        @return: A C{Deferred} firing with the avatar ID the code was issued
+        for, or failing with L{txoauth.token.AuthorizationCodeNotFound} if
+        the code is unknown, has expired, has been redeemed before, or was
+        issued to a different client or redirect URI.
+        """
+
+
+
+class IBatchAuthorizationCodeStore(IAuthorizationCodeStore):
+    """
+    An authorization code store which can redeem many codes at once.
+    """
+    def redeemAuthorizationCodes(authorizationCodes):
+        """
+        Redeems authorization codes, in order.
+
+        @param authorizationCodes: The authorization codes, with the
+        credentials of the clients presenting them.
+        @type authorizationCodes: sequence of
+        L{txoauth.token.IAuthorizationCode}
+        @return: A C{Deferred} firing with a list holding, for every code,
+        the avatar ID it was issued for, or a
+        L{twisted.python.failure.Failure} if it couldn't be redeemed.
+        """
+
+
+
+class IRefreshTokenStore(Interface):
+    """
+    A place to issue, rotate and revoke refresh tokens.
+
+    Every refresh token belongs to a family: the tokens which were issued by
+    rotating the first token of the family, one after the other. Only the
+    newest token of a family can be used. Presenting an older one means the
+    family has leaked, so the whole family is revoked.
+    """
+    def issueRefreshToken(clientIdentifier, avatarId):
+        """
+        Issues the first refresh token of a new family.
+
+        @param clientIdentifier: The identifier of the client.
+        @type clientIdentifier: C{str}
+        @param avatarId: What the family stands for, for example the end user
+        who authorized the client. This is what rotating its tokens
+        produces.
+        @return: A C{Deferred} firing with the refresh token, a C{str}.
+        """
+
+
+    def rotateRefreshToken(refreshToken):
+        """
+        Exchanges a refresh token for the next token of its family.
+
+        @param refreshToken: The refresh token, with the credentials of the
+        client presenting it.
+        @type refreshToken: L{txoauth.token.IRefreshToken}
+        @return: A C{Deferred} firing with a
+        L{txoauth.token.RefreshTokenRotation}, or failing with
+        L{txoauth.token.RefreshTokenNotFound} if the token is unknown, has
+        expired or been revoked, or was issued to a different client, or if
+        it has been rotated before, in which case its family is revoked.
+        """
+
+
+    def revokeRefreshToken(refreshToken):
+        """
+        Revokes the family of a refresh token.
+
+        Revoking an unknown refresh token is not an error.
+
+        @param refreshToken: Any refresh token of the family.
+        @type refreshToken: C{str}
+        @return: A C{Deferred} which fires when the family has been revoked.
+        """
+
+
+    def revokeClient(clientIdentifier):
+        """
+        Revokes every refresh token issued to a client.
+
+        @param clientIdentifier: The identifier of the client.
+        @type clientIdentifier: C{str}
+        @return: A C{Deferred} which fires when the tokens have been revoked.
+        """
+
+
+
+class IBatchRefreshTokenStore(IRefreshTokenStore):
+    """
+    A refresh token store which can rotate many refresh tokens at once.
+    """
+    def rotateRefreshTokens(refreshTokens):
+        """
+        Rotates refresh tokens, in order.
+
+        @param refreshTokens: The refresh tokens, with the credentials of
+        the clients presenting them.
+        @type refreshTokens: sequence of L{txoauth.token.IRefreshToken}
+        @return: A C{Deferred} firing with a list holding, for every token,
+        a L{txoauth.token.RefreshTokenRotation}, or a
+        L{twisted.python.failure.Failure} if it couldn't be rotated.
+        """
+
+
+
+class IClientSecretStore(Interface):
+    """
+    A place to look up the hashed secrets of clients.
+    """
+    def getSecretHash(clientIdentifier):
+        """
+        Gets the hashed secret of a client.
+
+        @param clientIdentifier: The identifier of the client.
+        @type clientIdentifier: C{str}
+        @return: A C{Deferred} firing with the hashed secret, as produced by
+        L{txoauth.contrib.checkers.hashSecret}, or C{None} if the client is
+        unknown.
+        """
+
+
+
+class IRateLimiter(Interface):
+    """
+    Something which decides whether a client may make another request.
+    """
+    def consume(clientIdentifier):
+        """
+        Counts a request by a client, if it is allowed.
+
+        This is called for every request, before the client is
+        authenticated, so it returns right away instead of returning a
+        C{Deferred}.
+
+        @param clientIdentifier: The identifier the client claims.
+        @type clientIdentifier: C{str}
+        @return: C{0} if the request is allowed, otherwise the time until the
+        client may make another request, in seconds.
+        @rtype: C{float}
+        """
@@ -0,0 +1,292 @@
+"""
+Counts, errors and latencies of txOAuth operations.
+
+Wrap the objects you pass to txOAuth in the instrumented wrappers below (or
+pass a L{Metrics} to the L{txoauth.endpoint.TokenEndpoint}), and serve the
+numbers with a L{MetricsResource}.
+"""
+from bisect import bisect_left
+
+from txoauth.interfaces import IRedirectURIFactory, IAssertionStore
+
+from twisted.cred.portal import IRealm
+from twisted.internet import defer
+from twisted.python.failure import Failure
+from twisted.web.resource import Resource
+
+from zope.interface import implements
+
+
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1,
+                   0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Histogram(object):
+    """
+    A histogram of latencies, with fixed buckets.
+
+    @ivar counts: The number of observations in each bucket, followed by the
+    number of observations larger than the largest bucket.
+    @ivar sum: The sum of all observations.
+    @ivar count: The number of observations.
+    """
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        """
+        Initializes a histogram.
+
+        @param buckets: The upper bounds of the buckets, in ascending order.
+        @type buckets: sequence of C{float}
+        """
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+    def cumulativeCounts(self):
+        """
+        Gets the number of observations less than or equal to each bucket's
+        upper bound, followed by the total number of observations.
+        """
+        total, result = 0, []
+        for count in self.counts:
+            total += count
+            result.append(total)
+        return result
+
+
+
+class Metrics(object):
+    """
+    A collection of metrics about txOAuth operations.
+
+    For every operation, the number of calls, the number of failed calls and
+    a latency histogram are kept. There are also plain counters for events.
+
+    Recording a call costs two clock reads and a few dictionary lookups, so
+    this can be left on in production.
+    """
+    def __init__(self, buckets=DEFAULT_BUCKETS, clock=None):
+        """
+        Initializes a collection of metrics.
+
+        @param buckets: The upper bounds of the latency buckets, in seconds.
+        @type buckets: sequence of C{float}
+        @param clock: The clock used to measure latencies. Defaults to the
+        global reactor.
+        @type clock: L{twisted.internet.interfaces.IReactorTime}
+        """
+        if clock is None:
+            from twisted.internet import reactor as clock
+
+        self._buckets = tuple(buckets)
+        self._clock = clock
+        self.calls = {}
+        self.errors = {}
+        self.latencies = {}
+        self.events = {}
+
+
+    def record(self, operation, latency, failed=False):
+        """
+        Records a call to an operation.
+
+        @param operation: The name of the operation.
+        @type operation: C{str}
+        @param latency: The time the call took, in seconds.
+        @type latency: C{float}
+        @param failed: Whether the call failed.
+        @type failed: C{bool}
+        """
+        self.calls[operation] = self.calls.get(operation, 0) + 1
+        if failed:
+            self.errors[operation] = self.errors.get(operation, 0) + 1
+        histogram = self.latencies.get(operation)
+        if histogram is None:
+            histogram = self.latencies[operation] = Histogram(self._buckets)
+        histogram.observe(latency)
+
+
+    def increment(self, event, amount=1):
+        """
+        Counts an event.
+        """
+        self.events[event] = self.events.get(event, 0) + amount
+
+
+    def timed(self, operation, f, *args, **kwargs):
+        """
+        Calls a function, and records the call as an operation.
+
+        If the function returns a C{Deferred}, the call is recorded when it
+        fires. The call has failed if the function raises an exception or
+        the C{Deferred} fails.
+
+        @return: Whatever the function returns.
+        """
+        clock = self._clock
+        start = clock.seconds()
+        try:
+            result = f(*args, **kwargs)
+        except:
+            self.record(operation, clock.seconds() - start, True)
+            raise
+
+        if isinstance(result, defer.Deferred):
+            def done(result):
+                failed = isinstance(result, Failure)
+                self.record(operation, clock.seconds() - start, failed)
+                return result
+            return result.addBoth(done)
+
+        self.record(operation, clock.seconds() - start)
+        return result
+
+
+    def render(self):
+        """
+        Renders these metrics in the Prometheus text exposition format.
+
+        @rtype: C{str}
+        """
+        lines = []
+
+        def family(name, kind, description):
+            lines.append("# HELP %s %s" % (name, description))
+            lines.append("# TYPE %s %s" % (name, kind))
+
+        family("txoauth_calls_total", "counter", "Calls to an operation.")
+        for operation, count in sorted(self.calls.iteritems()):
+            lines.append('txoauth_calls_total{operation="%s"} %d'
+                         % (_escape(operation), count))
+
+        family("txoauth_errors_total", "counter",
+               "Calls to an operation which failed.")
+        for operation in sorted(self.calls):
+            lines.append('txoauth_errors_total{operation="%s"} %d'
+                         % (_escape(operation), self.errors.get(operation, 0)))
+
+        family("txoauth_latency_seconds", "histogram",
+               "Latency of calls to an operation.")
+        for operation, histogram in sorted(self.latencies.iteritems()):
+            label = 'operation="%s"' % (_escape(operation),)
+            bounds = ["%r" % (bound,) for bound in histogram.buckets]
+            bounds.append("+Inf")
+            for bound, count in zip(bounds, histogram.cumulativeCounts()):
+                lines.append('txoauth_latency_seconds_bucket{%s,le="%s"} %d'
+                             % (label, bound, count))
+            lines.append("txoauth_latency_seconds_sum{%s} %r"
+                         % (label, histogram.sum))
+            lines.append("txoauth_latency_seconds_count{%s} %d"
+                         % (label, histogram.count))
+
+        family("txoauth_events_total", "counter", "Occurrences of an event.")
+        for event, count in sorted(self.events.iteritems()):
+            lines.append('txoauth_events_total{event="%s"} %d'
+                         % (_escape(event), count))
+
+        return "\n".join(lines) + "\n"
+
+
+
+def _escape(value):
+    """
+    Escapes a Prometheus label value.
+    """
+    return (value.replace("\\", "\\\\")
+                 .replace("\n", "\\n")
+                 .replace('"', '\\"'))
+
+
+
+class MetricsResource(Resource):
+    """
+    A resource which serves metrics in the Prometheus text format.
+    """
+    isLeaf = True
+
+    def __init__(self, metrics):
+        """
+        Initializes a metrics resource.
+
+        @type metrics: L{Metrics}
+        """
+        Resource.__init__(self)
+        self._metrics = metrics
+
+
+    def render_GET(self, request):
+        request.setHeader("Content-Type", "text/plain; version=0.0.4")
+        return self._metrics.render()
+
+
+
+class InstrumentedRealm(object):
+    """
+    A realm which records calls to another realm's C{requestAvatar}, as the
+    C{realm.requestAvatar} operation.
+    """
+    implements(IRealm)
+
+    def __init__(self, realm, metrics):
+        self._realm = realm
+        self._metrics = metrics
+
+
+    def requestAvatar(self, avatarId, mind, *interfaces):
+        return self._metrics.timed("realm.requestAvatar",
+                                   self._realm.requestAvatar,
+                                   avatarId, mind, *interfaces)
+
+
+
+class InstrumentedRedirectURIFactory(object):
+    """
+    A redirect URI factory which records calls to another one, as the
+    C{redirectURIFactory.getRedirectURI} operation.
+    """
+    implements(IRedirectURIFactory)
+
+    def __init__(self, factory, metrics):
+        self._factory = factory
+        self._metrics = metrics
+
+
+    def getRedirectURI(self, clientIdentifier):
+        return self._metrics.timed("redirectURIFactory.getRedirectURI",
+                                   self._factory.getRedirectURI,
+                                   clientIdentifier)
+
+
+
+class InstrumentedAssertionStore(object):
+    """
+    An assertion store which records calls to another one, as the
+    C{assertionStore.addAssertion} and C{assertionStore.checkAssertion}
+    operations.
+
+    Checks for missing assertions count as failed calls.
+    """
+    implements(IAssertionStore)
+
+    def __init__(self, store, metrics):
+        self._store = store
+        self._metrics = metrics
+
+
+    def addAssertion(self, assertion, *args, **kwargs):
+        return self._metrics.timed("assertionStore.addAssertion",
+                                   self._store.addAssertion,
+                                   assertion, *args, **kwargs)
+
+
+    def checkAssertion(self, assertion, invalidate=True):
+        return self._metrics.timed("assertionStore.checkAssertion",
+                                   self._store.checkAssertion,
+                                   assertion, invalidate)
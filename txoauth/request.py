@@ -0,0 +1,98 @@
+"""
+Parsing of OAuth requests.
+
+Several parts of txOAuth look at the same request: the client credentials
+adapters, and the token endpoint. The request is parsed once, and the result
+is kept on the request for all of them.
+"""
+MAX_BODY_SIZE = 64 * 1024
+
+_PARSED = "_txoauthParsedRequest"
+_TOO_LARGE = "_txoauthBodyTooLarge"
+
+
+class RequestTooLarge(TypeError):
+    """
+    Raised when the body of a request is larger than allowed.
+
+    This is a C{TypeError}, so adapting such a request to client credentials
+    fails like adapting any other unusable request does.
+    """
+
+
+
+class ParsedRequest(object):
+    """
+    The OAuth parts of a request.
+
+    @ivar identifier: The client identifier, from the Basic authentication
+    credentials or the C{client_id} argument, or C{None}.
+    @ivar secret: The client secret, from the Basic authentication
+    credentials or the C{client_secret} argument, or C{None}.
+    @ivar args: The request arguments. Unlike C{request.args}, this maps
+    every name to a single (the first) value.
+    """
+    __slots__ = ("identifier", "secret", "args")
+
+    def __init__(self, identifier, secret, args):
+        self.identifier = identifier
+        self.secret = secret
+        self.args = args
+
+
+
+def _bodySize(request):
+    """
+    Gets the size of the body of a request, or C{None} if it's unknown.
+    """
+    content = getattr(request, "content", None)
+    if content is None:
+        return None
+    position = content.tell()
+    content.seek(0, 2)
+    size = content.tell()
+    content.seek(position)
+    return size
+
+
+def parseRequest(request, maxBodySize=MAX_BODY_SIZE):
+    """
+    Parses a request, or returns the result of parsing it earlier.
+
+    Twisted buffers the whole body before the request is parsed, so
+    C{maxBodySize} only rejects bodies which are too large; it doesn't bound
+    the memory they take. Serve requests with
+    L{txoauth.endpoint.LimitedRequest} for that.
+
+    @param request: The request.
+    @type request: L{twisted.web.iweb.IRequest}
+    @param maxBodySize: The maximum size of the request body, in bytes, or
+    C{None} for no limit. Only checked the first time a request is parsed.
+    @type maxBodySize: C{int} or C{None}
+    @rtype: L{ParsedRequest}
+    @raise RequestTooLarge: If the request body is too large, or if a
+    L{txoauth.endpoint.LimitedRequest} threw its body away.
+    """
+    parsed = getattr(request, _PARSED, None)
+    if parsed is not None:
+        return parsed
+
+    if getattr(request, _TOO_LARGE, False):
+        raise RequestTooLarge("request body is too large")
+    if maxBodySize is not None:
+        size = _bodySize(request)
+        if size is not None and size > maxBodySize:
+            raise RequestTooLarge("request body is larger than %d bytes"
+                                  % (maxBodySize,))
+
+    args = dict((name, values[0])
+                for name, values in request.args.iteritems() if values)
+    identifier = request.getUser() or args.get("client_id") or None
+    secret = request.getPassword() or args.get("client_secret") or None
+    parsed = ParsedRequest(identifier, secret, args)
+
+    try:
+        setattr(request, _PARSED, parsed)
+    except AttributeError:
+        pass
+    return parsed
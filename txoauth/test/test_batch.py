@@ -0,0 +1,77 @@
+"""
+Tests for batching calls per reactor iteration.
+"""
+from txoauth._batch import TickBatcher
+
+from twisted.internet import defer, task
+from twisted.python.failure import Failure
+from twisted.trial.unittest import TestCase
+
+
+class TickBatcherTestCase(TestCase):
+    def setUp(self):
+        self.clock = task.Clock()
+        self.batches = []
+        self.batcher = TickBatcher(self._dispatch, self.clock)
+
+
+    def _dispatch(self, items):
+        self.batches.append(items)
+        return [item * 2 for item in items]
+
+
+    def test_batched(self):
+        ds = [self.batcher.add(i) for i in [1, 2, 2]]
+        self.assertEqual(self.batches, [])
+
+        self.clock.advance(0)
+        self.assertEqual(self.batches, [[1, 2, 2]])
+        return defer.gatherResults(ds).addCallback(self.assertEqual,
+                                                   [2, 4, 4])
+
+
+    def test_separateTicks(self):
+        self.batcher.add(1)
+        self.clock.advance(0)
+        self.batcher.add(2)
+        self.clock.advance(0)
+        self.assertEqual(self.batches, [[1], [2]])
+
+
+    def test_flush(self):
+        d = self.batcher.add(1)
+        self.batcher.flush()
+        self.assertEqual(self.batches, [[1]])
+        self.assertEqual(self.clock.getDelayedCalls(), [])
+        return d.addCallback(self.assertEqual, 2)
+
+
+    def test_itemFailure(self):
+        def dispatch(items):
+            return [Failure(RuntimeError()), 1]
+        self.batcher._dispatch = dispatch
+
+        d1, d2 = self.batcher.add(1), self.batcher.add(2)
+        self.clock.advance(0)
+        self.assertFailure(d1, RuntimeError)
+        d2.addCallback(self.assertEqual, 1)
+        return defer.gatherResults([d1, d2])
+
+
+    def test_batchFailure(self):
+        def dispatch(items):
+            raise RuntimeError()
+        self.batcher._dispatch = dispatch
+
+        ds = [self.batcher.add(i) for i in [1, 2]]
+        self.clock.advance(0)
+        for d in ds:
+            self.assertFailure(d, RuntimeError)
+        return defer.gatherResults(ds)
+
+
+    def test_wrongNumberOfResults(self):
+        self.batcher._dispatch = lambda items: []
+        d = self.batcher.add(1)
+        self.clock.advance(0)
+        return self.assertFailure(d, ValueError)
@@ -0,0 +1,73 @@
+"""
+Tests for counting Bloom filters.
+"""
+from txoauth._bloom import CountingBloomFilter, _MAX_COUNT
+
+from twisted.trial.unittest import TestCase
+
+
+class CountingBloomFilterTestCase(TestCase):
+    def setUp(self):
+        self.filter = CountingBloomFilter(1000, 0.01)
+
+
+    def test_badArguments(self):
+        self.assertRaises(ValueError, CountingBloomFilter, 0)
+        self.assertRaises(ValueError, CountingBloomFilter, 10, 0)
+        self.assertRaises(ValueError, CountingBloomFilter, 10, 1)
+
+
+    def test_sizing(self):
+        self.assertEqual(self.filter.size, 9586)
+        self.assertEqual(self.filter.hashes, 7)
+
+
+    def test_add(self):
+        self.assertNotIn("a", self.filter)
+        self.filter.add("a")
+        self.assertIn("a", self.filter)
+
+
+    def test_remove(self):
+        self.filter.add("a")
+        self.filter.add("b")
+        self.filter.remove("a")
+        self.assertNotIn("a", self.filter)
+        self.assertIn("b", self.filter)
+
+
+    def test_addedTwice(self):
+        self.filter.add("a")
+        self.filter.add("a")
+        self.filter.remove("a")
+        self.assertIn("a", self.filter)
+        self.filter.remove("a")
+        self.assertNotIn("a", self.filter)
+
+
+    def test_saturation(self):
+        """
+        Saturated counters are never decremented, so keys sharing them are
+        never reported missing.
+        """
+        for _ in xrange(_MAX_COUNT + 1):
+            self.filter.add("a")
+        for _ in xrange(_MAX_COUNT + 1):
+            self.filter.remove("a")
+        self.assertIn("a", self.filter)
+
+
+    def test_falsePositiveRate(self):
+        for i in xrange(1000):
+            self.filter.add("key %d" % (i,))
+        for i in xrange(1000):
+            self.assertIn("key %d" % (i,), self.filter)
+        falsePositives = sum(1 for i in xrange(10000)
+                             if "other %d" % (i,) in self.filter)
+        self.assertTrue(falsePositives < 200, falsePositives)
+
+
+    def test_clear(self):
+        self.filter.add("a")
+        self.filter.clear()
+        self.assertNotIn("a", self.filter)
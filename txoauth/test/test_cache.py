@@ -0,0 +1,60 @@
+"""
+Tests for bounded caches.
+"""
+from txoauth._cache import LRUCache
+
+from twisted.trial.unittest import TestCase
+
+
+class LRUCacheTestCase(TestCase):
+    def setUp(self):
+        self.cache = LRUCache(2)
+
+
+    def test_badSize(self):
+        self.assertRaises(ValueError, LRUCache, 0)
+
+
+    def test_getSet(self):
+        self.cache.set("a", 1)
+        self.assertEqual(self.cache.get("a"), 1)
+        self.assertEqual(self.cache.get("b"), None)
+        self.assertEqual(self.cache.get("b", 2), 2)
+
+
+    def test_evictLeastRecentlyUsed(self):
+        self.cache.set("a", 1)
+        self.cache.set("b", 2)
+        self.cache.get("a")
+        self.cache.set("c", 3)
+        self.assertIn("a", self.cache)
+        self.assertNotIn("b", self.cache)
+        self.assertIn("c", self.cache)
+        self.assertEqual(len(self.cache), 2)
+
+
+    def test_update(self):
+        self.cache.set("a", 1)
+        self.cache.set("b", 2)
+        self.cache.set("a", 3)
+        self.cache.set("c", 4)
+        self.assertEqual(self.cache.get("a"), 3)
+        self.assertNotIn("b", self.cache)
+
+
+    def test_pop(self):
+        self.cache.set("a", 1)
+        self.assertEqual(self.cache.pop("a"), 1)
+        self.assertEqual(self.cache.pop("a", 2), 2)
+        self.assertEqual(len(self.cache), 0)
+        self.cache.set("b", 1)
+        self.cache.set("c", 2)
+        self.cache.set("d", 3)
+        self.assertEqual(len(self.cache), 2)
+
+
+    def test_clear(self):
+        self.cache.set("a", 1)
+        self.cache.clear()
+        self.assertEqual(len(self.cache), 0)
+        self.assertEqual(self.cache.get("a"), None)
@@ -1,6 +1,9 @@
 """
 Tests for txOAuth authentication servers.
 """
+import os, sys
+
+import txoauth
 from txoauth import clientcred
 from txoauth.clientcred import IClientIdentifier, IClientIdentifierSecret
 from txoauth.interfaces import IClient
@@ -8,6 +11,7 @@ from txoauth.contrib.simple import SimpleRedirectURIFactory
 
 from twisted.trial.unittest import TestCase
 from twisted.cred.portal import IRealm
+from twisted.internet import utils
 from twisted.web.iweb import IRequest
 
 from zope.interface import implements
@@ -110,6 +114,44 @@ class ClientRealmTestCase(TestCase):
                           r.requestAvatar, IDENTIFIER, None, object())
 
 
+    def _getClient(self, realm, identifier=IDENTIFIER):
+        avatars = []
+        realm.requestAvatar(identifier, None, IClient).addCallback(
+            avatars.append)
+        return avatars[0][1]
+
+
+    def test_noCache(self):
+        r = clientcred.ClientRealm(redirectURIFactory)
+        self.assertNotIdentical(self._getClient(r), self._getClient(r))
+
+
+    def test_cache(self):
+        r = clientcred.ClientRealm(redirectURIFactory, cacheSize=1)
+        c = self._getClient(r)
+        self.assertIdentical(c, self._getClient(r))
+        self.assertNotIdentical(c, self._getClient(r, BOGUS_IDENTIFIER))
+
+
+    def test_cacheEviction(self):
+        r = clientcred.ClientRealm(redirectURIFactory, cacheSize=1)
+        c = self._getClient(r)
+        self._getClient(r, BOGUS_IDENTIFIER)
+        self.assertNotIdentical(c, self._getClient(r))
+
+
+    def test_invalidate(self):
+        r = clientcred.ClientRealm(redirectURIFactory, cacheSize=1)
+        c = self._getClient(r)
+        r.invalidate(IDENTIFIER)
+        self.assertNotIdentical(c, self._getClient(r))
+
+
+    def test_invalidate_noCache(self):
+        r = clientcred.ClientRealm(redirectURIFactory)
+        r.invalidate(IDENTIFIER)
+
+
 
 class ClientIdentifierTestCase(TestCase):
     def setUp(self):
@@ -153,6 +195,26 @@ class ClientIdentifierTestCase(TestCase):
         self.assertRaises(AttributeError, mutate)
 
 
+    def test_equality(self):
+        other = self.credentials.__class__(*self._args())
+        self.assertEqual(self.credentials, other)
+        self.assertEqual(hash(self.credentials), hash(other))
+
+
+    def test_inequality(self):
+        args = (BOGUS_IDENTIFIER,) + self._args()[1:]
+        other = self.credentials.__class__(*args)
+        self.assertNotEqual(self.credentials, other)
+
+
+    def test_noDict(self):
+        self.assertFalse(hasattr(self.credentials, "__dict__"))
+
+
+    def _args(self):
+        return (IDENTIFIER,)
+
+
 
 class ClientIdentifierSecretTestCase(ClientIdentifierTestCase):
     def setUp(self):
@@ -160,6 +222,16 @@ class ClientIdentifierSecretTestCase(ClientIdentifierTestCase):
                                                              SECRET)
 
 
+    def _args(self):
+        return (IDENTIFIER, SECRET)
+
+
+    def test_inequality_withoutSecret(self):
+        other = clientcred.ClientIdentifier(IDENTIFIER)
+        self.assertNotEqual(self.credentials, other)
+        self.assertNotEqual(other, self.credentials)
+
+
     def test_interface_withSecret(self):
         self.assertTrue(IClientIdentifierSecret
                         .implementedBy(clientcred.ClientIdentifierSecret))
@@ -190,7 +262,7 @@ class MockRequest(object):
     implements(IRequest)
 
     def __init__(self, authorizationHeader=None, args=None):
-        self.args = args or {}
+        self.args = dict((k, [v]) for k, v in (args or {}).iteritems())
         if authorizationHeader is not None:
             self._identifier, self._secret = (authorizationHeader
                                               .decode("base64").split(":"))
@@ -343,5 +415,41 @@ class ClientIdentifierSecretAdaptationTestCase(_SpecificationTests, TestCase):
     factory = IClientIdentifierSecret
     interfaces = (IClientIdentifierSecret,)
 
+    def test_parsedOnce(self):
+        """
+        Adapting a request to both interfaces only parses it once.
+        """
+        request = MockRequest(args={"client_id": IDENTIFIER,
+                                    "client_secret": SECRET})
+        parsed = []
+        def getUser():
+            parsed.append(None)
+            return ""
+        request.getUser = getUser
+
+        IClientIdentifier(request)
+        IClientIdentifierSecret(request)
+        self.assertEqual(len(parsed), 1)
+
     def test_noSecretPresent(self):
         self._test_broken(simpleURLEncodedRequest)
+
+
+
+# trial changes directories before running tests, so find the top of the
+# source tree now.
+_TOP = os.path.dirname(os.path.dirname(os.path.abspath(txoauth.__file__)))
+
+
+class LazyImportTestCase(TestCase):
+    def test_noTwistedWeb(self):
+        """
+        Importing client credentials and token requests doesn't import
+        C{twisted.web}.
+        """
+        script = ("import sys, txoauth.clientcred, txoauth.token; "
+                  "sys.stdout.write(str('twisted.web' in sys.modules))")
+        d = utils.getProcessOutput(sys.executable, ["-c", script],
+                                   env=os.environ, path=_TOP)
+        d.addCallback(self.assertEqual, "False")
+        return d
@@ -0,0 +1,52 @@
+"""
+Tests for the cryptographic helpers.
+"""
+from txoauth import _crypto
+
+from twisted.trial.unittest import SkipTest, TestCase
+
+
+class CompareDigestsTestCase(TestCase):
+    def test_equal(self):
+        self.assertTrue(_crypto._compareDigests("abc", "abc"))
+        self.assertTrue(_crypto._compareDigests("", ""))
+
+
+    def test_different(self):
+        self.assertFalse(_crypto._compareDigests("abc", "abd"))
+        self.assertFalse(_crypto._compareDigests("abc", "ab"))
+
+
+
+class PBKDF2TestCase(TestCase):
+    """
+    Tests for the fallback PBKDF2 implementation, with test vectors for
+    PBKDF2-HMAC-SHA256.
+    """
+    def test_oneIteration(self):
+        key = _crypto._pbkdf2("sha256", "password", "salt", 1)
+        self.assertEqual(key.encode("hex"),
+                         "120fb6cffcf8b32c43e7225256c4f837"
+                         "a86548c92ccc35480805987cb70be17b")
+
+
+    def test_iterations(self):
+        key = _crypto._pbkdf2("sha256", "password", "salt", 4096)
+        self.assertEqual(key.encode("hex"),
+                         "c5e478d59288c841aa530db6845c4c8d"
+                         "962893a001ce4e11a4963873aa98134a")
+
+
+    def test_longKey(self):
+        key = _crypto._pbkdf2("sha256", "passwordPASSWORDpassword",
+                              "saltSALTsaltSALTsaltSALTsaltSALTsalt", 4096, 40)
+        self.assertEqual(key.encode("hex"),
+                         "348c89dbcbd32b2f32d814b8116e84cf2b17347e"
+                         "bc1800181c4e2a1fb8dd53e1c635518c7dac47e9")
+
+
+    def test_matchesStandardLibrary(self):
+        if _crypto.pbkdf2 is _crypto._pbkdf2:
+            raise SkipTest("hashlib.pbkdf2_hmac is not available")
+        self.assertEqual(_crypto._pbkdf2("sha1", "secret", "salt", 10, 30),
+                         _crypto.pbkdf2("sha1", "secret", "salt", 10, 30))
@@ -0,0 +1,389 @@
+"""
+Tests for the token endpoint.
+"""
+try:
+    import json
+except ImportError:
+    import simplejson as json
+
+from StringIO import StringIO
+
+from txoauth import clientcred, endpoint, metrics, token
+from txoauth.interfaces import IAccessToken
+from txoauth.contrib.simple import SimpleAssertionStore
+from txoauth.contrib.simple import SimpleRedirectURIFactory
+from txoauth.contrib.ratelimit import TokenBucketRateLimiter
+from txoauth.test.test_clientcred import IDENTIFIER, SECRET, URI
+from txoauth.test.test_clientcred import BOGUS_IDENTIFIER, BOGUS_SECRET
+from txoauth.test.test_token import TYPE, ASSERTION, BOGUS_ASSERTION
+
+from twisted.cred.checkers import ICredentialsChecker
+from twisted.cred.error import UnauthorizedLogin
+from twisted.cred.portal import IRealm, Portal
+from twisted.internet import defer, task
+from twisted.trial.unittest import TestCase
+from twisted.web.test.test_web import DummyChannel, DummyRequest
+
+from zope.interface import implements
+
+
+class ClientSecretChecker(object):
+    implements(ICredentialsChecker)
+    credentialInterfaces = (clientcred.IClientIdentifierSecret,)
+
+    def __init__(self, **secrets):
+        self.secrets = secrets
+
+
+    def requestAvatarId(self, credentials):
+        if self.secrets.get(credentials.identifier) == credentials.secret:
+            return defer.succeed(credentials.identifier)
+        return defer.fail(UnauthorizedLogin())
+
+
+
+class AssertionChecker(object):
+    implements(ICredentialsChecker)
+    credentialInterfaces = (token.IAssertion,)
+
+    def __init__(self, store):
+        self.store = store
+        self.pending = None
+
+
+    def requestAvatarId(self, credentials):
+        if self.pending is not None:
+            d = defer.Deferred()
+            self.pending.append(d)
+            return d
+        d = self.store.checkAssertion(credentials)
+        d.addCallback(lambda _: credentials.clientCredentials.identifier)
+        return d
+
+
+
+class AccessToken(object):
+    implements(IAccessToken)
+
+    def __init__(self, accessToken, expiresIn=None, refreshToken=None):
+        self.accessToken = accessToken
+        self.expiresIn = expiresIn
+        self.refreshToken = refreshToken
+
+
+
+class AccessTokenRealm(object):
+    implements(IRealm)
+
+    def __init__(self):
+        self.minds = []
+
+
+    def requestAvatar(self, avatarId, mind, *interfaces):
+        self.minds.append(mind)
+        accessToken = AccessToken("token-for-" + avatarId, 3600)
+        return defer.succeed((IAccessToken, accessToken, lambda: None))
+
+
+
+class TokenRequest(DummyRequest):
+    def __init__(self, **args):
+        DummyRequest.__init__(self, [])
+        self.method = "POST"
+        self.args = dict((k, [v]) for k, v in args.iteritems())
+
+
+    def getUser(self):
+        return ""
+
+
+    def getPassword(self):
+        return ""
+
+
+    def response(self):
+        return json.loads("".join(self.written))
+
+
+
+def assertionRequest(assertion=ASSERTION, secret=SECRET):
+    return TokenRequest(client_id=IDENTIFIER, client_secret=secret,
+                        grant_type="assertion", assertion_type=TYPE,
+                        assertion=assertion)
+
+
+
+class TokenEndpointTestCase(TestCase):
+    def setUp(self):
+        self.clock = task.Clock()
+
+        realm = clientcred.ClientRealm(SimpleRedirectURIFactory(
+                **{IDENTIFIER: URI}))
+        clientPortal = Portal(realm,
+                              [ClientSecretChecker(**{IDENTIFIER: SECRET})])
+
+        self.store = SimpleAssertionStore()
+        assertion = token.Assertion(clientcred.ClientIdentifierSecret(
+                IDENTIFIER, SECRET), TYPE, ASSERTION)
+        self.store.addAssertion(assertion)
+        self.checker = AssertionChecker(self.store)
+        self.realm = AccessTokenRealm()
+        tokenPortal = Portal(self.realm, [self.checker])
+
+        self.metrics = metrics.Metrics(clock=self.clock)
+        self.rateLimiter = TokenBucketRateLimiter(rate=0.5, burst=5,
+                                                  clock=self.clock)
+        self.endpoint = endpoint.TokenEndpoint(clientPortal, tokenPortal,
+                                               maxConcurrent=1, maxQueued=1,
+                                               queueTimeout=5,
+                                               maxBodySize=99,
+                                               metrics=self.metrics,
+                                               rateLimiter=self.rateLimiter,
+                                               clock=self.clock)
+
+
+    def _render(self, request):
+        request.render(self.endpoint)
+        return request
+
+
+    def _assertError(self, request, code, error):
+        self.assertEqual(request.finished, 1)
+        self.assertEqual(request.responseCode, code)
+        self.assertEqual(request.response(), {"error": error})
+
+
+    def test_success(self):
+        request = self._render(assertionRequest())
+        self.assertEqual(request.responseCode, 200)
+        self.assertEqual(request.response(),
+                         {"access_token": "token-for-" + IDENTIFIER,
+                          "expires_in": 3600})
+        self.assertEqual(request.outgoingHeaders["content-type"],
+                         "application/json")
+        self.assertEqual(request.outgoingHeaders["cache-control"],
+                         "no-store")
+
+        client, = self.realm.minds
+        self.assertEqual(client.identifier, IDENTIFIER)
+
+
+    def test_singleUse(self):
+        self._render(assertionRequest())
+        request = self._render(assertionRequest())
+        self._assertError(request, 400, "invalid_grant")
+
+
+    def test_invalidGrant(self):
+        request = self._render(assertionRequest(BOGUS_ASSERTION))
+        self._assertError(request, 400, "invalid_grant")
+
+
+    def test_invalidClient(self):
+        request = self._render(assertionRequest(secret=BOGUS_SECRET))
+        self._assertError(request, 401, "invalid_client")
+
+
+    def test_noClient(self):
+        request = self._render(TokenRequest(grant_type="assertion"))
+        self._assertError(request, 401, "invalid_client")
+
+
+    def test_missingGrantType(self):
+        request = self._render(TokenRequest(client_id=IDENTIFIER,
+                                            client_secret=SECRET))
+        self._assertError(request, 400, "invalid_request")
+
+
+    def test_unknownGrantType(self):
+        request = self._render(TokenRequest(client_id=IDENTIFIER,
+                                            client_secret=SECRET,
+                                            grant_type="magic"))
+        self._assertError(request, 400, "unsupported_grant_type")
+
+
+    def test_unhandledGrantType(self):
+        request = self._render(TokenRequest(client_id=IDENTIFIER,
+                                            client_secret=SECRET,
+                                            grant_type="refresh_token",
+                                            refresh_token="xyzzy"))
+        self._assertError(request, 400, "unsupported_grant_type")
+
+
+    def test_missingGrantArguments(self):
+        request = self._render(TokenRequest(client_id=IDENTIFIER,
+                                            client_secret=SECRET,
+                                            grant_type="assertion"))
+        self._assertError(request, 400, "invalid_request")
+
+
+    def test_serverError(self):
+        self.checker.requestAvatarId = lambda credentials: 1 / 0
+        request = self._render(assertionRequest())
+        self._assertError(request, 500, "server_error")
+        self.assertEqual(len(self.flushLoggedErrors(ZeroDivisionError)), 1)
+
+
+    def test_queued(self):
+        """
+        Requests beyond the concurrency limit wait until earlier requests are
+        done.
+        """
+        self.checker.pending = []
+        first = self._render(assertionRequest())
+        second = self._render(assertionRequest())
+        self.assertEqual(len(self.checker.pending), 1)
+        self.assertEqual(self.endpoint.inFlight, 1)
+
+        self.checker.pending.pop().callback(IDENTIFIER)
+        self.assertEqual(first.responseCode, 200)
+        self.assertEqual(len(self.checker.pending), 1)
+        self.assertFalse(second.finished)
+
+        self.checker.pending.pop().callback(IDENTIFIER)
+        self.assertEqual(second.responseCode, 200)
+        self.assertEqual(self.endpoint.inFlight, 0)
+        self.assertEqual(self.clock.getDelayedCalls(), [])
+
+
+    def test_queueTimeout(self):
+        self.checker.pending = []
+        self._render(assertionRequest())
+        second = self._render(assertionRequest())
+        self.clock.advance(5)
+        self._assertError(second, 503, "temporarily_unavailable")
+        self.assertEqual(second.outgoingHeaders["retry-after"], "5")
+
+        self.checker.pending.pop().callback(IDENTIFIER)
+        self.assertEqual(self.checker.pending, [])
+
+
+    def test_queueFull(self):
+        self.checker.pending = []
+        self._render(assertionRequest())
+        self._render(assertionRequest())
+        third = self._render(assertionRequest())
+        self._assertError(third, 503, "temporarily_unavailable")
+
+
+    def test_queuedDisconnect(self):
+        """
+        Queued requests whose client goes away are dropped from the queue.
+        """
+        self.checker.pending = []
+        self._render(assertionRequest())
+        second = self._render(assertionRequest())
+        second.processingFailed(RuntimeError())
+        self.assertEqual(self.clock.getDelayedCalls(), [])
+
+        self.checker.pending.pop().callback(IDENTIFIER)
+        self.assertEqual(self.checker.pending, [])
+        self.assertFalse(second.finished)
+
+
+    def test_tooLarge(self):
+        request = assertionRequest()
+        request.content = StringIO("x" * 100)
+        self._assertError(self._render(request), 413, "invalid_request")
+
+
+    def test_metrics(self):
+        self._render(assertionRequest())
+        self._render(TokenRequest())
+        self.assertEqual(self.metrics.calls, {
+            "endpoint.handle": 2,
+            "endpoint.extractClientCredentials": 2})
+        self.assertEqual(self.metrics.errors, {
+            "endpoint.handle": 1,
+            "endpoint.extractClientCredentials": 1})
+
+
+    def test_metrics_rejected(self):
+        self.checker.pending = []
+        self._render(assertionRequest())
+        self._render(assertionRequest())
+        self._render(assertionRequest())
+        self.assertEqual(self.metrics.events, {"endpoint.queued": 1,
+                                               "endpoint.rejected": 1})
+        self.checker.pending.pop().callback(IDENTIFIER)
+        self.checker.pending.pop().callback(IDENTIFIER)
+
+
+    def test_rateLimited(self):
+        """
+        Requests from clients over their limit are rejected without
+        checking their credentials or grants.
+        """
+        self.rateLimiter.setLimit(IDENTIFIER, 0.5, 1)
+        self._render(assertionRequest())
+
+        self.checker.requestAvatarId = lambda credentials: 1 / 0
+        request = self._render(assertionRequest(secret=BOGUS_SECRET))
+        self._assertError(request, 429, "temporarily_unavailable")
+        self.assertEqual(request.outgoingHeaders["retry-after"], "2")
+        self.assertEqual(self.metrics.calls["endpoint.handle"], 1)
+        self.assertEqual(self.metrics.events, {"endpoint.rateLimited": 1})
+
+
+    def test_rateLimitedPerClient(self):
+        self.rateLimiter.setLimit(IDENTIFIER, 0.5, 1)
+        self._render(assertionRequest())
+        request = self._render(TokenRequest(client_id=BOGUS_IDENTIFIER,
+                                            client_secret=SECRET))
+        self._assertError(request, 401, "invalid_client")
+
+
+    def test_rateLimitedNoClient(self):
+        """
+        Requests without a client identifier aren't rate limited; they are
+        rejected as usual.
+        """
+        for _ in xrange(6):
+            request = self._render(TokenRequest(grant_type="assertion"))
+        self._assertError(request, 401, "invalid_client")
+
+
+
+class LimitedRequestTestCase(TestCase):
+    def setUp(self):
+        self.request = endpoint.LimitedRequest(DummyChannel(), False)
+        self.request.maxBodySize = 10
+
+
+    def _receive(self, length, *chunks):
+        self.request.gotLength(length)
+        for chunk in chunks:
+            self.request.handleContentChunk(chunk)
+
+
+    def _assertTooLarge(self):
+        self.assertEqual(self.request.content.tell(), 0)
+        self.assertRaises(endpoint.RequestTooLarge,
+                          endpoint.parseRequest, self.request, None)
+
+
+    def test_withinLimit(self):
+        self._receive(10, "x" * 6, "x" * 4)
+        self.assertEqual(self.request.content.getvalue(), "x" * 10)
+
+
+    def test_announcedTooLarge(self):
+        """
+        A body which is announced as too large is not buffered at all.
+        """
+        self._receive(11, "x" * 6)
+        self._assertTooLarge()
+
+
+    def test_tooLarge(self):
+        """
+        A body of unknown length is thrown away once it gets too large.
+        """
+        self._receive(None, "x" * 6, "x" * 6, "x" * 6)
+        self._assertTooLarge()
+
+
+    def test_noLimit(self):
+        self.request.maxBodySize = None
+        self._receive(11, "x" * 11)
+        self.assertEqual(self.request.content.getvalue(), "x" * 11)
@@ -0,0 +1,165 @@
+"""
+Tests for metrics.
+"""
+from txoauth import metrics, token, clientcred
+from txoauth.contrib.simple import SimpleAssertionStore
+from txoauth.contrib.simple import SimpleRedirectURIFactory
+from txoauth.interfaces import IClient
+from txoauth.test.test_clientcred import IDENTIFIER, URI
+from txoauth.test.test_token import TYPE, ASSERTION
+
+from twisted.internet import defer, task
+from twisted.trial.unittest import TestCase
+from twisted.web.test.test_web import DummyRequest
+
+
+class HistogramTestCase(TestCase):
+    def test_observe(self):
+        histogram = metrics.Histogram([1, 2])
+        for value in [0.5, 1, 1.5, 3]:
+            histogram.observe(value)
+        self.assertEqual(histogram.counts, [2, 1, 1])
+        self.assertEqual(histogram.cumulativeCounts(), [2, 3, 4])
+        self.assertEqual(histogram.sum, 6.0)
+        self.assertEqual(histogram.count, 4)
+
+
+
+class MetricsTestCase(TestCase):
+    def setUp(self):
+        self.clock = task.Clock()
+        self.metrics = metrics.Metrics(buckets=[1, 2], clock=self.clock)
+
+
+    def test_record(self):
+        self.metrics.record("op", 0.5)
+        self.metrics.record("op", 1.5, failed=True)
+        self.assertEqual(self.metrics.calls, {"op": 2})
+        self.assertEqual(self.metrics.errors, {"op": 1})
+        self.assertEqual(self.metrics.latencies["op"].counts, [1, 1, 0])
+
+
+    def test_timedSynchronous(self):
+        self.assertEqual(self.metrics.timed("op", lambda x: x * 2, 21), 42)
+        self.assertEqual(self.metrics.calls, {"op": 1})
+        self.assertEqual(self.metrics.errors, {})
+
+
+    def test_timedException(self):
+        def broken():
+            raise RuntimeError()
+        self.assertRaises(RuntimeError, self.metrics.timed, "op", broken)
+        self.assertEqual(self.metrics.errors, {"op": 1})
+
+
+    def test_timedDeferred(self):
+        d = defer.Deferred()
+        result = self.metrics.timed("op", lambda: d)
+        self.assertEqual(self.metrics.calls, {})
+
+        self.clock.advance(1.5)
+        d.callback("result")
+        self.assertEqual(self.metrics.calls, {"op": 1})
+        self.assertEqual(self.metrics.latencies["op"].counts, [0, 1, 0])
+
+        results = []
+        result.addCallback(results.append)
+        self.assertEqual(results, ["result"])
+
+
+    def test_timedFailure(self):
+        d = self.metrics.timed("op", defer.fail, RuntimeError())
+        self.assertEqual(self.metrics.errors, {"op": 1})
+        return self.assertFailure(d, RuntimeError)
+
+
+    def test_increment(self):
+        self.metrics.increment("event")
+        self.metrics.increment("event", 2)
+        self.assertEqual(self.metrics.events, {"event": 3})
+
+
+    def test_render(self):
+        self.metrics.record("op", 0.5)
+        self.metrics.record("op", 1.5, failed=True)
+        self.metrics.increment('odd "event"')
+        self.assertEqual(self.metrics.render().splitlines(), [
+            "# HELP txoauth_calls_total Calls to an operation.",
+            "# TYPE txoauth_calls_total counter",
+            'txoauth_calls_total{operation="op"} 2',
+            "# HELP txoauth_errors_total "
+            "Calls to an operation which failed.",
+            "# TYPE txoauth_errors_total counter",
+            'txoauth_errors_total{operation="op"} 1',
+            "# HELP txoauth_latency_seconds "
+            "Latency of calls to an operation.",
+            "# TYPE txoauth_latency_seconds histogram",
+            'txoauth_latency_seconds_bucket{operation="op",le="1"} 1',
+            'txoauth_latency_seconds_bucket{operation="op",le="2"} 2',
+            'txoauth_latency_seconds_bucket{operation="op",le="+Inf"} 2',
+            'txoauth_latency_seconds_sum{operation="op"} 2.0',
+            'txoauth_latency_seconds_count{operation="op"} 2',
+            "# HELP txoauth_events_total Occurrences of an event.",
+            "# TYPE txoauth_events_total counter",
+            'txoauth_events_total{event="odd \\"event\\""} 1'])
+
+
+    def test_resource(self):
+        self.metrics.record("op", 0.5)
+        resource = metrics.MetricsResource(self.metrics)
+        request = DummyRequest([])
+        body = resource.render(request)
+        self.assertEqual(body, self.metrics.render())
+        self.assertEqual(request.outgoingHeaders["content-type"],
+                         "text/plain; version=0.0.4")
+
+
+
+class InstrumentedWrapperTestCase(TestCase):
+    def setUp(self):
+        self.metrics = metrics.Metrics(clock=task.Clock())
+
+
+    def test_realm(self):
+        factory = SimpleRedirectURIFactory(**{IDENTIFIER: URI})
+        realm = metrics.InstrumentedRealm(clientcred.ClientRealm(factory),
+                                          self.metrics)
+        d = realm.requestAvatar(IDENTIFIER, None, IClient)
+
+        @d.addCallback
+        def check(avatar):
+            self.assertEqual(avatar[1].identifier, IDENTIFIER)
+            self.assertEqual(self.metrics.calls, {"realm.requestAvatar": 1})
+
+        return d
+
+
+    def test_redirectURIFactory(self):
+        factory = metrics.InstrumentedRedirectURIFactory(
+            SimpleRedirectURIFactory(**{IDENTIFIER: URI}), self.metrics)
+        d = factory.getRedirectURI(IDENTIFIER)
+        d.addCallback(self.assertEqual, URI)
+        d.addCallback(lambda _: self.assertEqual(
+            self.metrics.calls, {"redirectURIFactory.getRedirectURI": 1}))
+        return d
+
+
+    def test_assertionStore(self):
+        store = metrics.InstrumentedAssertionStore(SimpleAssertionStore(),
+                                                   self.metrics)
+        assertion = token.Assertion(clientcred.ClientIdentifier(IDENTIFIER),
+                                    TYPE, ASSERTION)
+        store.addAssertion(assertion)
+        d = store.checkAssertion(assertion)
+        d.addCallback(lambda _: store.checkAssertion(assertion))
+        d = self.assertFailure(d, token.AssertionNotFound)
+
+        @d.addCallback
+        def check(_):
+            self.assertEqual(self.metrics.calls,
+                             {"assertionStore.addAssertion": 1,
+                              "assertionStore.checkAssertion": 2})
+            self.assertEqual(self.metrics.errors,
+                             {"assertionStore.checkAssertion": 1})
+
+        return d
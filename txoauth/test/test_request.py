@@ -0,0 +1,113 @@
+"""
+Tests for parsing OAuth requests.
+"""
+from StringIO import StringIO
+
+from txoauth import request
+from txoauth.test.test_clientcred import MockRequest, IDENTIFIER, SECRET
+
+from twisted.trial.unittest import TestCase
+
+
+class CountingRequest(MockRequest):
+    """
+    A request which counts how often its credentials are read.
+    """
+    reads = 0
+
+    def getUser(self):
+        self.reads += 1
+        return MockRequest.getUser(self)
+
+
+
+class SlotsRequest(object):
+    """
+    A request which can't hold on to its parsed form.
+    """
+    __slots__ = ("args",)
+
+    def __init__(self, args):
+        self.args = args
+
+
+    def getUser(self):
+        return ""
+
+
+    def getPassword(self):
+        return ""
+
+
+
+class ParseRequestTestCase(TestCase):
+    def test_basicAuthentication(self):
+        authHeader = ("%s:%s" % (IDENTIFIER, SECRET)).encode("base64")
+        parsed = request.parseRequest(MockRequest(authHeader))
+        self.assertEqual(parsed.identifier, IDENTIFIER)
+        self.assertEqual(parsed.secret, SECRET)
+
+
+    def test_form(self):
+        r = MockRequest(args={"client_id": IDENTIFIER, "client_secret": SECRET,
+                              "grant_type": "assertion"})
+        parsed = request.parseRequest(r)
+        self.assertEqual(parsed.identifier, IDENTIFIER)
+        self.assertEqual(parsed.secret, SECRET)
+        self.assertEqual(parsed.args, {"client_id": IDENTIFIER,
+                                       "client_secret": SECRET,
+                                       "grant_type": "assertion"})
+
+
+    def test_firstValue(self):
+        r = MockRequest()
+        r.args = {"a": ["1", "2"], "b": []}
+        self.assertEqual(request.parseRequest(r).args, {"a": "1"})
+
+
+    def test_nothing(self):
+        parsed = request.parseRequest(MockRequest())
+        self.assertIdentical(parsed.identifier, None)
+        self.assertIdentical(parsed.secret, None)
+
+
+    def test_parsedOnce(self):
+        r = CountingRequest(args={"client_id": IDENTIFIER})
+        parsed = request.parseRequest(r)
+        self.assertIdentical(request.parseRequest(r), parsed)
+        self.assertEqual(r.reads, 1)
+
+
+    def test_notCached(self):
+        """
+        Requests which can't hold on to their parsed form are parsed again
+        every time.
+        """
+        r = SlotsRequest({"client_id": [IDENTIFIER]})
+        self.assertEqual(request.parseRequest(r).identifier, IDENTIFIER)
+        self.assertEqual(request.parseRequest(r).identifier, IDENTIFIER)
+
+
+    def test_tooLarge(self):
+        r = MockRequest()
+        r.content = StringIO("x" * 11)
+        self.assertRaises(request.RequestTooLarge,
+                          request.parseRequest, r, 10)
+
+
+    def test_bodySizeLimit(self):
+        r = MockRequest(args={"client_id": IDENTIFIER})
+        r.content = StringIO("x" * 10)
+        r.content.seek(5)
+        self.assertEqual(request.parseRequest(r, 10).identifier, IDENTIFIER)
+        self.assertEqual(r.content.tell(), 5)
+
+
+    def test_noLimit(self):
+        r = MockRequest()
+        r.content = StringIO("x" * 11)
+        request.parseRequest(r, None)
+
+
+    def test_tooLargeIsTypeError(self):
+        self.assertTrue(issubclass(request.RequestTooLarge, TypeError))
@@ -2,7 +2,9 @@
 Tests for token endpoints.
 """
 from txoauth import token, clientcred as cred
+from txoauth.interfaces import IAccessToken
 from txoauth.test.test_clientcred import IDENTIFIER, BOGUS_IDENTIFIER, URI
+from txoauth.test.test_clientcred import SECRET, BOGUS_URI
 
 from twisted.cred.credentials import UsernamePassword
 from twisted.trial.unittest import TestCase
@@ -32,6 +34,28 @@ class _TokenRequestTests(object):
         self.assertEqual(hash(otherRequest), hash(otherRequest))
 
 
+    def test_hash_equalCredentials(self):
+        """
+        Token requests built from equal, but distinct, client credentials are
+        equal and have the same hash.
+        """
+        otherCredentials = cred.ClientIdentifier(IDENTIFIER, URI)
+        otherRequest = self.implementer(otherCredentials,
+                                        *self.args, **self.kwargs)
+        self.assertEqual(self.tokenRequest, otherRequest)
+        self.assertEqual(hash(self.tokenRequest), hash(otherRequest))
+
+
+    def test_inequality_differentCredentials(self):
+        otherRequest = self.implementer(self.bogusCredentials,
+                                        *self.args, **self.kwargs)
+        self.assertNotEqual(self.tokenRequest, otherRequest)
+
+
+    def test_noDict(self):
+        self.assertFalse(hasattr(self.tokenRequest, "__dict__"))
+
+
     def test_interface(self):
         self.assertTrue(token.ITokenRequest.implementedBy(self.implementer))
         self.assertTrue(self.interface.implementedBy(self.implementer))
@@ -94,6 +118,23 @@ class AssertionTests(_TokenRequestTests, TestCase):
         self._test_immutability("assertion", BOGUS_ASSERTION)
 
 
+    def test_equality_clientIdentifierOnly(self):
+        """
+        Assertions compare by client identifier, not by the rest of the
+        client credentials.
+        """
+        for credentials in [cred.ClientIdentifier(IDENTIFIER),
+                            cred.ClientIdentifier(IDENTIFIER, BOGUS_URI),
+                            cred.ClientIdentifierSecret(IDENTIFIER, SECRET)]:
+            otherRequest = self.implementer(credentials, *self.args)
+            self.assertEqual(self.tokenRequest, otherRequest)
+            self.assertEqual(hash(self.tokenRequest), hash(otherRequest))
+
+
+    def test_clientIdentifier(self):
+        self.assertEqual(self.tokenRequest.clientIdentifier, IDENTIFIER)
+
+
 CODE, BOGUS_CODE = "twisted", "threading"
 
 
@@ -159,3 +200,39 @@ class EndUserCredentialTests(_TokenRequestTests, TestCase):
                           clientCredentials=self.credentials,
                           endUserCredentials=None,
                           *self.args[1:], **self.kwargs)
+
+
+
+class AccessTokenTests(TestCase):
+    def test_interface(self):
+        accessToken = token.AccessToken("token", 3600)
+        self.assertTrue(IAccessToken.providedBy(accessToken))
+
+
+    def test_defaults(self):
+        accessToken = token.AccessToken("token")
+        self.assertEqual(accessToken.accessToken, "token")
+        self.assertIdentical(accessToken.expiresIn, None)
+        self.assertIdentical(accessToken.refreshToken, None)
+
+
+    def test_equality(self):
+        self.assertEqual(token.AccessToken("token", 10, "refresh"),
+                         token.AccessToken("token", 10, "refresh"))
+        self.assertNotEqual(token.AccessToken("token", 10),
+                            token.AccessToken("token", 20))
+
+
+
+class RefreshTokenRotationTests(TestCase):
+    def test_attributes(self):
+        rotation = token.RefreshTokenRotation("avatar", "refresh")
+        self.assertEqual(rotation.avatarId, "avatar")
+        self.assertEqual(rotation.refreshToken, "refresh")
+
+
+    def test_equality(self):
+        self.assertEqual(token.RefreshTokenRotation("avatar", "refresh"),
+                         token.RefreshTokenRotation("avatar", "refresh"))
+        self.assertNotEqual(token.RefreshTokenRotation("avatar", "refresh"),
+                            token.RefreshTokenRotation("avatar", "other"))
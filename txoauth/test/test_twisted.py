@@ -1,7 +1,7 @@
 """
 Tests for txOAuth contributions to Twisted.
 """
-from txoauth._twisted import FancyHashMixin
+from txoauth._twisted import FancyHashMixin, ImmutableFancyHashMixin
 
 from twisted.trial.unittest import TestCase
 
@@ -146,3 +146,83 @@ class PartialHashableTests(TestCase):
     def test_set_equalHashes_differentClasses(self):
         s = set([PartialHashable(1, 2), DifferentPartialHashable(1, 2)])
         self.assertEqual(len(s), 2)
+
+
+
+class ImmutableHashable(ImmutableFancyHashMixin):
+    __slots__ = ("value", "_hash")
+    compareAttributes = hashAttributes = ("value",)
+
+    def __init__(self, value):
+        self.value = value
+
+
+
+class ImmutableHashableSubclass(ImmutableHashable):
+    __slots__ = ("other",)
+    compareAttributes = hashAttributes = ("value", "other")
+
+    def __init__(self, value, other):
+        ImmutableHashable.__init__(self, value)
+        self.other = other
+
+
+
+class ImmutableFancyHashMixinTests(TestCase):
+    def test_equality(self):
+        h1, h2 = ImmutableHashable(1), ImmutableHashable(1)
+        self.assertEqual(h1, h1)
+        self.assertEqual(h1, h2)
+        self.assertFalse(h1 != h2)
+
+
+    def test_inequality(self):
+        h1, h2 = ImmutableHashable(1), ImmutableHashable(2)
+        self.assertNotEqual(h1, h2)
+        self.assertFalse(h1 == h2)
+
+
+    def test_inequality_otherType(self):
+        self.assertNotEqual(ImmutableHashable(1), 1)
+
+
+    def test_inequality_subclass(self):
+        """
+        Instances of a subclass comparing more attributes are unequal to
+        instances of the base class, whichever side they are on.
+        """
+        h1, h2 = ImmutableHashable(1), ImmutableHashableSubclass(1, 2)
+        self.assertNotEqual(h1, h2)
+        self.assertNotEqual(h2, h1)
+
+
+    def test_hashEqual(self):
+        h1, h2 = ImmutableHashable(1), ImmutableHashable(1)
+        self.assertEqual(hash(h1), hash(h2))
+        self.assertEqual(hash(h1), hash((1,)))
+
+
+    def test_hashCached(self):
+        h = ImmutableHashable(1)
+        expected = hash(h)
+        h.value = 2
+        self.assertEqual(hash(h), expected)
+
+
+    def test_noDict(self):
+        self.assertFalse(hasattr(ImmutableHashable(1), "__dict__"))
+        self.assertFalse(hasattr(ImmutableHashableSubclass(1, 2), "__dict__"))
+
+
+    def test_set(self):
+        s = set([ImmutableHashable(1), ImmutableHashable(1)])
+        self.assertEqual(len(s), 1)
+
+
+    def test_noCompareAttributes(self):
+        """
+        Without compared attributes, instances are only equal to themselves.
+        """
+        h1, h2 = ImmutableFancyHashMixin(), ImmutableFancyHashMixin()
+        self.assertEqual(h1, h1)
+        self.assertNotEqual(h1, h2)
@@ -0,0 +1,171 @@
+"""
+Tests for timing wheels.
+"""
+from txoauth._wheel import TimingWheel, HierarchicalTimingWheel
+
+from twisted.internet import task
+from twisted.trial.unittest import TestCase
+
+
+class TimingWheelTestCase(TestCase):
+    def setUp(self):
+        self.clock = task.Clock()
+        self.expired = []
+        self.wheel = TimingWheel(self.expired.append, resolution=1.0,
+                                 slots=8, clock=self.clock)
+        self.wheel.start()
+
+
+    def tearDown(self):
+        self.wheel.stop()
+
+
+    def test_expire(self):
+        self.wheel.schedule("a", 3)
+        self.clock.pump([1] * 2)
+        self.assertEqual(self.expired, [])
+        self.clock.advance(1)
+        self.assertEqual(self.expired, ["a"])
+        self.assertEqual(len(self.wheel), 0)
+
+
+    def test_beyondOneRevolution(self):
+        self.wheel.schedule("a", 20)
+        self.clock.pump([1] * 19)
+        self.assertEqual(self.expired, [])
+        self.clock.advance(1)
+        self.assertEqual(self.expired, ["a"])
+
+
+    def test_inThePast(self):
+        """
+        Entries scheduled in the past expire on the next tick.
+        """
+        self.clock.advance(5)
+        self.wheel.schedule("a", 1)
+        self.clock.advance(1)
+        self.assertEqual(self.expired, ["a"])
+
+
+    def test_catchUp(self):
+        """
+        If the wheel falls behind by more than a revolution, every entry that
+        became due is expired.
+        """
+        self.wheel.stop()
+        for i in range(1, 30):
+            self.wheel.schedule(i, i)
+        self.clock.advance(25)
+        self.wheel.advance()
+        self.assertEqual(sorted(self.expired), range(1, 26))
+        self.assertEqual(len(self.wheel), 4)
+
+
+    def test_fractional(self):
+        """
+        Entries due part way through a tick expire at the end of that tick,
+        never before they are due.
+        """
+        self.clock.advance(0.5)
+        self.wheel.schedule("a", 3.9)
+        self.clock.pump([0.1] * 30)
+        self.assertEqual(self.expired, [])
+        self.clock.pump([0.1] * 10)
+        self.assertEqual(self.expired, ["a"])
+        self.assertEqual(len(self.wheel), 0)
+
+
+    def test_reschedule(self):
+        """
+        Keys can be scheduled again while they are being expired.
+        """
+        def expire(key):
+            self.expired.append(key)
+            if len(self.expired) == 1:
+                self.wheel.schedule(key, self.clock.seconds())
+        self.wheel._expire = expire
+        self.wheel.schedule("a", 1)
+        self.clock.pump([1] * 2)
+        self.assertEqual(self.expired, ["a", "a"])
+
+
+
+class HierarchicalTimingWheelTestCase(TestCase):
+    def setUp(self):
+        self.clock = task.Clock()
+        self.expired = []
+        self.wheel = HierarchicalTimingWheel(self.expired.append,
+                                             resolution=1.0, slots=4,
+                                             levels=3, clock=self.clock)
+        self.wheel.start()
+
+
+    def tearDown(self):
+        self.wheel.stop()
+
+
+    def test_expire(self):
+        self.wheel.schedule("a", 3)
+        self.clock.pump([1] * 2)
+        self.assertEqual(self.expired, [])
+        self.clock.advance(1)
+        self.assertEqual(self.expired, ["a"])
+        self.assertEqual(len(self.wheel), 0)
+
+
+    def test_cascade(self):
+        """
+        Entries on coarser levels are cascaded down and expire exactly when
+        they are due.
+        """
+        deadlines = [5, 16, 17, 30, 63]
+        for when in deadlines:
+            self.wheel.schedule(when, when)
+        for now in range(1, 64):
+            self.clock.advance(1)
+            due = [when for when in deadlines if when <= now]
+            self.assertEqual(sorted(self.expired), due)
+
+
+    def test_beyondTopLevel(self):
+        """
+        Entries further away than the top level covers stay on the top level
+        until they are due.
+        """
+        self.wheel.schedule("a", 200)
+        self.clock.pump([1] * 199)
+        self.assertEqual(self.expired, [])
+        self.clock.advance(1)
+        self.assertEqual(self.expired, ["a"])
+
+
+    def test_inThePast(self):
+        self.clock.advance(5)
+        self.wheel.schedule("a", 1)
+        self.clock.advance(1)
+        self.assertEqual(self.expired, ["a"])
+
+
+    def test_catchUp(self):
+        self.wheel.stop()
+        for i in range(1, 100, 7):
+            self.wheel.schedule(i, i)
+        self.clock.advance(50)
+        self.wheel.advance()
+        self.assertEqual(sorted(self.expired), range(1, 51, 7))
+        self.assertEqual(len(self.wheel), len(range(57, 100, 7)))
+
+
+    def test_fractional(self):
+        """
+        Entries due part way through a tick expire at the end of that tick,
+        never before they are due, even after cascading.
+        """
+        self.clock.advance(0.5)
+        for when in [3.9, 20.2]:
+            self.wheel.schedule(when, when)
+        for now in range(1, 22):
+            self.clock.advance(1)
+            due = [when for when in [3.9, 20.2] if when <= now]
+            self.assertEqual(self.expired, due)
+        self.assertEqual(len(self.wheel), 0)
@@ -2,7 +2,8 @@
 OAuth token endpoint support.
 """
 from txoauth.clientcred import IClientIdentifier
-from txoauth._twisted import FancyHashMixin
+from txoauth.interfaces import IAccessToken
+from txoauth._twisted import ImmutableFancyHashMixin
 
 from twisted.cred.credentials import IUsernamePassword
 
@@ -78,9 +79,10 @@ class IEndUserCredentials(ITokenRequest):
 
 
 
-class _BaseTokenRequest(object, FancyHashMixin):
+class _BaseTokenRequest(ImmutableFancyHashMixin):
     implements(ITokenRequest)
-    compareAttributes = hashAttributes = ("clientCredentials",)
+    __slots__ = ("_clientCredentials", "_hash")
+    compareAttributes = hashAttributes = ("_clientCredentials",)
 
     def __init__(self, clientCredentials):
         self._clientCredentials = IClientIdentifier(clientCredentials)
@@ -91,18 +93,32 @@ class _BaseTokenRequest(object, FancyHashMixin):
         return self._clientCredentials
 
 
+    @property
+    def clientIdentifier(self):
+        """
+        The identifier of the client which made this request.
+        """
+        return self._clientCredentials.identifier
+
+
 
 class Assertion(_BaseTokenRequest):
     """
     A token request in the form of an assertion.
+
+    Assertions compare by the identifier of their client, their type and
+    their value. The redirect URI and secret the client presented don't
+    matter, so an assertion matches no matter how its client authenticated.
     """
     implements(IAssertion)
-    compareAttributes = hashAttributes = ("clientCredentials",
-                                          "assertion",
-                                          "assertionType")
+    __slots__ = ("_clientIdentifier", "_assertionType", "_assertion")
+    compareAttributes = hashAttributes = ("_clientIdentifier",
+                                          "_assertion",
+                                          "_assertionType")
 
     def __init__(self, clientCredentials, assertionType, assertion):
         super(Assertion, self).__init__(clientCredentials)
+        self._clientIdentifier = self._clientCredentials.identifier
         self._assertionType = assertionType
         self._assertion = assertion
 
@@ -120,8 +136,9 @@ class Assertion(_BaseTokenRequest):
 
 class AuthorizationCode(_BaseTokenRequest):
     implements(IAuthorizationCode)
-    compareAttributes = hashAttributes = ("clientCredentials",
-                                          "authorizationCode")
+    __slots__ = ("_authorizationCode",)
+    compareAttributes = hashAttributes = ("_clientCredentials",
+                                          "_authorizationCode")
 
     def __init__(self, clientCredentials, authorizationCode):
         super(AuthorizationCode, self).__init__(clientCredentials)
@@ -136,8 +153,9 @@ class AuthorizationCode(_BaseTokenRequest):
 
 class RefreshToken(_BaseTokenRequest):
     implements(IRefreshToken)
-    compareAttributes = hashAttributes = ("clientCredentials",
-                                          "refreshToken")
+    __slots__ = ("_refreshToken",)
+    compareAttributes = hashAttributes = ("_clientCredentials",
+                                          "_refreshToken")
 
     def __init__(self, clientCredentials, refreshToken):
         super(RefreshToken, self).__init__(clientCredentials)
@@ -152,8 +170,9 @@ class RefreshToken(_BaseTokenRequest):
 
 class EndUserCredentials(_BaseTokenRequest):
     implements(IEndUserCredentials)
-    compareAttributes = hashAttributes = ("clientCredentials",
-                                          "endUserCredentials")
+    __slots__ = ("_endUserCredentials",)
+    compareAttributes = hashAttributes = ("_clientCredentials",
+                                          "_endUserCredentials")
 
     def __init__(self, clientCredentials, endUserCredentials):
         super(EndUserCredentials, self).__init__(clientCredentials)
@@ -166,6 +185,65 @@ class EndUserCredentials(_BaseTokenRequest):
 
 
 
+class AccessToken(ImmutableFancyHashMixin):
+    """
+    An access token, as issued by an L{txoauth.interfaces.IAccessTokenStore}.
+    """
+    implements(IAccessToken)
+    __slots__ = ("_accessToken", "_expiresIn", "_refreshToken", "_hash")
+    compareAttributes = hashAttributes = ("_accessToken",
+                                          "_expiresIn",
+                                          "_refreshToken")
+
+    def __init__(self, accessToken, expiresIn=None, refreshToken=None):
+        self._accessToken = accessToken
+        self._expiresIn = expiresIn
+        self._refreshToken = refreshToken
+
+
+    @property
+    def accessToken(self):
+        return self._accessToken
+
+
+    @property
+    def expiresIn(self):
+        return self._expiresIn
+
+
+    @property
+    def refreshToken(self):
+        return self._refreshToken
+
+
+
+class RefreshTokenRotation(ImmutableFancyHashMixin):
+    """
+    The result of rotating a refresh token, as produced by an
+    L{txoauth.interfaces.IRefreshTokenStore}.
+
+    Refresh token checkers use this as the avatar ID, so the realm can hand
+    out the new refresh token along with the access token.
+    """
+    __slots__ = ("_avatarId", "_refreshToken", "_hash")
+    compareAttributes = hashAttributes = ("_avatarId", "_refreshToken")
+
+    def __init__(self, avatarId, refreshToken):
+        self._avatarId = avatarId
+        self._refreshToken = refreshToken
+
+
+    @property
+    def avatarId(self):
+        return self._avatarId
+
+
+    @property
+    def refreshToken(self):
+        return self._refreshToken
+
+
+
 class EnforcedInvalidationException(Exception):
     """
     Raised when attempting to check an assertion while not invalidating the
@@ -179,3 +257,29 @@ class AssertionNotFound(Exception):
     """
     Raised when an assertion which was attempted to be checked wasn't found.
     """
+
+
+
+class AccessTokenNotFound(Exception):
+    """
+    Raised when an access token which was attempted to be checked wasn't
+    found, has expired or has been revoked.
+    """
+
+
+
+class AuthorizationCodeNotFound(Exception):
+    """
+    Raised when an authorization code which was attempted to be redeemed
+    wasn't found, has expired, has been redeemed before or doesn't belong to
+    the client presenting it.
+    """
+
+
+
+class RefreshTokenNotFound(Exception):
+    """
+    Raised when a refresh token which was attempted to be rotated wasn't
+    found, has been revoked, has been rotated before or doesn't belong to
+    the client presenting it.
+    """